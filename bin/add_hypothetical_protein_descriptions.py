@@ -19,13 +19,27 @@ import logging
 import re
 import sys
 from enum import Enum
+from operator import itemgetter
+
+from eggnog_annotations import is_informative_description, load_eggnog_annotations
+from gff_attributes import (
+    insert_attribute_after,
+    parse_attributes,
+    serialize_attributes,
+)
+from interpro_entries import load_entries, term_depth
+from interpro_entries import load_hierarchy as load_interpro_hierarchy
+from interproscan_results import (
+    group_rows_by_protein,
+    load_interproscan_results,
+    select_rows,
+)
 
 logging.basicConfig(level=logging.INFO)
 
-EVALUE_CUTOFF = 1e-10
 EGGNOG_DESCRIPTION_LENGTH_LIMIT = 12
-EGGNOG_NOTE_LENGTH_LIMIT = 70
 MINIMUM_IPR_MATCH = 0.10
+IPR_EXCLUDED_DATABASES = {"ProSiteProfiles", "Coils", "MobiDBLite", "PRINTS"}
 
 
 class GeneCaller(Enum):
@@ -33,15 +47,24 @@ class GeneCaller(Enum):
     BAKTA = "Bakta"
 
 
-def main(ipr_types_file, ipr_file, hierarchy_file, eggnog_file, infile, outfile):
-    eggnog_info = load_eggnog(eggnog_file)
-    if ipr_file:
-        levels = load_hierarchy(hierarchy_file)
-        ipr_types = load_ipr_types(ipr_types_file)
-        ipr_info, ipr_memberdb_only, _ = load_ipr(ipr_file, ipr_types, levels)
-    else:
-        ipr_info = dict()
-        ipr_memberdb_only = dict()
+def main(
+    ipr_types_file,
+    ipr_file,
+    hierarchy_file,
+    eggnog_file,
+    infile,
+    outfile,
+    ipr_version=None,
+    eggnog_cache=None,
+):
+    eggnog_info, ipr_info, ipr_memberdb_only = load_function_sources(
+        ipr_types_file,
+        ipr_file,
+        hierarchy_file,
+        eggnog_file,
+        ipr_version,
+        eggnog_cache,
+    )
 
     gene_caller = GeneCaller.PROKKA
     fasta_flag = False
@@ -64,48 +87,14 @@ def main(ipr_types_file, ipr_file, hierarchy_file, eggnog_file, infile, outfile)
                         col9,
                     ) = line.strip().split("\t")
                     if feature == "CDS":
-                        attributes_dict = dict(
-                            re.split(r"(?<!\\)=", item)
-                            for item in re.split(r"(?<!\\);", col9)
+                        attributes_dict = add_function_description(
+                            parse_attributes(col9),
+                            eggnog_info,
+                            ipr_info,
+                            ipr_memberdb_only,
+                            gene_caller,
                         )
-                        if attributes_dict["product"] == "hypothetical protein":
-                            found_function, function_source = get_function(
-                                attributes_dict["ID"],
-                                attributes_dict,
-                                eggnog_info,
-                                ipr_info,
-                                ipr_memberdb_only,
-                                gene_caller,
-                            )
-
-                            if not function_source == "UniFIRE":
-                                found_function = clean_up_function(found_function)
-                                if function_source == "eggNOG":
-                                    (
-                                        found_function,
-                                        function_source,
-                                        attributes_dict,
-                                    ) = keep_or_move_to_note(
-                                        found_function,
-                                        function_source,
-                                        attributes_dict,
-                                        gene_caller,
-                                    )
-                            found_function = escape_reserved_characters(found_function)
-                            attributes_dict["product"] = found_function
-                            if (
-                                gene_caller == GeneCaller.BAKTA
-                                and attributes_dict["Name"] == "hypothetical protein"
-                            ):
-                                attributes_dict["Name"] = found_function
-                            attributes_dict = insert_product_source(
-                                attributes_dict, function_source
-                            )
-                        else:
-                            attributes_dict = insert_product_source(
-                                attributes_dict, gene_caller.value
-                            )
-                        col9_updated = update_col9(attributes_dict)
+                        col9_updated = serialize_attributes(attributes_dict)
                         file_out.write(
                             "\t".join(
                                 [
@@ -132,6 +121,83 @@ def main(ipr_types_file, ipr_file, hierarchy_file, eggnog_file, infile, outfile)
                 file_out.write(line)
 
 
+def load_function_sources(
+    ipr_types_file,
+    ipr_file,
+    hierarchy_file,
+    eggnog_file,
+    ipr_version=None,
+    eggnog_cache=None,
+):
+    """
+    Load the eggNOG and InterProScan results used to name hypothetical proteins.
+
+    :param ipr_version: InterPro release of the entry list and hierarchy, used to check that a
+        snapshot of them can be used
+    :param eggnog_cache: compact copy of the eggNOG annotations, see load_eggnog_annotations
+
+    :return: eggNOG descriptions, InterPro annotations, annotations from InterPro member databases
+        without IPR accessions
+    """
+    eggnog_info = load_eggnog(eggnog_file, eggnog_cache)
+    if ipr_file:
+        hierarchy = load_hierarchy(hierarchy_file, ipr_version)
+        ipr_types = load_ipr_types(ipr_types_file, ipr_version)
+        ipr_info, ipr_memberdb_only, _ = load_ipr(ipr_file, ipr_types, hierarchy)
+    else:
+        ipr_info = dict()
+        ipr_memberdb_only = dict()
+    return eggnog_info, ipr_info, ipr_memberdb_only
+
+
+def add_function_description(
+    attributes_dict,
+    eggnog_info,
+    ipr_info,
+    ipr_memberdb_only,
+    gene_caller: GeneCaller,
+):
+    """
+    Replace "hypothetical protein" in the product of a CDS with a function from UniFIRE, InterPro
+    or eggNOG and record where the product came from in product_source.
+
+    :param attributes_dict: column 9 of the CDS as a dictionary
+    :return: updated dictionary of attributes
+    """
+    if attributes_dict["product"] == "hypothetical protein":
+        found_function, function_source = get_function(
+            attributes_dict["ID"],
+            attributes_dict,
+            eggnog_info,
+            ipr_info,
+            ipr_memberdb_only,
+            gene_caller,
+        )
+
+        if not function_source == "UniFIRE":
+            found_function = clean_up_function(found_function)
+            if function_source == "eggNOG":
+                (
+                    found_function,
+                    function_source,
+                    attributes_dict,
+                ) = keep_or_move_to_note(
+                    found_function,
+                    function_source,
+                    attributes_dict,
+                    gene_caller,
+                )
+        found_function = escape_reserved_characters(found_function)
+        attributes_dict["product"] = found_function
+        if (
+            gene_caller == GeneCaller.BAKTA
+            and attributes_dict["Name"] == "hypothetical protein"
+        ):
+            attributes_dict["Name"] = found_function
+        return insert_product_source(attributes_dict, function_source)
+    return insert_product_source(attributes_dict, gene_caller.value)
+
+
 def keep_or_move_to_note(
     found_function, function_source, col9_dict, gene_caller: GeneCaller
 ):
@@ -322,12 +388,8 @@ def move_function_to_note(found_function, col9_dict):
         return col9_dict
     else:
         # insert note after locus tag
-        keys_list = list(col9_dict.keys())
-        locus_tag_index = keys_list.index("locus_tag")
-        return (
-            {k: col9_dict[k] for k in keys_list[: locus_tag_index + 1]}
-            | {"Note": "eggNOG:" + found_function}
-            | {k: col9_dict[k] for k in keys_list[locus_tag_index + 1 :]}
+        return insert_attribute_after(
+            col9_dict, "locus_tag", "Note", "eggNOG:" + found_function
         )
 
 
@@ -349,38 +411,12 @@ def clean_up_function(found_function):
     return found_function
 
 
-def update_col9(attributes_dict):
-    return ";".join([f"{key}={value}" for key, value in attributes_dict.items()])
-
-
-def count_initial_dashes(s):
-    return len(s) - len(s.lstrip("-"))
-
-
-def load_hierarchy(parent_child_file):
-    counter = dict()
-    levels = dict()
-    with open(parent_child_file) as file_in:
-        for line in file_in:
-            depth = count_initial_dashes(line)
-            term = line.lstrip("-").strip().split("::")[0]
-            if term in levels:
-                if depth > levels[term]:
-                    levels[term] = depth
-            else:
-                levels[term] = depth
-            counter[term] = counter.get(term, 0) + 1
-    return levels
+def load_hierarchy(parent_child_file, ipr_version=None):
+    return load_interpro_hierarchy(parent_child_file, ipr_version)
 
 
 def insert_product_source(my_dict, source):
-    keys_list = list(my_dict.keys())
-    product_index = keys_list.index("product")
-    return (
-        {k: my_dict[k] for k in keys_list[: product_index + 1]}
-        | {"product_source": source}
-        | {k: my_dict[k] for k in keys_list[product_index + 1 :]}
-    )
+    return insert_attribute_after(my_dict, "product", "product_source", source)
 
 
 def get_function(
@@ -547,187 +583,18 @@ def pull_out_description(my_dict, first_priority, second_priority):
         return my_dict[second_priority], second_priority
 
 
-def load_eggnog(file):
+def load_eggnog(file, cache_file=None):
     eggnog_info = dict()
-    with open(file) as file_in:
-        for line in file_in:
-            if not line.startswith("#"):
-                cols = line.strip().split("\t")
-                try:
-                    evalue = float(cols[2])
-                except:  # noqa: E722
-                    continue
-                if evalue > EVALUE_CUTOFF:
-                    continue
-                exclude_eggnog_partial = [
-                    "proteins of unknown function",
-                    "non supervised orthologous group",
-                    "psort location",
-                    "may contain a frame shift",
-                    "annotation was generated",
-                    "no Hp match",
-                    "No similarity found",
-                    "No significant database",
-                    "No significant BLAST",
-                    "open reading frame",
-                    "Blast hits to",
-                ]
-                exclude_eggnog_full = [
-                    "-",
-                    "domain, protein",
-                    "domain protein",
-                    "domain, family member",
-                    "domain) protein",
-                    "domain) containing",
-                    "domain only",
-                    "protein domain containing",
-                    "Encoded by",
-                    "Family of unknown function",
-                    "Domain of unknown function",
-                    "Protein of unknown function",
-                    "Uncharacterised protein family",
-                    "Uncharacterized protein family",
-                    "by glimmer",
-                    "by glimmer2",
-                    "by glimmer3",
-                    "by sequence",
-                    "by modhmm",
-                    "by jigsaw",
-                    "by TMHMM2.0 at aa",
-                    "by MetaGeneAnnotator",
-                    "by GeneMark",
-                    "component",
-                    "Family of",
-                    "Family membership",
-                    "family member",
-                    "superfamily protein",
-                    "superfamily. Protein",
-                    "superfamily",
-                    "superfamily, member",
-                    "I and II",
-                    "implicated in the recycling of the",
-                    "manually curated",
-                    "multi-drug",
-                    "protein involved in",
-                    "Alternative locus ID",
-                    "amino acid",
-                    "Weak similarity to UniProt",
-                    "overlaps another CDS with the same product name",
-                    "No homology to any previously reported sequences",
-                    "There are 9 addittional ORFs identical to this one",
-                    "Product inferred by homology to UniProt",
-                    "protein domain associated with",
-                    "acid) synthase",
-                    "unnamed protein",
-                    "this gene contains a nucleotide ambiguity which may be the result of a sequencing error",
-                    "source UniProtKB",
-                    "some similarities with uniprot",
-                    "silverDB",
-                    "sequence",
-                    "protein).. Source PGD",
-                    "protein). Source PGD",
-                    "protein)-related protein",
-                    "protein)-like",
-                    "protein with multiple",
-                    "previously reported",
-                    "multiple",
-                    "molecule",
-                    "function. Source PGD",
-                    "function",
-                    "essential",
-                    "electron",
-                    "containing protein",
-                    "chromosome",
-                    "Highly divergent",
-                    "Belongs to the",
-                    "as a",
-                    "6) homolog",
-                    "Source PGD",
-                    "protein.. Source PGD",
-                    "gene. Source PGD",
-                    "family protein. Source PGD",
-                    "a. Source PGD",
-                    "-domain-containing protein",
-                    "Corresponds to locus_tag",
-                    "Function proposed based on presence of conserved amino acid motif, structural feature or limited homology",
-                    "Conserved gene of",
-                    "IMG reference gene",
-                    "An automated process has identified a potential problem with this gene model",
-                    "aa) fasta scores E()",
-                ]
-                exclude_eggnog_start = [
-                    "of ",
-                    "but ",
-                    "But ",
-                    "however",
-                    "However",
-                    "to ",
-                    "with ",
-                    "which ",
-                    "thus ",
-                    "then ",
-                    "that ",
-                    "or ",
-                    "more specifically ",
-                    "due ",
-                    "deleted ",
-                    "bases in ",
-                    "are ",
-                    "and ",
-                    "And ",
-                    "and, ",
-                    "across ",
-                    "aa, and",
-                    "aa)",
-                    "aa and ",
-                    "Best DB hits BLAST",
-                ]
-                exclude_eggnog_end = [
-                    " and",
-                    " which",
-                    " with",
-                    " to",
-                    " of",
-                    " is",
-                    " the",
-                    " for",
-                    " in",
-                    " or",
-                    " a",
-                ]
-                patterns = [
-                    r"^[0-9]+[.)]* Source PGD$",  # e.g., "2). Source PGD"
-                    r"^[0-9]+ homolog$",  # e.g., "2 homolog"
-                    r"^[0-9]+ like [0-9]+$",  # e.g., "2 like 1"
-                    r"^multiple [0-9]+$",  # e.g., "multiple 2"
-                    r"^molecule [0-9]+$",  # e.g., "molecule 2"
-                ]
-                if (
-                    all(
-                        phrase.lower() not in cols[7].lower()
-                        for phrase in exclude_eggnog_partial
-                    )
-                    and all(
-                        phrase.lower() != cols[7].lower()
-                        for phrase in exclude_eggnog_full
-                    )
-                    and not any(
-                        cols[7].startswith(phrase) for phrase in exclude_eggnog_start
-                    )
-                    and not any(
-                        cols[7].endswith(phrase) for phrase in exclude_eggnog_end
-                    )
-                    and not any(re.match(p, cols[7]) for p in patterns)
-                    and not len(cols[7].split(" ")) > EGGNOG_NOTE_LENGTH_LIMIT
-                ):
-                    function = cols[7]
-                    # trim function from the left if it doesn't start with a letter or a digit
-                    function = clean_up_eggnog_function(function)
-                    for i, char in enumerate(function):
-                        if char.isalnum():
-                            function = function[i:]
-                            break
-                    eggnog_info[cols[0]] = function
+    for protein, record in load_eggnog_annotations(file, cache_file).items():
+        if not is_informative_description(record.description):
+            continue
+        # trim function from the left if it doesn't start with a letter or a digit
+        function = clean_up_eggnog_function(record.description)
+        for i, char in enumerate(function):
+            if char.isalnum():
+                function = function[i:]
+                break
+        eggnog_info[protein] = function
     return eggnog_info
 
 
@@ -774,53 +641,39 @@ def clean_up_eggnog_function(func_description):
     return func_description
 
 
-def load_ipr_types(ipr_types_file):
-    ipr_types = dict()
-    with open(ipr_types_file) as file_in:
-        for line in file_in:
-            if line.startswith("IPR"):
-                acc, type, _ = line.strip().split("\t")
-                ipr_types[acc] = type
-    return ipr_types
+def load_ipr_types(ipr_types_file, ipr_version=None):
+    return {
+        acc: entry_type
+        for acc, (entry_type, _) in load_entries(ipr_types_file, ipr_version).items()
+    }
 
 
-def load_ipr(file, ipr_types, ipr_levels):
+def load_ipr(file, ipr_types, hierarchy):
+    """
+    Load the InterProScan hits used to name hypothetical proteins. For each protein, one hit is
+    kept per InterPro entry type and member database.
+
+    :param ipr_types: dictionary where key = InterPro accession, value = entry type
+    :param hierarchy: InterPro hierarchy index from interpro_entries.load_hierarchy
+    :return: hits with an InterPro accession, hits only in a member database, an empty dictionary
+    """
     ipr_info = dict()  # hit is assigned an interpro id
     ipr_leveled_info = dict()
     ipr_memberdb_only = dict()  # hit only exists in a member database
 
-    with open(file) as file_in:
-        for line in file_in:
-            cols = line.strip().split("\t")
-            (
-                acc,
-                len,
-                db,
-                sig_description,
-                start,
-                end,
-                evalue,
-                ipr_acc,
-                ipr_description,
-            ) = (
-                cols[0],
-                cols[2],
-                cols[3],
-                cols[5],
-                cols[6],
-                cols[7],
-                cols[8],
-                cols[11],
-                cols[12],
-            )
-            if evalue == "-":
-                evalue = 1
-            else:
-                evalue = float(evalue)
-            if evalue > EVALUE_CUTOFF:
-                continue
-            if db in ["ProSiteProfiles", "Coils", "MobiDBLite", "PRINTS"]:
-                continue
+    ips_results = load_interproscan_results(file)
+    dbs = ips_results["db"]
+    matches = ips_results["match"]
+    rows = select_rows(dbs, IPR_EXCLUDED_DATABASES, exclude=True)
+    rows = [row for row in rows if matches[row] >= MINIMUM_IPR_MATCH]
+    for acc, protein_rows in group_rows_by_protein(ips_results, rows).items():
+        # hits of this protein by (entry type, member database), in the order of the file
+        hits = dict()
+        for row in protein_rows:
+            db = dbs[row]
+            sig_description = ips_results["sig_desc"][row]
+            ipr_acc = ips_results["ipr_acc"][row]
+            ipr_description = ips_results["ipr_desc"][row]
             if (
                 sig_description.lower() == "uncharacterized"
                 or sig_description.lower() == "uncharacterised"
@@ -845,76 +698,52 @@ def load_ipr(file, ipr_types, ipr_levels):
                 ipr_description = cleanup_duf(ipr_description)
             if sig_description == "-" and ipr_description == "-":
                 continue
-            perc_match = (int(end) - int(start)) / int(len)
-            if perc_match < MINIMUM_IPR_MATCH:
-                continue
-            if not ipr_acc == "-":
-                if ipr_acc not in ipr_levels:
-                    level = 0
-                else:
-                    level = ipr_levels[ipr_acc]
             if not ipr_acc == "-":
                 try:
                     ipr_type = ipr_types[ipr_acc]
-                except ValueError:
+                except KeyError:
                     continue  # entry is no longer in InterPro
                 if ipr_type not in ["Domain", "Family", "Homologous_superfamily"]:
                     continue
-                ipr_info = save_to_dict(
-                    ipr_info,
-                    acc,
-                    db,
-                    perc_match,
-                    ipr_description,
-                    sig_description,
-                    ipr_type,
-                    level,
-                )
+                level = term_depth(hierarchy, ipr_acc)
             else:
-                ipr_memberdb_only = save_to_dict(
-                    ipr_memberdb_only,
-                    acc,
-                    db,
-                    perc_match,
-                    ipr_description,
-                    sig_description,
-                    "no_type",
-                    None,
-                )
-    return ipr_info, ipr_memberdb_only, ipr_leveled_info
-
-
-def save_to_dict(
-    res_dict, acc, db, perc_match, ipr_description, sig_description, ipr_type, level
-):
-    entry = res_dict.setdefault(acc, {}).setdefault(ipr_type, {}).setdefault(db, {})
-
-    if "level" in entry and isinstance(entry["level"], int):
-        # For Family and Domain entries, prioritise replacement with a lower level term rather than a better percent
-        # match. Lower level has a higher numerical value (level 2 is lower than 0). Only replace with a better
-        # percent match if the level is not lower.
-        if (ipr_type in ["Family", "Domain"] and level > entry["level"]) or (
-            perc_match > entry["match"] and level == entry["level"]
-        ):
-            entry.update(
+                ipr_type = "no_type"
+                level = None
+            hits.setdefault((ipr_type, db), list()).append(
                 {
-                    "match": perc_match,
+                    "match": matches[row],
                     "ipr_desc": ipr_description,
                     "sig_desc": sig_description,
                     "level": level,
                 }
             )
-    else:
-        entry.update(
-            {
-                "match": perc_match,
-                "ipr_desc": ipr_description,
-                "sig_desc": sig_description,
-                "level": level,
-            }
-        )
+        for (ipr_type, db), db_hits in hits.items():
+            res_dict = ipr_memberdb_only if ipr_type == "no_type" else ipr_info
+            res_dict.setdefault(acc, {}).setdefault(ipr_type, {})[db] = select_best_hit(
+                db_hits, ipr_type
+            )
+    return ipr_info, ipr_memberdb_only, ipr_leveled_info
+
 
-    return res_dict
+def select_best_hit(hits, ipr_type):
+    """
+    Choose the hit to keep out of the hits of one protein to one member database.
+
+    For Family and Domain entries, a more specific term (deeper in the InterPro hierarchy) is
+    preferred over a better percent match. Homologous superfamily hits are only compared to
+    hits at the same depth as the first one. Hits without an InterPro accession have no depth
+    and the last one is kept.
+
+    :param hits: list of hit dictionaries in the order of the InterProScan output
+    :return: hit dictionary
+    """
+    if ipr_type in ["Family", "Domain"]:
+        # max keeps the first of equal hits
+        return max(hits, key=itemgetter("level", "match"))
+    if ipr_type == "no_type":
+        return hits[-1]
+    level = hits[0]["level"]
+    return max((hit for hit in hits if hit["level"] == level), key=itemgetter("match"))
 
 
 def escape_reserved_characters(string):
@@ -1034,11 +863,28 @@ def parse_args():
         required=False,
         help="The path to the ParentChildTreeFile.txt file from InterPro. Required if --ipr-output is provided.",
     )
+    parser.add_argument(
+        "--ipr-version",
+        required=False,
+        help=(
+            "InterPro release of --ipr-entries and --ipr-hierarchy. If given, a snapshot of the "
+            "files is only used if it was built from this release."
+        ),
+    )
     parser.add_argument(
         "--eggnog-output",
         required=True,
         help="The path to the TSV annotations file produced by emapper.",
     )
+    parser.add_argument(
+        "--eggnog-cache",
+        required=False,
+        help=(
+            "Compact copy of the emapper annotations, for example saved by annotate_gff.py. It "
+            "is read instead of --eggnog-output if it was saved from that file, otherwise it is "
+            "(re)written."
+        ),
+    )
     parser.add_argument(
         "-i",
         dest="infile",
@@ -1071,4 +917,6 @@ if __name__ == "__main__":
         args.eggnog_output,
         args.infile,
         args.outfile,
+        args.ipr_version,
+        args.eggnog_cache,
     )
@@ -15,11 +15,13 @@
 #
 
 import argparse
-import re
 
+from gff_attributes import parse_attributes, serialize_attributes
+from interpro_entries import load_entries
 
-def main(ipr_types_file, infile, outfile):
-    ipr_types_and_descriptions = load_ipr(ipr_types_file)
+
+def main(ipr_types_file, infile, outfile, ipr_version=None):
+    ipr_types_and_descriptions = load_ipr(ipr_types_file, ipr_version)
     with open(infile) as file_in, open(outfile, "w") as file_out:
         fasta_flag = False
         for line in file_in:
@@ -32,25 +34,10 @@ def main(ipr_types_file, infile, outfile):
                         line.strip().split("\t")
                     )
                     if feature == "CDS":
-                        attributes_dict = dict(
-                            re.split(r"(?<!\\)=", item)
-                            for item in re.split(r"(?<!\\);", col9)
-                        )
-                        matching_key = next(
-                            (
-                                key
-                                for key in attributes_dict
-                                if key.lower() == "interpro"
-                            ),
-                            None,
+                        attributes_dict = add_descriptions_to_attributes(
+                            parse_attributes(col9), ipr_types_and_descriptions
                         )
-                        if matching_key:
-                            # add descriptions to the InterPro terms
-                            attributes_dict[matching_key] = add_ipr_descriptions(
-                                attributes_dict[matching_key],
-                                ipr_types_and_descriptions,
-                            )
-                        col9_updated = update_col9(attributes_dict)
+                        col9_updated = serialize_attributes(attributes_dict)
                         file_out.write(
                             "\t".join(
                                 [
@@ -75,8 +62,19 @@ def main(ipr_types_file, infile, outfile):
                 file_out.write(line)
 
 
-def update_col9(attributes_dict):
-    return ";".join([f"{key}={value}" for key, value in attributes_dict.items()])
+def add_descriptions_to_attributes(attributes_dict, ipr_types_and_descriptions):
+    """Add descriptions and types to the InterPro accessions in column 9 of a CDS."""
+    matching_key = next(
+        (key for key in attributes_dict if key.lower() == "interpro"),
+        None,
+    )
+    if matching_key:
+        # add descriptions to the InterPro terms
+        attributes_dict[matching_key] = add_ipr_descriptions(
+            attributes_dict[matching_key],
+            ipr_types_and_descriptions,
+        )
+    return attributes_dict
 
 
 def add_ipr_descriptions(ipr_string, ipr_types_and_descriptions):
@@ -95,8 +93,7 @@ def add_ipr_descriptions(ipr_string, ipr_types_and_descriptions):
     return ",".join(new_ipr_list)
 
 
-def load_ipr(ipr_types_file):
-    ipr_types = dict()
+def load_ipr(ipr_types_file, ipr_version=None):
     short_types = {
         "Active_site": "S",
         "Binding_site": "S",
@@ -107,14 +104,10 @@ def load_ipr(ipr_types_file):
         "PTM": "S",
         "Repeat": "R",
     }
-    with open(ipr_types_file) as file_in:
-        for line in file_in:
-            if line.startswith("IPR"):
-                acc, ipr_type, desc = line.strip().split("\t")
-                ipr_types.setdefault(acc, {}).update(
-                    {"type": short_types[ipr_type], "desc": desc}
-                )
-    return ipr_types
+    return {
+        acc: {"type": short_types[ipr_type], "desc": desc}
+        for acc, (ipr_type, desc) in load_entries(ipr_types_file, ipr_version).items()
+    }
 
 
 def parse_args():
@@ -128,6 +121,14 @@ def parse_args():
         required=True,
         help="The path to the entries.list file from InterPro.",
     )
+    parser.add_argument(
+        "--ipr-version",
+        required=False,
+        help=(
+            "InterPro release of --ipr-entries. If given, a snapshot of the entry list is only "
+            "used if it was built from this release."
+        ),
+    )
     parser.add_argument(
         "-i",
         dest="infile",
@@ -149,4 +150,5 @@ if __name__ == "__main__":
         args.ipr_entries,
         args.infile,
         args.outfile,
+        args.ipr_version,
     )
@@ -15,7 +15,8 @@
 #
 
 import argparse
-import re
+
+from gff_attributes import parse_attributes
 
 
 def main(input_file, output_file):
@@ -37,10 +38,7 @@ def main(input_file, output_file):
 
             # Parse the attributes (column 9)
             attributes = columns[8].rstrip(";")
-            attributes_dict = dict(
-                re.split(r"(?<!\\)=", item)
-                for item in re.split(r"(?<!\\);", attributes)
-            )
+            attributes_dict = parse_attributes(attributes)
 
             # Add locus_tag based on the ID field
             if "ID" in attributes_dict:
@@ -17,10 +17,11 @@
 import argparse
 import filecmp
 import logging
-import re
 import shutil
 import sys
 
+from gff_attributes import parse_attributes, serialize_attributes
+
 logging.basicConfig(level=logging.INFO)
 
 
@@ -51,10 +52,7 @@ def main(pseudofinder_file, standard_gff, compliant_gff, outfile):
                     file_out.write(line)
                 else:
                     parts = line.strip().split("\t")
-                    attributes_dict = dict(
-                        re.split(r"(?<!\\)=", item)
-                        for item in re.split(r"(?<!\\);", parts[8])
-                    )
+                    attributes_dict = parse_attributes(parts[8])
                     for attribute_name, attribute_value in attributes_dict.items():
                         if attribute_name == "old_locus_tag":
                             locus_tags = attribute_value.split(",")
@@ -76,10 +74,7 @@ def main(pseudofinder_file, standard_gff, compliant_gff, outfile):
                                     new_locus_tags.append(locus_tag)
                             new_locus_tag_value = ",".join(new_locus_tags)
                             attributes_dict["old_locus_tag"] = new_locus_tag_value
-                    new_col_9 = ""
-                    for key, value in attributes_dict.items():
-                        new_col_9 += f"{key}={value};"
-                    parts[8] = new_col_9.rstrip(";")
+                    parts[8] = serialize_attributes(attributes_dict)
                     parts[0] = chromosome_dictionary[parts[0]]
                     modified_line = "\t".join(parts)
                     file_out.write(modified_line + "\n")
@@ -155,10 +150,7 @@ def load_gff(gff_file, chromosome_dictionary):
                 if chromosome in chromosome_dictionary:
                     chromosome = chromosome_dictionary[chromosome]
                 if feature == "CDS":
-                    attributes_dict = dict(
-                        re.split(r"(?<!\\)=", item)
-                        for item in re.split(r"(?<!\\);", col9)
-                    )
+                    attributes_dict = parse_attributes(col9)
                     location = f"{chromosome}={start}={end}={strand}"
                     genes[location] = attributes_dict["locus_tag"]
     return genes
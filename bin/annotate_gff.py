@@ -15,9 +15,32 @@
 #
 
 import argparse
+import bisect
 import csv
-import re
+import heapq
+import os
+import shutil
 import sys
+from operator import itemgetter
+
+from eggnog_annotations import load_eggnog_annotations
+from gff_attributes import (
+    insert_attribute_after,
+    parse_attributes,
+    serialize_attributes,
+)
+from interproscan_results import load_interproscan_results
+
+BGC_TOOLS = ("sanntis", "gecco", "antismash")
+# annotation table columns that are added to column 9 of a CDS, in the order they are printed
+ATTRIBUTE_COLUMNS = ("eggnog", "ipr", "bgc", "amr", "dbcan", "defense_finder")
+# feature type and ncRNA class of Rfam families, updated with each Rfam release
+RFAM_CLASSES_FILE = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    os.pardir,
+    "assets",
+    "rfam_ncrna_classes.tsv",
+)
 
 
 def main(
@@ -36,12 +59,11 @@ def main(
     trnascan_file,
     outfile,
     pseudogene_report_file,
+    eggnog_cache=None,
+    rfam_classes_file=RFAM_CLASSES_FILE,
 ):
-    # load annotations and add them to existing CDS
-    # here header contains leading GFF lines starting with "#",
-    # main_gff_extended is a dictionary that contains Prokka GFF lines with added in additional annotations
-    # fasta is the fasta portion of the Prokka GFF files
-    header, main_gff_extended, fasta, pseudogene_report_dict = load_annotations(
+    # load annotations that will be added to existing CDS
+    annotation_table = load_annotations(
         gff,
         eggnog_file,
         ipr_file,
@@ -52,16 +74,17 @@ def main(
         dbcan_file,
         defense_finder_file,
         pseudofinder_file,
+        eggnog_cache,
     )
 
-    ncrnas = get_ncrnas(rfam_file)
+    ncrnas = get_ncrnas(rfam_file, rfam_classes_file)
     trnas = get_trnas(trnascan_file)
     crispr_annotations = {}
-    if args.crispr:
+    if crispr_file:
         crispr_annotations = load_crispr(crispr_file)
 
-    write_results_to_file(
-        outfile, header, main_gff_extended, fasta, ncrnas, trnas, crispr_annotations
+    pseudogene_report_dict = write_results_to_file(
+        gff, outfile, annotation_table, ncrnas, trnas, crispr_annotations
     )
 
     if pseudogene_report_file:
@@ -69,30 +92,107 @@ def main(
 
 
 def write_results_to_file(
-    outfile, header, main_gff_extended, fasta, ncrnas, trnas, crispr_annotations
+    in_gff, outfile, annotation_table, ncrnas, trnas, crispr_annotations
 ):
-    with open(outfile, "w") as file_out:
-        file_out.write("\n".join(header) + "\n")
-        contig_list = list(main_gff_extended.keys())
-        # check if there are any contigs that don't have CDS; if so add them in
-        contig_list = check_for_additional_keys(
-            ncrnas, trnas, crispr_annotations, contig_list
-        )
-        for contig in contig_list:
-            sorted_pos_list = sort_positions(
-                contig, main_gff_extended, ncrnas, trnas, crispr_annotations
+    """
+    Stream the gene caller GFF into the output file, adding annotations to each CDS and merging in
+    ncRNA, tRNA and CRISPR records by position. The FASTA section is copied to the output without
+    being parsed.
+
+    :return: pseudogene report dictionary
+    """
+    pseudogene_report_dict = dict()
+    with open(in_gff) as file_in, open(outfile, "w") as file_out:
+        for line in generate_annotated_lines(
+            file_in,
+            annotation_table,
+            ncrnas,
+            trnas,
+            crispr_annotations,
+            pseudogene_report_dict,
+        ):
+            file_out.write(line)
+        # the generator stops after the ##FASTA line, the rest of the file is the FASTA section
+        shutil.copyfileobj(file_in, file_out)
+    return pseudogene_report_dict
+
+
+def generate_annotated_lines(
+    file_in, annotation_table, ncrnas, trnas, crispr_annotations, pseudogene_report_dict
+):
+    """
+    Yield the lines of the annotated GFF, each ending with a newline. Only the records of one
+    contig are held in memory at a time. Reading stops after the ##FASTA line, which is the last
+    line yielded, so the FASTA section can be copied from file_in by the caller.
+
+    ncrnas, trnas and crispr_annotations are dictionaries where key = contig, value = list of
+    (start, record) tuples sorted by start. Pseudogenes are added to pseudogene_report_dict.
+    """
+    written_contigs = set()
+    contig_records = list()
+    current_contig = None
+    fasta_header = None
+    for line in file_in:
+        if line.startswith("##FASTA"):
+            fasta_header = line
+            break
+        elif line.startswith("#"):
+            # header lines come before the first feature in Prokka and Bakta GFFs
+            yield line.rstrip("\n") + "\n"
+            continue
+        elif not line.strip():
+            continue
+        record = add_annotations_to_line(line, annotation_table, pseudogene_report_dict)
+        if not record:
+            continue
+        contig, start, annotated_line = record
+        if contig != current_contig:
+            if contig in written_contigs:
+                sys.exit(
+                    f"Records for contig {contig} are not consecutive in {file_in.name}. The GFF "
+                    f"must be sorted by contig."
+                )
+            yield from contig_lines(
+                current_contig, contig_records, ncrnas, trnas, crispr_annotations
             )
-            for pos in sorted_pos_list:
-                for my_dict in (ncrnas, trnas, crispr_annotations, main_gff_extended):
-                    if contig in my_dict and pos in my_dict[contig]:
-                        for line in my_dict[contig][pos]:
-                            if type(line) is str:
-                                file_out.write(f"{line}\n")
-                            else:
-                                for element in line:
-                                    file_out.write(element)
-        for line in fasta:
-            file_out.write(f"{line}\n")
+            written_contigs.add(current_contig)
+            current_contig = contig
+            contig_records = list()
+        contig_records.append((start, annotated_line))
+    yield from contig_lines(
+        current_contig, contig_records, ncrnas, trnas, crispr_annotations
+    )
+    written_contigs.add(current_contig)
+    # add contigs that don't have CDS
+    for my_dict in (ncrnas, trnas, crispr_annotations):
+        for contig in my_dict:
+            if contig not in written_contigs:
+                yield from contig_lines(
+                    contig, list(), ncrnas, trnas, crispr_annotations
+                )
+                written_contigs.add(contig)
+    if fasta_header:
+        yield fasta_header.rstrip("\n") + "\n"
+
+
+def contig_lines(contig, contig_records, ncrnas, trnas, crispr_annotations):
+    if contig is None:
+        return
+    # sort is stable, so records that share a start position keep their order from the input
+    contig_records.sort(key=itemgetter(0))
+    # at equal positions ncRNAs are printed first and gene caller records last
+    merged_records = heapq.merge(
+        ncrnas.get(contig, list()),
+        trnas.get(contig, list()),
+        crispr_annotations.get(contig, list()),
+        contig_records,
+        key=itemgetter(0),
+    )
+    for _, record in merged_records:
+        if type(record) is str:
+            yield f"{record}\n"
+        else:
+            yield from record
 
 
 def print_pseudogene_report(pseudogene_report_dict, pseudogene_report_file):
@@ -115,105 +215,97 @@ def print_pseudogene_report(pseudogene_report_dict, pseudogene_report_file):
             writer.writerow(line)
 
 
-def sort_positions(contig, main_gff_extended, ncrnas, trnas, crispr_annotations):
-    sorted_pos_list = list()
-    for my_dict in (main_gff_extended, ncrnas, trnas, crispr_annotations):
-        if contig in my_dict:
-            sorted_pos_list += list(my_dict[contig].keys())
-    return sorted(list(set(sorted_pos_list)))
-
-
-def check_for_additional_keys(ncrnas, trnas, crispr_annotations, contig_list):
-    for my_dict in (ncrnas, trnas, crispr_annotations):
-        dict_keys = set(my_dict.keys())
-        absent_keys = dict_keys - set(contig_list)
-        if absent_keys:
-            contig_list = contig_list + list(absent_keys)
-    return contig_list
-
-
 def get_iprs(ipr_annot):
     iprs = {}
     antifams = list()
     if not ipr_annot:
         return iprs, antifams
-    with open(ipr_annot) as f:
-        for line in f:
-            cols = line.strip().split("\t")
-            protein = cols[0]
-            try:
-                evalue = float(cols[8])
-            except ValueError:
-                continue
-            if evalue > 1e-10:
-                continue
-            if cols[3] == "AntiFam":
-                antifams.append(protein)
-                continue
-            if protein not in iprs:
-                iprs[protein] = [set(), set()]
-            if cols[3] == "Pfam":
-                pfam = cols[4]
-                iprs[protein][0].add(pfam)
-            if len(cols) > 12:
-                ipr = cols[11]
-                if not ipr == "-":
-                    iprs[protein][1].add(ipr)
+    ips_results = load_interproscan_results(ipr_annot)
+    for protein, db, sig_acc, ipr_acc in zip(
+        ips_results["protein"],
+        ips_results["db"],
+        ips_results["sig_acc"],
+        ips_results["ipr_acc"],
+    ):
+        if db == "AntiFam":
+            antifams.append(protein)
+            continue
+        if protein not in iprs:
+            iprs[protein] = [set(), set()]
+        if db == "Pfam":
+            iprs[protein][0].add(sig_acc)
+        if not ipr_acc == "-":
+            iprs[protein][1].add(ipr_acc)
     return iprs, antifams
 
 
-def get_eggnog(eggnog_annot):
+def get_eggnog(eggnog_annot, cache_file=None):
     eggnogs = {}
-    with open(eggnog_annot) as f:
-        for line in f:
-            line = line.rstrip()
-            cols = line.split("\t")
-            if line.startswith("#"):
-                eggnog_fields = get_eggnog_fields(line)
-            else:
-                try:
-                    evalue = float(cols[2])
-                except ValueError:
-                    continue
-                if evalue > 1e-10:
-                    continue
-                protein = cols[0]
-                eggnog = [cols[1]]
-
-                cog = list(cols[eggnog_fields["cog_func"]])
-                if len(cog) > 1:
-                    cog = ["R"]
-
-                kegg = cols[eggnog_fields["KEGG_ko"]].split(",")
-                # Todo: I added splitting to GO, check that I don't break anything later on
-                go = cols[eggnog_fields["GOs"]].split(",")
-                eggnogs[protein] = [eggnog, cog, kegg, go]
+    for protein, record in load_eggnog_annotations(eggnog_annot, cache_file).items():
+        cog = list(record.cog_category)
+        if len(cog) > 1:
+            cog = ["R"]
+        kegg = record.kegg_ko.split(",")
+        # Todo: I added splitting to GO, check that I don't break anything later on
+        go = record.gos.split(",")
+        eggnogs[protein] = [[record.seed_ortholog], cog, kegg, go]
     return eggnogs
 
 
-def get_eggnog_fields(line):
-    cols = line.strip().split("\t")
-    try:
-        index_of_go = cols.index("GOs")
-    except ValueError:
-        sys.exit("Cannot find the GO terms column.")
-    if cols[8] == "KEGG_ko" and cols[15] == "CAZy":
-        eggnog_fields = {"KEGG_ko": 8, "cog_func": 20, "GOs": index_of_go}
-    elif cols[11] == "KEGG_ko" and cols[18] == "CAZy":
-        eggnog_fields = {"KEGG_ko": 11, "cog_func": 6, "GOs": index_of_go}
-    else:
-        sys.exit("Cannot parse eggNOG - unexpected field order or naming")
-    return eggnog_fields
+def get_bgcs(bgc_files, prokka_gff):
+    """
+    Assign BGC annotations to the CDSs that fall entirely within a cluster predicted by
+    SanntiS, GECCO or antiSMASH. Clusters from all tools are loaded into one per-contig
+    index so that the gene caller GFF only needs to be read once.
 
-
-def get_bgcs(bgc_file, prokka_gff, tool):
-    cluster_positions = dict()
-    tool_result = dict()
+    :param bgc_files: dictionary where key = tool name, value = path to the tool's GFF (can be None)
+    :param prokka_gff: GFF produced by the gene caller
+    :return: dictionary where key = CDS ID, value = dictionary of BGC attributes (in BGC_TOOLS order)
+    """
+    cluster_index = dict()
+    for tool in BGC_TOOLS:
+        load_bgc_clusters(bgc_files.get(tool), tool, cluster_index)
     bgc_annotations = dict()
-    if not bgc_file:
+    if not cluster_index:
         return bgc_annotations
-    # save positions of each BGC cluster to dictionary cluster_positions
-    # and save the annotations to dictionary bgc_result
+    for contig in cluster_index:
+        cluster_index[contig] = build_interval_index(cluster_index[contig])
+    # identify CDSs that fall into each of the clusters annotated by the BGC tools
+    with open(prokka_gff) as gff_in:
+        for line in gff_in:
+            if line.startswith("##FASTA"):
+                break
+            elif line.startswith("#"):
+                continue
+            cols = line.strip().split("\t")
+            if cols[0] not in cluster_index:
+                continue
+            # if a CDS is in more than one cluster from the same tool, the first cluster listed
+            # in that tool's output is used
+            best_matches = dict()
+            for _, _, order, tool, annotation in find_enclosing_clusters(
+                cluster_index[cols[0]], int(cols[3]), int(cols[4])
+            ):
+                if tool not in best_matches or order < best_matches[tool][0]:
+                    best_matches[tool] = (order, annotation)
+            if best_matches:
+                cds_id = cols[8].split(";")[0].split("=")[1]
+                cds_annotation = bgc_annotations.setdefault(cds_id, dict())
+                for tool in BGC_TOOLS:
+                    if tool in best_matches:
+                        for key, value in best_matches[tool][1].items():
+                            cds_annotation.setdefault(key, value)
+    return bgc_annotations
+
+
+def load_bgc_clusters(bgc_file, tool, cluster_index):
+    """
+    Save positions and annotations of clusters predicted by a BGC tool to cluster_index where
+    key = contig name, value = list of (start, end, order in file, tool, annotation dictionary).
+    """
+    if not bgc_file:
+        return cluster_index
+    order = 0
     with open(bgc_file) as bgc_in:
         for line in bgc_in:
             if not line.startswith("#"):
@@ -236,12 +328,17 @@ def get_bgcs(bgc_file, prokka_gff, tool):
                             class_value = a.split("=")[1]
                         elif a.startswith("nearest_MiBIG="):
                             mibig_value = a.split("=")[1]
+                    annotation = {
+                        "nearest_MiBIG": mibig_value,
+                        "nearest_MiBIG_class": class_value,
+                    }
                 elif tool == "gecco":
                     for a in annotations.split(
                         ";"
                     ):  # go through all parts of the annotation field
                         if a.startswith("Type="):
                             type_value = a.split("=")[1]
+                    annotation = {"gecco_bgc_type": type_value}
                 elif tool == "antismash":
                     if feature != "CDS":
                         continue
@@ -250,90 +347,39 @@ def get_bgcs(bgc_file, prokka_gff, tool):
                     ):  # go through all parts of the annotation field
                         if a.startswith("function="):
                             type_value = a.split("=")[1]
-                # save cluster positions to a dictionary where key = contig name,
-                # value = list of position pairs (list of lists)
-                cluster_positions.setdefault(contig, list()).append(
-                    [int(start_pos), int(end_pos)]
+                    annotation = {"antismash_bgc_function": type_value}
+                cluster_index.setdefault(contig, list()).append(
+                    (int(start_pos), int(end_pos), order, tool, annotation)
                 )
-                # save BGC annotations to dictionary where key = contig, value = dictionary, where
-                # key = 'start_end' of BGC, value = dictionary, where key = feature type, value = description
-                if tool == "sanntis":
-                    tool_result.setdefault(contig, dict()).setdefault(
-                        "_".join([start_pos, end_pos]),
-                        {
-                            "nearest_MiBIG_class": class_value,
-                            "nearest_MiBIG": mibig_value,
-                        },
-                    )
-                elif tool == "gecco":
-                    tool_result.setdefault(contig, dict()).setdefault(
-                        "_".join([start_pos, end_pos]),
-                        {"bgc_type": type_value},
-                    )
-                elif tool == "antismash":
-                    tool_result.setdefault(contig, dict()).setdefault(
-                        "_".join([start_pos, end_pos]),
-                        {"bgc_function": type_value},
-                    )
-    # identify CDSs that fall into each of the clusters annotated by the BGC tool
-    with open(prokka_gff) as gff_in:
-        for line in gff_in:
-            if not line.startswith("#"):
-                matching_interval = ""
-                (
-                    contig,
-                    _,
-                    _,
-                    start_pos,
-                    end_pos,
-                    _,
-                    _,
-                    _,
-                    annotations,
-                ) = line.strip().split("\t")
-                if contig in cluster_positions:
-                    for i in cluster_positions[contig]:
-                        if int(start_pos) in range(i[0], i[1] + 1) and int(
-                            end_pos
-                        ) in range(i[0], i[1] + 1):
-                            matching_interval = "_".join([str(i[0]), str(i[1])])
-                            break
-                # if the CDS is in an interval, save cluster's annotation to this CDS
-                if matching_interval:
-                    cds_id = annotations.split(";")[0].split("=")[1]
-                    if tool == "sanntis":
-                        bgc_annotations.setdefault(
-                            cds_id,
-                            {
-                                "nearest_MiBIG": tool_result[contig][matching_interval][
-                                    "nearest_MiBIG"
-                                ],
-                                "nearest_MiBIG_class": tool_result[contig][
-                                    matching_interval
-                                ]["nearest_MiBIG_class"],
-                            },
-                        )
-                    elif tool == "gecco":
-                        bgc_annotations.setdefault(
-                            cds_id,
-                            {
-                                "gecco_bgc_type": tool_result[contig][
-                                    matching_interval
-                                ]["bgc_type"],
-                            },
-                        )
-                    elif tool == "antismash":
-                        bgc_annotations.setdefault(
-                            cds_id,
-                            {
-                                "antismash_bgc_function": tool_result[contig][
-                                    matching_interval
-                                ]["bgc_function"],
-                            },
-                        )
-            elif line.startswith("##FASTA"):
-                break
-    return bgc_annotations
+                order += 1
+    return cluster_index
+
+
+def build_interval_index(clusters):
+    """
+    Sort the clusters on a contig by start position and record the running maximum end position
+    so that find_enclosing_clusters can stop as soon as no earlier cluster can reach the CDS end.
+    """
+    clusters = sorted(clusters)
+    starts = [cluster[0] for cluster in clusters]
+    max_ends = list()
+    max_end = 0
+    for cluster in clusters:
+        max_end = max(max_end, cluster[1])
+        max_ends.append(max_end)
+    return starts, max_ends, clusters
+
+
+def find_enclosing_clusters(contig_index, start, end):
+    starts, max_ends, clusters = contig_index
+    enclosing = list()
+    # only clusters that start at or before the CDS start can contain it
+    i = bisect.bisect_right(starts, start) - 1
+    while i >= 0 and max_ends[i] >= end:
+        if clusters[i][1] >= end:
+            enclosing.append(clusters[i])
+        i -= 1
+    return enclosing
 
 
 def get_amr(amr_file):
@@ -466,9 +512,7 @@ def get_pseudogenes(pseudofinder_file):
         for line in file_in:
             if not line.startswith("#"):
                 col9 = line.strip().split("\t")[8]
-                attributes_dict = dict(
-                    re.split(r"(?<!\\)=", item) for item in re.split(r"(?<!\\);", col9)
-                )
+                attributes_dict = parse_attributes(col9)
                 if "note" in attributes_dict:
                     note = attributes_dict["note"]
                 else:
@@ -492,185 +536,186 @@ def load_annotations(
     dbcan_file,
     defense_finder_file,
     pseudofinder_file,
+    eggnog_cache=None,
 ):
-    eggnogs = get_eggnog(eggnog_file)
+    eggnogs = get_eggnog(eggnog_file, eggnog_cache)
     iprs, antifams = get_iprs(ipr_file)
-    sanntis_bgcs = get_bgcs(sanntis_file, in_gff, tool="sanntis")
-    gecco_bgcs = get_bgcs(gecco_file, in_gff, tool="gecco")
-    antismash_bgcs = get_bgcs(antismash_file, in_gff, tool="antismash")
+    bgcs = get_bgcs(
+        {"sanntis": sanntis_file, "gecco": gecco_file, "antismash": antismash_file},
+        in_gff,
+    )
     amr_annotations = get_amr(amr_file)
     dbcan_annotations = get_dbcan(dbcan_file)
     defense_finder_annotations = get_defense_finder(defense_finder_file)
     pseudogenes = get_pseudogenes(pseudofinder_file)
-    pseudogene_report_dict = dict()
-    added_annot = {}
-    main_gff = dict()
-    header = []
-    fasta = []
-    fasta_flag = False
-    with open(in_gff) as f:
-        for line in f:
-            line = line.strip()
-            if line[0] != "#" and not fasta_flag:
-                line = line.replace("db_xref", "Dbxref")
-                line = line.replace(";note=", ";Note=")
-                line = line.replace("‘", "'").replace("’", "'")
-                cols = line.split("\t")
-                if len(cols) == 9:
-                    contig, caller, feature, start, annot = (
-                        cols[0],
-                        cols[1],
-                        cols[2],
-                        cols[3],
-                        cols[8],
-                    )
-                    if feature != "CDS":
-                        if caller == "Bakta" and feature == "region":
-                            main_gff.setdefault(contig, dict()).setdefault(
-                                int(start), list()
-                            ).append(line)
-                            continue
-                        else:
-                            continue
-                    protein = annot.split(";")[0].split("=")[-1]
-                    if protein in antifams:
-                        # Don't print to the final GFF proteins that are known to not be real
-                        continue
-                    added_annot[protein] = {}
-                    # process pseudogenes
-                    if "pseudo=true" in annot.lower():
-                        # fix case
-                        cols[8] = annot.replace("pseudo=True", "pseudo=true")
-                        # gene is already marked as a pseudogene; log it but don't add to the annotation again
-                        pseudogene_report_dict.setdefault(protein, dict())
-                        pseudogene_report_dict[protein]["gene_caller"] = True
-                        if protein in pseudogenes:
-                            pseudogene_report_dict[protein]["pseudofinder"] = True
-                        else:
-                            pseudogene_report_dict[protein]["pseudofinder"] = False
-                    else:
-                        # gene caller did not detect this protein as a pseudogene; check if pseudofinder did
-                        if protein in pseudogenes:
-                            pseudogene_report_dict.setdefault(protein, dict())
-                            pseudogene_report_dict[protein]["gene_caller"] = False
-                            pseudogene_report_dict[protein]["pseudofinder"] = True
-                            added_annot[protein]["pseudo"] = "true"
-                            if pseudogenes[protein]:
-                                cols[8] = add_pseudogene_to_note(
-                                    pseudogenes[protein], cols[8]
-                                )
-                    # record antifams
-                    if protein in antifams:
-                        pseudogene_report_dict.setdefault(protein, dict())
-                        pseudogene_report_dict[protein]["antifams"] = True
-                    try:
-                        eggnogs[protein]
-                        pos = 0
-                        for a in eggnogs[protein]:
-                            pos += 1
-                            if a != [""] and a != ["NA"]:
-                                if pos == 1:
-                                    added_annot[protein]["eggNOG"] = a
-                                elif pos == 2:
-                                    added_annot[protein]["cog"] = a
-                                elif pos == 3:
-                                    added_annot[protein]["kegg"] = a
-                                elif pos == 4:
-                                    added_annot[protein]["Ontology_term"] = a
-                    except KeyError:
-                        pass
-                    try:
-                        iprs[protein]
-                        pos = 0
-                        for a in iprs[protein]:
-                            pos += 1
-                            a = list(a)
-                            if a != [""] and a:
-                                if pos == 1:
-                                    added_annot[protein]["pfam"] = sorted(a)
-                                elif pos == 2:
-                                    added_annot[protein]["interpro"] = sorted(a)
-                    except KeyError:
-                        pass
-                    try:
-                        sanntis_bgcs[protein]
-                        for key, value in sanntis_bgcs[protein].items():
-                            added_annot[protein][key] = value
-                    except KeyError:
-                        pass
-                    try:
-                        gecco_bgcs[protein]
-                        for key, value in gecco_bgcs[protein].items():
-                            added_annot[protein][key] = value
-                    except KeyError:
-                        pass
-                    try:
-                        antismash_bgcs[protein]
-                        for key, value in antismash_bgcs[protein].items():
-                            added_annot[protein][key] = value
-                    except KeyError:
-                        pass
-                    try:
-                        amr_annotations[protein]
-                        added_annot[protein]["AMR"] = amr_annotations[protein]
-                    except KeyError:
-                        pass
-                    try:
-                        dbcan_annotations[protein]
-                        added_annot[protein]["dbCAN"] = dbcan_annotations[protein]
-                    except KeyError:
-                        pass
-                    try:
-                        defense_finder_annotations[protein]
-                        added_annot[protein]["defense_finder"] = (
-                            defense_finder_annotations[protein]
-                        )
-                    except KeyError:
-                        pass
-                    for a in added_annot[protein]:
-                        value = added_annot[protein][a]
-                        if type(value) is list:
-                            value = ",".join(value)
-                        if a in ["AMR", "dbCAN", "defense_finder"]:
-                            cols[8] = f"{cols[8]};{value}"
-                        else:
-                            if not value == "-":
-                                cols[8] = f"{cols[8]};{a}={value}"
-                    line = "\t".join(cols)
-                    main_gff.setdefault(contig, dict()).setdefault(
-                        int(start), list()
-                    ).append(line)
-            elif line.startswith("#"):
-                if line == "##FASTA":
-                    fasta_flag = True
-                    fasta.append(line)
-                else:
-                    header.append(line)
-            elif fasta_flag:
-                fasta.append(line)
-    return header, main_gff, fasta, pseudogene_report_dict
+    return build_annotation_table(
+        eggnogs,
+        iprs,
+        antifams,
+        bgcs,
+        amr_annotations,
+        dbcan_annotations,
+        defense_finder_annotations,
+        pseudogenes,
+    )
 
 
-def add_pseudogene_to_note(note_text, col9):
-    col9_dict = dict(
-        re.split(r"(?<!\\)=", item) for item in re.split(r"(?<!\\);", col9)
+def build_annotation_table(
+    eggnogs,
+    iprs,
+    antifams,
+    bgcs,
+    amr_annotations,
+    dbcan_annotations,
+    defense_finder_annotations,
+    pseudogenes,
+):
+    """
+    Join the annotations from all sources into one table keyed by protein ID. Each protein is
+    given a row number in protein_index; each column is a list with one value per row. Columns in
+    ATTRIBUTE_COLUMNS hold the ready-to-print column 9 text added by that source (or None), so a
+    CDS only needs one lookup to collect all of its annotations in a fixed order.
+
+    :return: dictionary with keys "protein_index" (protein ID -> row) and "columns" (name -> list)
+    """
+    protein_index = dict()
+    columns = {name: list() for name in ATTRIBUTE_COLUMNS + ("antifam", "pseudofinder")}
+
+    def set_value(protein, column_name, value):
+        row = protein_index.get(protein)
+        if row is None:
+            row = len(protein_index)
+            protein_index[sys.intern(protein)] = row
+            for column in columns.values():
+                column.append(None)
+        columns[column_name][row] = value
+
+    for protein, (eggnog, cog, kegg, go) in eggnogs.items():
+        set_value(
+            protein,
+            "eggnog",
+            format_attributes(
+                [
+                    ("eggNOG", eggnog),
+                    ("cog", cog),
+                    ("kegg", kegg),
+                    ("Ontology_term", go),
+                ],
+                skip_values=([""], ["NA"]),
+            ),
+        )
+    for protein, (pfams, interpro_terms) in iprs.items():
+        set_value(
+            protein,
+            "ipr",
+            format_attributes(
+                [("pfam", sorted(pfams)), ("interpro", sorted(interpro_terms))],
+                skip_values=([""], []),
+            ),
+        )
+    for protein, bgc_attributes in bgcs.items():
+        set_value(protein, "bgc", format_attributes(bgc_attributes.items()))
+    # these sources are already formatted as column 9 text
+    for column_name, source in (
+        ("amr", amr_annotations),
+        ("dbcan", dbcan_annotations),
+        ("defense_finder", defense_finder_annotations),
+    ):
+        for protein, value in source.items():
+            set_value(protein, column_name, f";{value}")
+    for protein in antifams:
+        set_value(protein, "antifam", True)
+    for protein, note in pseudogenes.items():
+        set_value(protein, "pseudofinder", note)
+    return {"protein_index": protein_index, "columns": columns}
+
+
+def format_attributes(attributes, skip_values=()):
+    """
+    Convert (key, value) pairs into column 9 text that can be appended to an existing column 9.
+    List values are joined with commas; values in skip_values and "-" are not printed.
+    """
+    formatted = ""
+    for key, value in attributes:
+        if value in skip_values:
+            continue
+        if type(value) is list:
+            value = ",".join(value)
+        if not value == "-":
+            formatted += f";{key}={value}"
+    return formatted or None
+
+
+def add_annotations_to_line(line, annotation_table, pseudogene_report_dict):
+    """
+    Add annotations to a gene caller GFF line.
+
+    :return: (contig, start, annotated line) or None if the line should not be printed
+    """
+    line = line.strip()
+    line = line.replace("db_xref", "Dbxref")
+    line = line.replace(";note=", ";Note=")
+    line = line.replace("‘", "'").replace("’", "'")
+    cols = line.split("\t")
+    if len(cols) != 9:
+        return None
+    contig, caller, feature, start, annot = (
+        cols[0],
+        cols[1],
+        cols[2],
+        cols[3],
+        cols[8],
     )
-    if "Note" in col9_dict.keys():
+    if feature != "CDS":
+        if caller == "Bakta" and feature == "region":
+            return contig, int(start), line
+        else:
+            return None
+    protein = annot.split(";")[0].split("=")[-1]
+    columns = annotation_table["columns"]
+    row = annotation_table["protein_index"].get(protein)
+    if row is not None and columns["antifam"][row]:
+        # Don't print to the final GFF proteins that are known to not be real
+        return None
+    pseudofinder_note = None if row is None else columns["pseudofinder"][row]
+    added_annot = ""
+    # process pseudogenes
+    if "pseudo=true" in annot.lower():
+        # fix case
+        cols[8] = annot.replace("pseudo=True", "pseudo=true")
+        # gene is already marked as a pseudogene; log it but don't add to the annotation again
+        pseudogene_report_dict.setdefault(protein, dict())
+        pseudogene_report_dict[protein]["gene_caller"] = True
+        pseudogene_report_dict[protein]["pseudofinder"] = pseudofinder_note is not None
+    elif pseudofinder_note is not None:
+        # gene caller did not detect this protein as a pseudogene but pseudofinder did
+        pseudogene_report_dict.setdefault(protein, dict())
+        pseudogene_report_dict[protein]["gene_caller"] = False
+        pseudogene_report_dict[protein]["pseudofinder"] = True
+        added_annot = ";pseudo=true"
+        if pseudofinder_note:
+            cols[8] = add_pseudogene_to_note(pseudofinder_note, cols[8])
+    if row is not None:
+        for column_name in ATTRIBUTE_COLUMNS:
+            value = columns[column_name][row]
+            if value:
+                added_annot += value
+    cols[8] += added_annot
+    return contig, int(start), "\t".join(cols)
+
+
+def add_pseudogene_to_note(note_text, col9):
+    col9_dict = parse_attributes(col9)
+    if "Note" in col9_dict:
         col9_dict["Note"] = col9_dict["Note"] + f", {note_text}"
-        return ";".join([f"{key}={value}" for key, value in col9_dict.items()])
     else:
         # insert note after locus tag
-        keys_list = list(col9_dict.keys())
-        locus_tag_index = keys_list.index("locus_tag")
-        new_dict = (
-            {k: col9_dict[k] for k in keys_list[: locus_tag_index + 1]}
-            | {"Note": note_text}
-            | {k: col9_dict[k] for k in keys_list[locus_tag_index + 1 :]}
-        )
-        return ";".join([f"{key}={value}" for key, value in new_dict.items()])
+        col9_dict = insert_attribute_after(col9_dict, "locus_tag", "Note", note_text)
+    return serialize_attributes(col9_dict)
 
 
-def get_ncrnas(ncrnas_file):
+def get_ncrnas(ncrnas_file, rfam_classes_file=RFAM_CLASSES_FILE):
+    rfam_classes = load_rfam_classes(rfam_classes_file)
     ncrnas = {}
     counts = 0
     with open(ncrnas_file) as f:
@@ -692,7 +737,9 @@ def get_ncrnas(ncrnas_file):
                 else:
                     start = int(cols[10])
                     end = int(cols[9])
-                rna_feature_name, ncrna_class = prepare_rna_gff_fields(cols)
+                rna_feature_name, ncrna_class = prepare_rna_gff_fields(
+                    cols, rfam_classes
+                )
                 annot = [
                     "ID=" + locus,
                     "inference=Rfam:14.9",
@@ -716,165 +763,39 @@ def get_ncrnas(ncrnas_file):
                         annot,
                     ]
                 )
-                ncrnas.setdefault(contig, dict()).setdefault(start, list()).append(
-                    newline
-                )
+                ncrnas.setdefault(contig, list()).append((start, newline))
+    for contig_ncrnas in ncrnas.values():
+        contig_ncrnas.sort(key=itemgetter(0))
     return ncrnas
 
 
-def prepare_rna_gff_fields(cols):
-    rna_feature_name = "ncRNA"
-    if cols[1] in ["LSU_rRNA_bacteria", "SSU_rRNA_bacteria", "5S_rRNA"]:
-        rna_feature_name = "rRNA"
-    ncrna_class = ""
-    rna_types = {
-        "antisense_RNA": [
-            "RF00039",
-            "RF00042",
-            "RF00057",
-            "RF00106",
-            "RF00107",
-            "RF00236",
-            "RF00238",
-            "RF00240",
-            "RF00242",
-            "RF00262",
-            "RF00388",
-            "RF00489",
-            "RF01695",
-            "RF01794",
-            "RF01797",
-            "RF01809",
-            "RF01813",
-            "RF02194",
-            "RF02235",
-            "RF02236",
-            "RF02237",
-            "RF02238",
-            "RF02239",
-            "RF02519",
-            "RF02550",
-            "RF02558",
-            "RF02559",
-            "RF02560",
-            "RF02563",
-            "RF02592",
-            "RF02662",
-            "RF02674",
-            "RF02735",
-            "RF02743",
-            "RF02792",
-            "RF02793",
-            "RF02812",
-            "RF02818",
-            "RF02819",
-            "RF02820",
-            "RF02839",
-            "RF02843",
-            "RF02844",
-            "RF02846",
-            "RF02850",
-            "RF02851",
-            "RF02855",
-            "RF02873",
-            "RF02874",
-            "RF02875",
-            "RF02876",
-            "RF02891",
-            "RF02892",
-            "RF02903",
-            "RF02908",
-        ],
-        "autocatalytically_spliced_intron": ["RF01807"],
-        "ribozyme": [
-            "RF00621",
-            "RF01787",
-            "RF01788",
-            "RF01865",
-            "RF02678",
-            "RF02679",
-            "RF02681",
-            "RF02682",
-            "RF02684",
-            "RF03154",
-            "RF03160",
-            "RF04188",
-        ],
-        "hammerhead_ribozyme": [
-            "RF00008",
-            "RF00163",
-            "RF02275",
-            "RF02276",
-            "RF02277",
-            "RF03152",
-        ],
-        "RNase_P_RNA": [
-            "RF00009",
-            "RF00010",
-            "RF00011",
-            "RF00373",
-            "RF01577",
-            "RF02357",
-        ],
-        "RNase_MRP_RNA": ["RF00030", "RF02472"],
-        "telomerase_RNA": ["RF00024", "RF00025", "RF01050", "RF02462"],
-        "scaRNA": [
-            "RF00231",
-            "RF00283",
-            "RF00286",
-            "RF00422",
-            "RF00423",
-            "RF00424",
-            "RF00426",
-            "RF00427",
-            "RF00478",
-            "RF00492",
-            "RF00553",
-            "RF00564",
-            "RF00565",
-            "RF00582",
-            "RF00601",
-            "RF00602",
-            "RF01268",
-            "RF01295",
-            "RF02665",
-            "RF02666",
-            "RF02667",
-            "RF02668",
-            "RF02669",
-            "RF02670",
-            "RF02718",
-            "RF02719",
-            "RF02720",
-            "RF02721",
-            "RF02722",
-        ],
-        "snRNA": ["RF01802"],
-        "SRP_RNA": [
-            "RF00017",
-            "RF00169",
-            "RF01502",
-            "RF01570",
-            "RF01854",
-            "RF01855",
-            "RF01856",
-            "RF01857",
-            "RF04183",
-        ],
-        "vault_RNA": ["RF00006"],
-        "Y_RNA": ["RF00019", "RF02553", "RF01053", "RF02565"],
-    }
-
-    if rna_feature_name == "ncRNA":
-        for rna_type, rfams in rna_types.items():
-            if cols[2] in rfams:
-                ncrna_class = rna_type
-                break
-        if not ncrna_class:
-            if "microRNA" in cols[-1]:
-                ncrna_class = "pre_miRNA"
-            else:
-                ncrna_class = "other"
+def load_rfam_classes(rfam_classes_file):
+    """
+    Load the table that gives the feature type and ncRNA class of Rfam families.
+
+    :param rfam_classes_file: TSV with the columns rfam_accession, feature and ncrna_class ("-" if
+        the feature has no class); lines starting with "#" are comments
+    :return: dictionary where key = Rfam accession, value = (feature, ncRNA class or "")
+    """
+    rfam_classes = dict()
+    with open(rfam_classes_file) as file_in:
+        for line in file_in:
+            if line.startswith("#") or line.startswith("rfam_accession"):
+                continue
+            accession, rna_feature_name, ncrna_class = line.rstrip("\n").split("\t")
+            if ncrna_class == "-":
+                ncrna_class = ""
+            rfam_classes[accession] = (rna_feature_name, ncrna_class)
+    return rfam_classes
+
+
+def prepare_rna_gff_fields(cols, rfam_classes):
+    rna_feature_name, ncrna_class = rfam_classes.get(cols[2], ("ncRNA", ""))
+    if rna_feature_name == "ncRNA" and not ncrna_class:
+        if "microRNA" in cols[-1]:
+            ncrna_class = "pre_miRNA"
+        else:
+            ncrna_class = "other"
     return rna_feature_name, ncrna_class
 
 
@@ -887,9 +808,9 @@ def get_trnas(trnas_file):
                 contig, feature, start = cols[0], cols[2], cols[3]
                 if feature == "tRNA":
                     line = line.replace("tRNAscan-SE", "tRNAscan-SE:2.0.9")
-                    trnas.setdefault(contig, dict()).setdefault(
-                        int(start), list()
-                    ).append(line.strip())
+                    trnas.setdefault(contig, list()).append((int(start), line.strip()))
+    for contig_trnas in trnas.values():
+        contig_trnas.sort(key=itemgetter(0))
     return trnas
 
 
@@ -924,17 +845,20 @@ def load_crispr(crispr_file):
                     previous_end = end
                 else:
                     # the previous record is complete, started reading a new record
-                    crispr_annotations.setdefault(contig, dict()).setdefault(
-                        left_coord, list()
-                    ).append(record)
+                    crispr_annotations.setdefault(loc_contig, list()).append(
+                        (left_coord, record)
+                    )
                     record = list()
                     record.append(line)
                     previous_end = end
                     left_coord = start
+                    loc_contig = contig
         if len(record) > 0:
-            crispr_annotations.setdefault(contig, dict()).setdefault(
-                left_coord, list()
-            ).append(record)
+            crispr_annotations.setdefault(loc_contig, list()).append(
+                (left_coord, record)
+            )
+    for contig_crisprs in crispr_annotations.values():
+        contig_crisprs.sort(key=itemgetter(0))
     return crispr_annotations
 
 
@@ -942,6 +866,17 @@ def parse_args():
     parser = argparse.ArgumentParser(
         description="Add functional annotation to GFF file",
     )
+    add_annotation_arguments(parser)
+    parser.add_argument("-o", dest="outfile", help="Outfile name", required=True)
+    parser.add_argument(
+        "--pseudogene-report", help="Pseudogene report filename", required=False
+    )
+
+    return parser.parse_args()
+
+
+def add_annotation_arguments(parser):
+    """Add the arguments for the gene caller GFF and the annotation files to parser."""
     parser.add_argument(
         "-g",
         dest="gff_input",
@@ -960,6 +895,14 @@ def parse_args():
         help="eggnog annotations for the cluster repo",
         required=True,
     )
+    parser.add_argument(
+        "--eggnog-cache",
+        help=(
+            "Compact copy of the eggnog annotations. It is read instead of the eggnog "
+            "annotations if it was saved from them, otherwise it is (re)written"
+        ),
+        required=False,
+    )
     parser.add_argument(
         "-s",
         dest="sanntis",
@@ -1005,15 +948,18 @@ def parse_args():
     )
     parser.add_argument("-r", dest="rfam", help="Rfam results", required=True)
     parser.add_argument(
-        "-t", dest="trnascan", help="tRNAScan-SE results", required=True
+        "--rfam-classes",
+        help=(
+            "TSV with the feature type and ncRNA class of Rfam families. "
+            f"Default: {RFAM_CLASSES_FILE}"
+        ),
+        default=RFAM_CLASSES_FILE,
+        required=False,
     )
-    parser.add_argument("-o", dest="outfile", help="Outfile name", required=True)
     parser.add_argument(
-        "--pseudogene-report", help="Pseudogene report filename", required=False
+        "-t", dest="trnascan", help="tRNAScan-SE results", required=True
     )
 
-    return parser.parse_args()
-
 
 if __name__ == "__main__":
     args = parse_args()
@@ -1033,4 +979,6 @@ if __name__ == "__main__":
         args.trnascan,
         args.outfile,
         args.pseudogene_report,
+        args.eggnog_cache,
+        args.rfam_classes,
     )
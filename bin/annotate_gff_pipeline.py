@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Build the final GFF files in a single pass over the gene caller GFF.
+
+This runs the same stages as calling annotate_gff.py, process_unifire_output.py,
+add_hypothetical_protein_descriptions.py, prepare_gff_for_conversion.py and
+add_interpro_descriptions.py one after another, but column 9 of each CDS is parsed once and no
+intermediate GFF files are written.
+"""
+
+import argparse
+from contextlib import nullcontext
+
+from add_hypothetical_protein_descriptions import (
+    GeneCaller,
+    add_function_description,
+    load_function_sources,
+)
+from add_interpro_descriptions import add_descriptions_to_attributes
+from add_interpro_descriptions import load_ipr as load_ipr_descriptions
+from annotate_gff import (
+    RFAM_CLASSES_FILE,
+    add_annotation_arguments,
+    generate_annotated_lines,
+    get_ncrnas,
+    get_trnas,
+    load_annotations,
+    load_crispr,
+    print_pseudogene_report,
+)
+from gff_attributes import parse_attributes, serialize_attributes
+from prepare_gff_for_conversion import modify_line, prepare_attributes
+from process_unifire_output import (
+    combine_predictions,
+    load_pirsr,
+    load_unirule_arba,
+)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def main(
+    gff,
+    ipr_file,
+    eggnog_file,
+    sanntis_file,
+    crispr_file,
+    amr_file,
+    antismash_file,
+    gecco_file,
+    dbcan_file,
+    defense_finder_file,
+    pseudofinder_file,
+    rfam_file,
+    trnascan_file,
+    unifire_files,
+    ipr_types_file,
+    hierarchy_file,
+    ipr_version,
+    annotations_outfile,
+    submission_outfile,
+    descriptions_outfile,
+    pseudogene_report_file,
+    eggnog_cache=None,
+    rfam_classes_file=RFAM_CLASSES_FILE,
+):
+    annotation_table = load_annotations(
+        gff,
+        eggnog_file,
+        ipr_file,
+        sanntis_file,
+        amr_file,
+        antismash_file,
+        gecco_file,
+        dbcan_file,
+        defense_finder_file,
+        pseudofinder_file,
+        eggnog_cache,
+    )
+    ncrnas = get_ncrnas(rfam_file, rfam_classes_file)
+    trnas = get_trnas(trnascan_file)
+    crispr_annotations = {}
+    if crispr_file:
+        crispr_annotations = load_crispr(crispr_file)
+
+    unifire_predictions = dict()
+    if unifire_files:
+        arba_file, unirule_file, pirsr_file = unifire_files
+        unifire_predictions = combine_predictions(
+            [
+                load_unirule_arba(arba_file),
+                load_unirule_arba(unirule_file),
+                load_pirsr(pirsr_file),
+            ]
+        )
+    function_sources = load_function_sources(
+        ipr_types_file,
+        ipr_file,
+        hierarchy_file,
+        eggnog_file,
+        ipr_version,
+        eggnog_cache,
+    )
+    ipr_types_and_descriptions = None
+    if descriptions_outfile:
+        ipr_types_and_descriptions = load_ipr_descriptions(ipr_types_file, ipr_version)
+
+    pseudogene_report_dict = dict()
+    with open(gff) as file_in, open(annotations_outfile, "w") as annotations_out, open(
+        submission_outfile, "w"
+    ) as submission_out, (
+        open(descriptions_outfile, "w") if descriptions_outfile else nullcontext()
+    ) as descriptions_out:
+        annotated_lines = generate_annotated_lines(
+            file_in,
+            annotation_table,
+            ncrnas,
+            trnas,
+            crispr_annotations,
+            pseudogene_report_dict,
+        )
+        write_outputs(
+            annotated_lines,
+            unifire_predictions,
+            function_sources,
+            ipr_types_and_descriptions,
+            annotations_out,
+            submission_out,
+            descriptions_out,
+        )
+        # the FASTA section is the same in all outputs
+        outputs = [annotations_out, submission_out]
+        if descriptions_out:
+            outputs.append(descriptions_out)
+        copy_to_outputs(file_in, outputs)
+
+    if pseudogene_report_file:
+        print_pseudogene_report(pseudogene_report_dict, pseudogene_report_file)
+
+
+def write_outputs(
+    annotated_lines,
+    unifire_predictions,
+    function_sources,
+    ipr_types_and_descriptions,
+    annotations_out,
+    submission_out,
+    descriptions_out,
+):
+    """
+    Run the post-annotation stages over the lines produced by annotate_gff and write the
+    annotations, submission and (optionally) InterPro descriptions GFFs.
+
+    :param annotated_lines: GFF lines with annotations added, as yielded by generate_annotated_lines
+    :param unifire_predictions: UniFIRE attributes of each protein, as returned by
+        combine_predictions; empty to skip UniFIRE
+    :param function_sources: eggNOG and InterPro annotations used to name hypothetical proteins
+    :param ipr_types_and_descriptions: InterPro entry types and descriptions, only needed when
+        descriptions_out is given
+    """
+    eggnog_info, ipr_info, ipr_memberdb_only = function_sources
+    gene_caller = GeneCaller.PROKKA
+    for line in annotated_lines:
+        if line.startswith("#"):
+            annotations_out.write(line)
+            submission_out.write(line)
+            if descriptions_out:
+                descriptions_out.write(line)
+            if "Bakta" in line:
+                gene_caller = GeneCaller.BAKTA
+            continue
+        columns = line.strip().split("\t")
+        if columns[2] != "CDS":
+            annotations_out.write(line)
+            submission_out.write(modify_line(line) + "\n")
+            if descriptions_out:
+                descriptions_out.write(line)
+            continue
+        attributes_dict = parse_attributes(columns[8])
+        # unlike process_unifire_output.py, whose csv.writer ended the changed lines with \r\n,
+        # every line is written with \n
+        if attributes_dict["ID"] in unifire_predictions:
+            attributes_dict.update(unifire_predictions[attributes_dict["ID"]])
+        attributes_dict = add_function_description(
+            attributes_dict, eggnog_info, ipr_info, ipr_memberdb_only, gene_caller
+        )
+        annotations_out.write(format_line(columns, attributes_dict))
+        # the next stages change the attributes in place, so each works on its own copy
+        submission_out.write(
+            format_line(columns, prepare_attributes(dict(attributes_dict)))
+        )
+        if descriptions_out:
+            descriptions_out.write(
+                format_line(
+                    columns,
+                    add_descriptions_to_attributes(
+                        dict(attributes_dict), ipr_types_and_descriptions
+                    ),
+                )
+            )
+
+
+def format_line(columns, attributes_dict):
+    return "\t".join(columns[:8] + [serialize_attributes(attributes_dict)]) + "\n"
+
+
+def copy_to_outputs(file_in, outputs):
+    while True:
+        block = file_in.read(COPY_BUFFER_SIZE)
+        if not block:
+            break
+        for file_out in outputs:
+            file_out.write(block)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Add functional annotation to a GFF file and produce the annotated, submission and "
+            "InterPro description GFFs in one pass."
+        ),
+    )
+    add_annotation_arguments(parser)
+    parser.add_argument(
+        "--arba",
+        help="ARBA predictions output file. Requires --unirule and --pirsr.",
+        required=False,
+    )
+    parser.add_argument(
+        "--unirule",
+        help="UniRule predictions output file. Requires --arba and --pirsr.",
+        required=False,
+    )
+    parser.add_argument(
+        "--pirsr",
+        help="PIRSR predictions output file. Requires --arba and --unirule.",
+        required=False,
+    )
+    parser.add_argument(
+        "--ipr-entries",
+        help=(
+            "The path to the entry.list file from InterPro. Required with -i or "
+            "--descriptions-output."
+        ),
+        required=False,
+    )
+    parser.add_argument(
+        "--ipr-hierarchy",
+        help="The path to the ParentChildTreeFile.txt file from InterPro. Required with -i.",
+        required=False,
+    )
+    parser.add_argument(
+        "--ipr-version",
+        help=(
+            "InterPro release of --ipr-entries and --ipr-hierarchy. If given, a snapshot of the "
+            "files is only used if it was built from this release."
+        ),
+        required=False,
+    )
+    parser.add_argument(
+        "--annotations-output",
+        help="Output GFF with all annotations",
+        required=True,
+    )
+    parser.add_argument(
+        "--submission-output",
+        help="Output GFF prepared for conversion for ENA/GenBank",
+        required=True,
+    )
+    parser.add_argument(
+        "--descriptions-output",
+        help="Output GFF with descriptions added to the InterPro accessions",
+        required=False,
+    )
+    parser.add_argument(
+        "--pseudogene-report", help="Pseudogene report filename", required=False
+    )
+    args = parser.parse_args()
+
+    unifire_files = [args.arba, args.unirule, args.pirsr]
+    if any(unifire_files) and not all(unifire_files):
+        parser.error("--arba, --unirule and --pirsr must be used together")
+    if (args.ips or args.descriptions_output) and not args.ipr_entries:
+        parser.error("--ipr-entries is required with -i and --descriptions-output")
+    if args.ips and not args.ipr_hierarchy:
+        parser.error("--ipr-hierarchy is required with -i")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    unifire_files = None
+    if args.arba:
+        unifire_files = (args.arba, args.unirule, args.pirsr)
+    main(
+        args.gff_input,
+        args.ips,
+        args.eggnog,
+        args.sanntis,
+        args.crispr,
+        args.amr,
+        args.antismash,
+        args.gecco,
+        args.dbcan,
+        args.defense_finder,
+        args.pseudofinder,
+        args.rfam,
+        args.trnascan,
+        unifire_files,
+        args.ipr_entries,
+        args.ipr_hierarchy,
+        args.ipr_version,
+        args.annotations_output,
+        args.submission_output,
+        args.descriptions_output,
+        args.pseudogene_report,
+        args.eggnog_cache,
+        args.rfam_classes,
+    )
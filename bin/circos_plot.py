@@ -3,20 +3,75 @@
 import argparse
 import logging
 import sys
+from collections import defaultdict
 
+from Bio.SeqFeature import SeqFeature, SimpleLocation
 from matplotlib.patches import Patch
 from pycirclize import Circos
-from pycirclize.parser import Gff
 
 logging.basicConfig(level=logging.INFO)
 
+# feature tracks from the outside in: name, radius range and edge colour of the track axis
+TRACKS = [
+    ("f_cds", (93, 98), None),
+    ("r_cds", (88, 93), None),
+    ("rna", (83, 87), None),
+    ("antismash", (78, 80), "tomato"),
+    ("gecco", (76, 78), "lightsalmon"),
+    ("sanntis", (74, 76), "firebrick"),
+    ("dbcan", (68, 70), "forestgreen"),
+    ("amr", (62, 64), "dodgerblue"),
+    ("antiphage", (56, 58), "orchid"),
+    ("mobilome", (50, 52), "lightseagreen"),
+]
+
+# CDS qualifiers that place the CDS on an annotation track: qualifier, track and colour
+CDS_QUALIFIER_TRACKS = [
+    ("antismash_bgc_function", "antismash", "tomato"),
+    ("gecco_bgc_type", "gecco", "lightsalmon"),
+    ("nearest_MiBIG", "sanntis", "firebrick"),
+    ("dbcan_prot_type", "dbcan", "forestgreen"),
+    ("amrfinderplus_scope", "amr", "dodgerblue"),
+    ("defense_finder_type", "antiphage", "orchid"),
+]
+
+RNA_TYPES = {"tRNA", "ncRNA", "rRNA"}
+
+MOBILOME_TYPES = {
+    "mobility_island",
+    "cellular_recombinase",
+    "insertion_sequence",
+    "conjugative_element",
+    "conjugative_integron",
+    "integron",
+    "plasmid",
+    "nested_mobile_element",
+    "terminal_inverted_repeat_element",
+    "direct_repeat_element",
+    "viral_sequence",
+}
+
+# qualifiers read from the GFF, all the others are skipped
+PLOT_QUALIFIERS = {qualifier for qualifier, _, _ in CDS_QUALIFIER_TRACKS}
+
+PHAGE_TYPES = {"phage", "prophage"}
+
+# number of blocks the whole circle is split into in the low-detail mode
+LOW_DETAIL_RESOLUTION = 3600
+
 
 def main(
-    infile, outfile, prefix, contig_num_limit, contig_trim, mobilome, skip_sanntis, dpi
+    infile,
+    outfile,
+    prefix,
+    contig_num_limit,
+    contig_trim,
+    mobilome,
+    skip_sanntis,
+    dpi,
+    low_detail=False,
 ):
-    modified_infile = remove_escaped_characters(infile)
-    gff = Gff(modified_infile)
-    seqid2size = gff.get_seqid2size()
+    seqid2size, seqid2features = load_plot_features(infile)
     if len(seqid2size) > contig_num_limit:
         logging.info(
             f"Skipping plot generation for file {infile} due to a large number of contigs: {len(seqid2size)}. "
@@ -24,9 +79,9 @@ def main(
         )
         sys.exit()
 
-    seqid2features = gff.get_seqid2features(feature_type=None)
-
     circos = Circos(seqid2size, space=1, start=1, end=358)
+    # in the low-detail mode, features of a track closer than this are drawn as one block
+    min_gap = sum(seqid2size.values()) // LOW_DETAIL_RESOLUTION
 
     circos.text(f"{prefix}\n", size=15, r=30)
 
@@ -71,69 +126,32 @@ def main(
             )
 
         # Initiate feature tracks
-        f_cds_track = sector.add_track((93, 98), r_pad_ratio=0.1)
-        f_cds_track.axis(fc="none", ec="none")
-        r_cds_track = sector.add_track((88, 93), r_pad_ratio=0.1)
-        r_cds_track.axis(fc="none", ec="none")
-        rna_track = sector.add_track((83, 87), r_pad_ratio=0.1)
-        rna_track.axis(fc="none", ec="none")
-        bgc_track_antismash = sector.add_track((78, 80), r_pad_ratio=0.1)
-        bgc_track_antismash.axis(fc="none", ec="tomato", ls="dashdot", lw=0.15)
-        bgc_track_gecco = sector.add_track((76, 78), r_pad_ratio=0.1)
-        bgc_track_gecco.axis(fc="none", ec="lightsalmon", ls="dashdot", lw=0.15)
-        if not skip_sanntis:
-            bgc_track_sanntis = sector.add_track((74, 76), r_pad_ratio=0.1)
-            bgc_track_sanntis.axis(fc="none", ec="firebrick", ls="dashdot", lw=0.15)
-        dbcan_track = sector.add_track((68, 70), r_pad_ratio=0.1)
-        dbcan_track.axis(fc="none", ec="forestgreen", ls="dashdot", lw=0.15)
-        amr_track = sector.add_track((62, 64), r_pad_ratio=0.1)
-        amr_track.axis(fc="none", ec="dodgerblue", ls="dashdot", lw=0.15)
-        antiphage_track = sector.add_track((56, 58), r_pad_ratio=0.1)
-        antiphage_track.axis(fc="none", ec="orchid", ls="dashdot", lw=0.15)
-        if mobilome:
-            mobilome_track = sector.add_track((50, 52), r_pad_ratio=0.1)
-            mobilome_track.axis(fc="none", ec="lightseagreen", ls="dashdot", lw=0.15)
-
-        for feature in seqid2features[sector.name]:
-            if feature.type == "CDS":
-                if feature.strand == 1:
-                    f_cds_track.genomic_features([feature], fc="hotpink")
-                else:
-                    r_cds_track.genomic_features([feature], fc="steelblue")
-                if "antismash_bgc_function" in feature.qualifiers:
-                    bgc_track_antismash.genomic_features([feature], fc="tomato")
-                if "gecco_bgc_type" in feature.qualifiers:
-                    bgc_track_gecco.genomic_features([feature], fc="lightsalmon")
-                if not skip_sanntis:
-                    if "nearest_MiBIG" in feature.qualifiers:
-                        bgc_track_sanntis.genomic_features([feature], fc="firebrick")
-                if "dbcan_prot_type" in feature.qualifiers:
-                    dbcan_track.genomic_features([feature], fc="forestgreen")
-                if "amrfinderplus_scope" in feature.qualifiers:
-                    amr_track.genomic_features([feature], fc="dodgerblue")
-                if "defense_finder_type" in feature.qualifiers:
-                    antiphage_track.genomic_features([feature], fc="orchid")
-
-            elif feature.type in ["tRNA", "ncRNA", "rRNA"]:
-                rna_track.genomic_features([feature], fc="darkmagenta")
-            elif mobilome and feature.type in [
-                "mobility_island",
-                "cellular_recombinase",
-                "insertion_sequence",
-                "conjugative_element",
-                "conjugative_integron",
-                "integron",
-                "plasmid",
-                "nested_mobile_element",
-                "terminal_inverted_repeat_element",
-                "direct_repeat_element",
-                "viral_sequence",
-            ]:
-                mobilome_track.genomic_features([feature], fc="lightseagreen")
-            elif mobilome and feature.type.lower() in ["phage", "prophage"]:
-                mobilome_track.genomic_features([feature], fc="blue")
+        tracks = dict()
+        for track_name, r_lim, edge_colour in TRACKS:
+            if track_name == "sanntis" and skip_sanntis:
+                continue
+            if track_name == "mobilome" and not mobilome:
+                continue
+            tracks[track_name] = sector.add_track(r_lim, r_pad_ratio=0.1)
+            if edge_colour is None:
+                tracks[track_name].axis(fc="none", ec="none")
+            else:
+                tracks[track_name].axis(
+                    fc="none", ec=edge_colour, ls="dashdot", lw=0.15
+                )
+
+        buckets = bucket_features(seqid2features[sector.name], mobilome, skip_sanntis)
+        for (track_name, colour), features in buckets.items():
+            if low_detail:
+                for start, end in merge_feature_spans(features, min_gap):
+                    tracks[track_name].rect(start, end, fc=colour)
+            else:
+                tracks[track_name].genomic_features(features, fc=colour)
 
     fig = circos.plotfig()
+    if low_detail:
+        for collection in circos.ax.collections:
+            collection.set_rasterized(True)
     # Add legend
     handles = [
         Patch(color="hotpink", label="Forward CDS"),
@@ -160,16 +178,123 @@ def main(
     fig.savefig(outfile, dpi=dpi)
 
 
-def remove_escaped_characters(infile):
-    outfile = infile + "_modified"
-    with open(infile) as file_in:
-        content = file_in.read()
-        modified_content = content.replace("\\=", "")
+def bucket_features(features, mobilome, skip_sanntis):
+    """
+    Sort the features of a contig into the tracks they are plotted on.
+
+    :param features: features of the contig, in the order of the GFF
+    :param mobilome: if False, mobilome features are not plotted
+    :param skip_sanntis: if True, SanntiS BGCs are not plotted
+    :return: dictionary where the key is a (track name, colour) tuple and the value is the list
+    of features to plot on that track in that colour
+    """
+    buckets = defaultdict(list)
+    for feature in features:
+        if feature.type == "CDS":
+            if feature.location.strand == 1:
+                buckets[("f_cds", "hotpink")].append(feature)
+            else:
+                buckets[("r_cds", "steelblue")].append(feature)
+            for qualifier, track_name, colour in CDS_QUALIFIER_TRACKS:
+                if track_name == "sanntis" and skip_sanntis:
+                    continue
+                if qualifier in feature.qualifiers:
+                    buckets[(track_name, colour)].append(feature)
+        elif feature.type in RNA_TYPES:
+            buckets[("rna", "darkmagenta")].append(feature)
+        elif mobilome and feature.type in MOBILOME_TYPES:
+            buckets[("mobilome", "lightseagreen")].append(feature)
+        elif mobilome and feature.type.lower() in PHAGE_TYPES:
+            buckets[("mobilome", "blue")].append(feature)
+    return buckets
 
-    # Write the modified content into a file
-    with open(outfile, "w") as file_out:
-        file_out.write(modified_content)
-    return outfile
+
+def merge_feature_spans(features, min_gap):
+    """
+    Join the features of one track that are closer than min_gap into blocks.
+
+    :param features: features to join
+    :param min_gap: features separated by fewer bases than this are put in the same block
+    :return: list of (start, end) tuples of the blocks, sorted by start
+    """
+    spans = sorted(
+        (int(feature.location.start), int(feature.location.end)) for feature in features
+    )
+    blocks = []
+    for start, end in spans:
+        if blocks and start - blocks[-1][1] < min_gap:
+            if end > blocks[-1][1]:
+                blocks[-1][1] = end
+        else:
+            blocks.append([start, end])
+    return [tuple(block) for block in blocks]
+
+
+def load_plot_features(infile):
+    """
+    Read the features to plot from the annotation GFF.
+
+    The GFF is streamed and reading stops at the FASTA section. Only the features that can be
+    plotted are kept, and only the qualifiers that decide which track a CDS is plotted on are
+    parsed. Values are never read, so escaped "=" signs in them do not need to be removed.
+
+    :param infile: path to the annotation GFF
+    :return: seqid2size, a dictionary where the key is the contig name and the value is the
+    contig length taken from the ##sequence-region pragma (or the end of the last feature if
+    there is none), and seqid2features, a dictionary where the key is the contig name and the
+    value is the list of SeqFeatures to plot on it
+    """
+    regions = dict()
+    seqid2end = dict()
+    seqid2features = dict()
+    with open(infile) as file_in:
+        for line in file_in:
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                if line.startswith("##sequence-region"):
+                    fields = line.split()
+                    if len(fields) == 4 and fields[1] not in regions:
+                        regions[fields[1]] = int(fields[3]) - int(fields[2]) + 1
+                continue
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 9:
+                continue
+            seqid, feature_type = cols[0], cols[2]
+            start, end = int(cols[3]), int(cols[4])
+            if seqid not in seqid2end:
+                seqid2end[seqid] = end
+                seqid2features[seqid] = []
+            elif end > seqid2end[seqid]:
+                seqid2end[seqid] = end
+            if feature_type == "CDS":
+                qualifiers = {
+                    key: [value]
+                    for key, _, value in (
+                        attribute.partition("=") for attribute in cols[8].split(";")
+                    )
+                    if key in PLOT_QUALIFIERS
+                }
+            elif (
+                feature_type in RNA_TYPES
+                or feature_type in MOBILOME_TYPES
+                or feature_type.lower() in PHAGE_TYPES
+            ):
+                qualifiers = dict()
+            else:
+                continue
+            strand = {"+": 1, "-": -1}.get(cols[6], 0)
+            seqid2features[seqid].append(
+                SeqFeature(
+                    location=SimpleLocation(start - 1, end, strand),
+                    type=feature_type,
+                    qualifiers=qualifiers,
+                )
+            )
+    if not seqid2end:
+        raise ValueError(f"Failed to parse '{infile}' as GFF file")
+    seqid2size = {seqid: regions.get(seqid, end) for seqid, end in seqid2end.items()}
+    return seqid2size, seqid2features
 
 
 def parse_args():
@@ -221,6 +346,15 @@ def parse_args():
         default=600,
         help="Specify the dpi for the plot. Default: 600",
     )
+    parser.add_argument(
+        "--low-detail",
+        required=False,
+        action="store_true",
+        default=False,
+        help="Join features that are too close to be told apart at the plot resolution and "
+        "rasterise the feature tracks. Faster and produces smaller files for large genomes. "
+        "Default: False",
+    )
     return parser.parse_args()
 
 
@@ -235,4 +369,5 @@ if __name__ == "__main__":
         args.mobilome,
         args.skip_sanntis,
         args.dpi,
+        args.low_detail,
     )
@@ -15,7 +15,8 @@
 #
 
 import argparse
-import re
+
+from gff_attributes import parse_attributes, serialize_attributes
 
 
 def split_cds_to_gene_exon_mrna(entry):
@@ -35,9 +36,7 @@ def split_cds_to_gene_exon_mrna(entry):
 
         # tweak IDs and add Parent attributes
         attributes = entry[8]
-        attributes_dict = dict(
-            re.split(r"(?<!\\)=", item) for item in re.split(r"(?<!\\);", attributes)
-        )
+        attributes_dict = parse_attributes(attributes)
         if "ID" in attributes_dict:
             gene_id = attributes_dict["ID"]  # use the cds ID as the gene ID
 
@@ -62,7 +61,7 @@ def edit_id_add_parent(attributes_dict, id, parent=None):
     attributes_dict["ID"] = id
     if parent is not None:
         attributes_dict["Parent"] = parent
-    return ";".join(f"{key}={value}" for key, value in attributes_dict.items())
+    return serialize_attributes(attributes_dict)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Reading of eggNOG-mapper annotations, shared by the scripts in bin/.
+
+The annotations file is read once per process. The records that pass the e-value cutoff can be
+saved to a compact cache file, which other scripts load instead of parsing the annotations again.
+"""
+
+import logging
+import marshal
+import os
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+EVALUE_CUTOFF = 1e-10
+EGGNOG_NOTE_LENGTH_LIMIT = 70
+CACHE_FORMAT = 1
+
+EggnogRecord = namedtuple(
+    "EggnogRecord", ["seed_ortholog", "cog_category", "kegg_ko", "gos", "description"]
+)
+
+# descriptions that are not usable as a protein function
+EXCLUDE_PARTIAL = [
+    "proteins of unknown function",
+    "non supervised orthologous group",
+    "psort location",
+    "may contain a frame shift",
+    "annotation was generated",
+    "no Hp match",
+    "No similarity found",
+    "No significant database",
+    "No significant BLAST",
+    "open reading frame",
+    "Blast hits to",
+]
+EXCLUDE_FULL = [
+    "-",
+    "domain, protein",
+    "domain protein",
+    "domain, family member",
+    "domain) protein",
+    "domain) containing",
+    "domain only",
+    "protein domain containing",
+    "Encoded by",
+    "Family of unknown function",
+    "Domain of unknown function",
+    "Protein of unknown function",
+    "Uncharacterised protein family",
+    "Uncharacterized protein family",
+    "by glimmer",
+    "by glimmer2",
+    "by glimmer3",
+    "by sequence",
+    "by modhmm",
+    "by jigsaw",
+    "by TMHMM2.0 at aa",
+    "by MetaGeneAnnotator",
+    "by GeneMark",
+    "component",
+    "Family of",
+    "Family membership",
+    "family member",
+    "superfamily protein",
+    "superfamily. Protein",
+    "superfamily",
+    "superfamily, member",
+    "I and II",
+    "implicated in the recycling of the",
+    "manually curated",
+    "multi-drug",
+    "protein involved in",
+    "Alternative locus ID",
+    "amino acid",
+    "Weak similarity to UniProt",
+    "overlaps another CDS with the same product name",
+    "No homology to any previously reported sequences",
+    "There are 9 addittional ORFs identical to this one",
+    "Product inferred by homology to UniProt",
+    "protein domain associated with",
+    "acid) synthase",
+    "unnamed protein",
+    "this gene contains a nucleotide ambiguity which may be the result of a sequencing error",
+    "source UniProtKB",
+    "some similarities with uniprot",
+    "silverDB",
+    "sequence",
+    "protein).. Source PGD",
+    "protein). Source PGD",
+    "protein)-related protein",
+    "protein)-like",
+    "protein with multiple",
+    "previously reported",
+    "multiple",
+    "molecule",
+    "function. Source PGD",
+    "function",
+    "essential",
+    "electron",
+    "containing protein",
+    "chromosome",
+    "Highly divergent",
+    "Belongs to the",
+    "as a",
+    "6) homolog",
+    "Source PGD",
+    "protein.. Source PGD",
+    "gene. Source PGD",
+    "family protein. Source PGD",
+    "a. Source PGD",
+    "-domain-containing protein",
+    "Corresponds to locus_tag",
+    "Function proposed based on presence of conserved amino acid motif, structural feature or limited homology",
+    "Conserved gene of",
+    "IMG reference gene",
+    "An automated process has identified a potential problem with this gene model",
+    "aa) fasta scores E()",
+]
+EXCLUDE_START = [
+    "of ",
+    "but ",
+    "But ",
+    "however",
+    "However",
+    "to ",
+    "with ",
+    "which ",
+    "thus ",
+    "then ",
+    "that ",
+    "or ",
+    "more specifically ",
+    "due ",
+    "deleted ",
+    "bases in ",
+    "are ",
+    "and ",
+    "And ",
+    "and, ",
+    "across ",
+    "aa, and",
+    "aa)",
+    "aa and ",
+    "Best DB hits BLAST",
+]
+EXCLUDE_END = [
+    " and",
+    " which",
+    " with",
+    " to",
+    " of",
+    " is",
+    " the",
+    " for",
+    " in",
+    " or",
+    " a",
+]
+EXCLUDE_PATTERNS = [
+    r"^[0-9]+[.)]* Source PGD$",  # e.g., "2). Source PGD"
+    r"^[0-9]+ homolog$",  # e.g., "2 homolog"
+    r"^[0-9]+ like [0-9]+$",  # e.g., "2 like 1"
+    r"^multiple [0-9]+$",  # e.g., "multiple 2"
+    r"^molecule [0-9]+$",  # e.g., "molecule 2"
+]
+
+
+# the exclusion lists compiled into one matcher per kind of comparison
+_PARTIAL_MATCHER = re.compile(
+    "|".join(re.escape(phrase.lower()) for phrase in EXCLUDE_PARTIAL)
+)
+_FULL_LOWER = frozenset(phrase.lower() for phrase in EXCLUDE_FULL)
+_START_TUPLE = tuple(EXCLUDE_START)
+_END_TUPLE = tuple(EXCLUDE_END)
+_PATTERN_MATCHER = re.compile(
+    "|".join(f"(?:{pattern})" for pattern in EXCLUDE_PATTERNS)
+)
+
+
+@lru_cache(maxsize=1)
+def load_eggnog_annotations(eggnog_file, cache_file=None):
+    """
+    Load the eggNOG-mapper annotations with an e-value at or below EVALUE_CUTOFF.
+
+    If cache_file is given and was saved from the same annotations file, the records are loaded
+    from it. Otherwise the annotations file is parsed and, if cache_file is given, the records are
+    saved to it. The result of the last call is also kept in memory.
+
+    :param eggnog_file: path to the .emapper.annotations file
+    :param cache_file: path to the cache file, or None not to use one
+    :return: dictionary where key = protein, value = EggnogRecord
+    """
+    source_stat = os.stat(eggnog_file)
+    source_key = (source_stat.st_size, source_stat.st_mtime_ns)
+    if cache_file and os.path.exists(cache_file):
+        records = read_cache(cache_file, source_key)
+        if records is not None:
+            return records
+    records = parse_eggnog_annotations(eggnog_file)
+    if cache_file:
+        write_cache(records, source_key, cache_file)
+    return records
+
+
+def parse_eggnog_annotations(eggnog_file):
+    """
+    Parse an .emapper.annotations file. The columns are located from the header once.
+
+    :return: dictionary where key = protein, value = EggnogRecord with the raw column values
+    """
+    records = dict()
+    eggnog_fields = None
+    with open(eggnog_file) as file_in:
+        for line in file_in:
+            if line.startswith("#"):
+                # the header is the only comment that names the columns
+                if line.startswith("#query"):
+                    eggnog_fields = get_eggnog_fields(line)
+                continue
+            cols = line.rstrip("\r\n").split("\t")
+            try:
+                evalue = float(cols[2])
+            except (ValueError, IndexError):
+                continue
+            if evalue > EVALUE_CUTOFF:
+                continue
+            if eggnog_fields is None:
+                sys.exit(f"Cannot find the header line in {eggnog_file}.")
+            records[cols[0]] = EggnogRecord(
+                cols[1],
+                cols[eggnog_fields["cog_func"]],
+                cols[eggnog_fields["KEGG_ko"]],
+                cols[eggnog_fields["GOs"]],
+                cols[7],
+            )
+    return records
+
+
+def get_eggnog_fields(line):
+    cols = line.strip().split("\t")
+    try:
+        index_of_go = cols.index("GOs")
+    except ValueError:
+        sys.exit("Cannot find the GO terms column.")
+    if cols[8] == "KEGG_ko" and cols[15] == "CAZy":
+        eggnog_fields = {"KEGG_ko": 8, "cog_func": 20, "GOs": index_of_go}
+    elif cols[11] == "KEGG_ko" and cols[18] == "CAZy":
+        eggnog_fields = {"KEGG_ko": 11, "cog_func": 6, "GOs": index_of_go}
+    else:
+        sys.exit("Cannot parse eggNOG - unexpected field order or naming")
+    return eggnog_fields
+
+
+def is_informative_description(description):
+    """
+    Return False if an eggNOG description is a placeholder, a fragment of a sentence or too long
+    to be used as a protein function.
+    """
+    description_lower = description.lower()
+    return not (
+        _PARTIAL_MATCHER.search(description_lower)
+        or description_lower in _FULL_LOWER
+        or description.startswith(_START_TUPLE)
+        or description.endswith(_END_TUPLE)
+        or _PATTERN_MATCHER.match(description)
+        or len(description.split(" ")) > EGGNOG_NOTE_LENGTH_LIMIT
+    )
+
+
+def read_cache(cache_file, source_key):
+    with open(cache_file, "rb") as file_in:
+        try:
+            cache_format, cached_source_key, records = marshal.load(file_in)
+        except (EOFError, ValueError, TypeError):
+            logging.warning(f"{cache_file} is not a valid eggNOG cache, ignoring it.")
+            return None
+    if cache_format != CACHE_FORMAT or tuple(cached_source_key) != source_key:
+        logging.info(f"{cache_file} was saved from other annotations, ignoring it.")
+        return None
+    return {protein: EggnogRecord(*values) for protein, values in records.items()}
+
+
+def write_cache(records, source_key, cache_file):
+    with open(cache_file, "wb") as file_out:
+        marshal.dump(
+            (
+                CACHE_FORMAT,
+                source_key,
+                {protein: tuple(record) for protein, record in records.items()},
+            ),
+            file_out,
+        )
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Parsing and printing of GFF column 9, shared by the scripts in bin/.
+
+Attributes are held in a regular dictionary, which keeps the order of the attributes in the
+input. Reserved characters escaped with a backslash (\\;, \\= and \\,) are not treated as
+separators and are kept as they are in the values.
+
+Run the module as a script to benchmark parsing and printing throughput.
+"""
+
+import argparse
+import re
+import time
+
+_UNESCAPED_COMMA = re.compile(r"(?<!\\),")
+
+
+def parse_attributes(col9):
+    """
+    Convert GFF column 9 into a dictionary where key = attribute name, value = attribute value.
+
+    :param col9: column 9 text without the trailing newline
+    :return: dictionary of attributes in the order they appear in column 9
+    """
+    attributes = dict()
+    if "\\" not in col9:
+        # nothing is escaped: plain string splitting is enough
+        for item in col9.split(";"):
+            if item:
+                key, _, value = item.partition("=")
+                attributes[key] = value
+        return attributes
+    escaped_item = None
+    for item in col9.split(";"):
+        if escaped_item is not None:
+            # the previous split was at an escaped semicolon, glue the pieces back together
+            item = f"{escaped_item};{item}"
+            escaped_item = None
+        if item.endswith("\\"):
+            escaped_item = item
+            continue
+        if item:
+            add_item(attributes, item)
+    if escaped_item:
+        add_item(attributes, escaped_item)
+    return attributes
+
+
+def add_item(attributes, item):
+    separator = find_unescaped(item, "=")
+    if separator == -1:
+        attributes[item] = ""
+    else:
+        attributes[item[:separator]] = item[separator + 1 :]
+
+
+def find_unescaped(text, character):
+    """Return the position of the first occurrence of character not preceded by a backslash."""
+    position = text.find(character)
+    while position > 0 and text[position - 1] == "\\":
+        position = text.find(character, position + 1)
+    return position
+
+
+def serialize_attributes(attributes):
+    """Convert a dictionary of attributes back into GFF column 9 text."""
+    return ";".join([f"{key}={value}" for key, value in attributes.items()])
+
+
+def split_values(value):
+    """Split a comma-separated attribute value, ignoring escaped commas."""
+    if "\\" not in value:
+        return value.split(",")
+    return _UNESCAPED_COMMA.split(value)
+
+
+def insert_attribute_after(attributes, anchor_key, key, value):
+    """
+    Add an attribute immediately after anchor_key. If anchor_key is not present, the attribute
+    is added at the end. If key is already present, it is moved to the new position.
+
+    :return: a new dictionary of attributes
+    """
+    if anchor_key not in attributes:
+        updated_attributes = {k: v for k, v in attributes.items() if k != key}
+        updated_attributes[key] = value
+        return updated_attributes
+    updated_attributes = dict()
+    for existing_key, existing_value in attributes.items():
+        if existing_key == key:
+            continue
+        updated_attributes[existing_key] = existing_value
+        if existing_key == anchor_key:
+            updated_attributes[key] = value
+    return updated_attributes
+
+
+def _legacy_parse_attributes(col9):
+    return dict(re.split(r"(?<!\\)=", item) for item in re.split(r"(?<!\\);", col9))
+
+
+def benchmark(attribute_count, escaped):
+    attributes_per_line = 12
+    col9 = ";".join(
+        [
+            "ID=PROKKA_00001",
+            "inference=ab initio prediction:Prodigal:002006",
+            "locus_tag=PROKKA_00001",
+            "product=Beta-galactosidase",
+            "product_source=Prokka",
+            "eggNOG=411479.BACUNI_03971",
+            "cog=G",
+            "kegg=ko:K01190",
+            "pfam=PF00703,PF02836,PF02837,PF11721",
+            "interpro=IPR006101,IPR006102,IPR006103",
+            "dbcan_prot_type=CAZyme",
+            (
+                "uf_prot_rec_fullname=Thing\\; synthase\\=A\\,B"
+                if escaped
+                else "uf_prot_rec_fullname=Beta-galactosidase"
+            ),
+        ]
+    )
+    lines = [col9] * (attribute_count // attributes_per_line)
+    total = len(lines) * attributes_per_line
+    results = dict()
+    for name, function in (
+        ("legacy regex parse", _legacy_parse_attributes),
+        ("parse_attributes", parse_attributes),
+    ):
+        start = time.perf_counter()
+        parsed = [function(line) for line in lines]
+        results[name] = time.perf_counter() - start
+    start = time.perf_counter()
+    for attributes in parsed:
+        serialize_attributes(attributes)
+    results["serialize_attributes"] = time.perf_counter() - start
+    print(f"{total} attributes, escaped characters: {escaped}")
+    for name, seconds in results.items():
+        print(
+            f"{name:>22}: {seconds:.3f} s, "
+            f"{seconds * 1_000_000 / total:.3f} s per million attributes"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark parsing and printing of GFF column 9 attributes."
+    )
+    parser.add_argument(
+        "-n",
+        dest="attribute_count",
+        type=int,
+        default=1_200_000,
+        help="Number of attributes to parse and print. Default: 1200000.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for escaped in (False, True):
+        benchmark(args.attribute_count, escaped)
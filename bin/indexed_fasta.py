@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Random access to the sequences of a FASTA file, shared by the scripts in bin/.
+
+The file is indexed the way samtools faidx does it: for each sequence, its length, the offset of
+its first base and the number of bases and bytes per line. The index is built the first time a
+sequence is requested, saved next to the FASTA as <fasta>.fai when possible, and reused by later
+runs if it is newer than the FASTA. Sequences are then read from a memory map of the file, so only
+the requested bases are copied.
+"""
+
+import logging
+import mmap
+import os
+import threading
+
+
+class IndexedFasta:
+    """
+    Use as a context manager, or call close() when done:
+
+        with IndexedFasta(fasta) as genome:
+            genome.length("contig_1")
+            genome.fetch("contig_1", 99, 200)
+    """
+
+    def __init__(self, fasta):
+        self.fasta = fasta
+        self.fai = f"{fasta}.fai"
+        self._index = None
+        # bytes taken by the sequences whose lines have irregular lengths, which cannot be
+        # sliced by offset
+        self._irregular = dict()
+        self._file = None
+        self._mmap = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def length(self, contig):
+        """Return the length of a sequence. Raises KeyError if it is not in the FASTA."""
+        return self._get_index()[contig][0]
+
+    def fetch(self, contig, start, end):
+        """
+        Return the bases of a sequence between start (0-based, included) and end (excluded),
+        clipped to the sequence like a Python slice.
+        """
+        length, offset, line_bases, line_width = self._get_index()[contig]
+        start, end, _ = slice(start, end).indices(length)
+        if end <= start:
+            return ""
+        if contig in self._irregular:
+            first, last = self._irregular[contig]
+            return b"".join(self._mmap[first:last].split()).decode("ascii")[start:end]
+        first = offset + (start // line_bases) * line_width + start % line_bases
+        last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases
+        bases = self._mmap[first : last + 1]
+        if line_width != line_bases:
+            bases = bases.replace(b"\n", b"").replace(b"\r", b"")
+        return bases.decode("ascii")
+
+    def _get_index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._open()
+        return self._index
+
+    def _open(self):
+        self._file = open(self.fasta, "rb")
+        if os.path.getsize(self.fasta) > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        index = None
+        if os.path.exists(self.fai) and os.path.getmtime(self.fai) >= os.path.getmtime(
+            self.fasta
+        ):
+            index = read_fai(self.fai)
+        if index is None:
+            index = self._build_index()
+            if not self._irregular:
+                try:
+                    write_fai(index, self.fai)
+                except OSError:
+                    logging.info(
+                        f"Cannot save the index of {self.fasta}, keeping it in memory."
+                    )
+        self._index = index
+
+    def _build_index(self):
+        index = dict()
+        # the sequence being read: name, length, offset of its first base, bases and bytes per
+        # line
+        name = None
+        length = offset = line_bases = line_width = 0
+        # a line shorter than the first one must be the last line of the sequence
+        last_line_seen = irregular = False
+        sequence_end = 0
+
+        def close_record():
+            if name is None:
+                return
+            index[name] = (length, offset, max(line_bases, 1), max(line_width, 1))
+            if irregular:
+                self._irregular[name] = (offset, sequence_end)
+
+        position = 0
+        self._file.seek(0)
+        for line in self._file:
+            line_start = position
+            position += len(line)
+            if line.startswith(b">"):
+                close_record()
+                header = line[1:].split()
+                name = header[0].decode() if header else ""
+                length = line_bases = line_width = 0
+                offset = sequence_end = position
+                last_line_seen = irregular = False
+                continue
+            if name is None:
+                continue
+            bases = line.rstrip(b"\r\n")
+            if not bases:
+                last_line_seen = True
+                continue
+            if line_bases == 0:
+                line_bases = len(bases)
+                line_width = len(line)
+                offset = line_start
+            elif last_line_seen or len(bases) > line_bases:
+                irregular = True
+            if len(bases) != line_bases or len(line) != line_width:
+                last_line_seen = True
+            length += len(bases)
+            sequence_end = position
+        close_record()
+        return index
+
+
+def read_fai(fai):
+    """Read a .fai index, or return None if it is not valid."""
+    index = dict()
+    with open(fai) as file_in:
+        for line in file_in:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 5:
+                logging.warning(f"{fai} is not a valid FASTA index, ignoring it.")
+                return None
+            try:
+                index[cols[0]] = tuple(int(value) for value in cols[1:5])
+            except ValueError:
+                logging.warning(f"{fai} is not a valid FASTA index, ignoring it.")
+                return None
+    return index
+
+
+def write_fai(index, fai):
+    with open(fai, "w") as file_out:
+        for name, values in index.items():
+            file_out.write("\t".join([name] + [str(value) for value in values]) + "\n")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Loading of the InterPro entry.list and ParentChildTreeFile.txt, shared by the scripts in bin/.
+
+Both files are parsed once per InterPro release into a snapshot that is saved next to them. The
+scripts read the snapshot instead of the text files when it matches the release they were given;
+otherwise they fall back to parsing the text files.
+
+Run the module as a script to build the snapshot.
+"""
+
+import argparse
+import hashlib
+import logging
+import marshal
+import os
+from functools import lru_cache
+
+SNAPSHOT_NAME = "interpro_entries.snapshot"
+SNAPSHOT_FORMAT = 2
+
+
+def load_entries(entry_list, db_version=None):
+    """
+    Load InterPro entries from entry.list, or from the snapshot next to it if there is one.
+
+    :param entry_list: path to entry.list
+    :param db_version: InterPro release the snapshot must have been built from, any if None
+    :return: dictionary where key = InterPro accession, value = (entry type, entry name)
+    """
+    snapshot = find_snapshot(entry_list, db_version)
+    if snapshot:
+        return snapshot["entries"]
+    return parse_entry_list(entry_list)
+
+
+def load_hierarchy(parent_child_file, db_version=None):
+    """
+    Load the InterPro hierarchy from ParentChildTreeFile.txt, or from the snapshot next to it if
+    there is one.
+
+    :return: hierarchy index, see parse_hierarchy
+    """
+    snapshot = find_snapshot(parent_child_file, db_version)
+    if snapshot:
+        return snapshot["hierarchy"]
+    return parse_hierarchy(parent_child_file)
+
+
+def parse_entry_list(entry_list):
+    entries = dict()
+    with open(entry_list) as file_in:
+        for line in file_in:
+            if line.startswith("IPR"):
+                acc, entry_type, name = line.strip().split("\t")
+                entries[acc] = (entry_type, name)
+    return entries
+
+
+def parse_hierarchy(parent_child_file):
+    """
+    Index the InterPro hierarchy. Each term is numbered in the order of the file, which lists
+    every term before its children, and gets the range of numbers taken by its descendants.
+    Ancestor checks are then a comparison of two numbers.
+
+    If a term appears more than once, its deepest position is kept.
+
+    :return: dictionary where key = InterPro accession, value = (parent accession or "", depth,
+        number of the term, number of its last descendant). Top level terms have depth 0.
+    """
+    hierarchy = dict()
+    # terms from the top level to the current line: (term, parent, depth, number)
+    path = list()
+    number = -1
+
+    def close_subtree(node, last_number):
+        term, parent, depth, term_number = node
+        if term not in hierarchy or depth > hierarchy[term][1]:
+            hierarchy[term] = (parent, depth, term_number, last_number)
+
+    with open(parent_child_file) as file_in:
+        for line in file_in:
+            term_line = line.lstrip("-")
+            term = term_line.strip().split("::")[0]
+            if not term:
+                continue
+            number += 1
+            depth = (len(line) - len(term_line)) // 2
+            while path and path[-1][2] >= depth:
+                close_subtree(path.pop(), number - 1)
+            parent = path[-1][0] if path else ""
+            path.append((term, parent, depth, number))
+    while path:
+        close_subtree(path.pop(), number)
+    return hierarchy
+
+
+def term_depth(hierarchy, term, default=0):
+    """Return the depth of term in the hierarchy, or default if it is not in the hierarchy."""
+    if term in hierarchy:
+        return hierarchy[term][1]
+    return default
+
+
+def is_ancestor(hierarchy, ancestor, term):
+    """Return True if ancestor is a parent, grandparent etc. of term."""
+    if ancestor not in hierarchy or term not in hierarchy:
+        return False
+    _, _, ancestor_number, last_descendant = hierarchy[ancestor]
+    return ancestor_number < hierarchy[term][2] <= last_descendant
+
+
+def most_specific_term(hierarchy, terms):
+    """
+    Return the most specific of terms: the deepest term, which is never an ancestor of another
+    of the terms since a descendant is always deeper. If several terms qualify, the first one is
+    returned. Terms that are not in the hierarchy have depth 0.
+    """
+    return max(terms, key=lambda term: term_depth(hierarchy, term), default=None)
+
+
+def find_snapshot(source_file, db_version):
+    """
+    Return the snapshot saved next to source_file if it was built from this release and from a
+    file of the same size as source_file, otherwise None.
+    """
+    snapshot_file = os.path.join(os.path.dirname(source_file), SNAPSHOT_NAME)
+    if not os.path.exists(snapshot_file):
+        return None
+    snapshot = read_snapshot(snapshot_file)
+    if snapshot is None:
+        return None
+    if db_version and snapshot["db_version"] != str(db_version).strip():
+        logging.warning(
+            f"{snapshot_file} was built for InterPro {snapshot['db_version']}, expected "
+            f"{str(db_version).strip()}. Parsing {source_file} instead."
+        )
+        return None
+    source_name = os.path.basename(source_file)
+    if snapshot["source_sizes"].get(source_name) != os.path.getsize(source_file):
+        logging.warning(
+            f"{source_file} has changed since {snapshot_file} was built. Parsing it instead."
+        )
+        return None
+    return snapshot
+
+
+@lru_cache(maxsize=1)
+def read_snapshot(snapshot_file):
+    """
+    Read a snapshot written by write_snapshot. The result is cached, so a script that needs both
+    the entries and the hierarchy reads the file once.
+
+    :return: snapshot dictionary, or None if the file is not a valid snapshot
+    """
+    with open(snapshot_file, "rb") as file_in:
+        try:
+            snapshot_format, checksum, payload = marshal.load(file_in)
+        except (EOFError, ValueError, TypeError):
+            logging.warning(f"{snapshot_file} is not a valid snapshot, ignoring it.")
+            return None
+    if snapshot_format != SNAPSHOT_FORMAT:
+        logging.warning(
+            f"{snapshot_file} has format {snapshot_format}, expected {SNAPSHOT_FORMAT}. "
+            f"Ignoring it."
+        )
+        return None
+    if hashlib.sha256(payload).hexdigest() != checksum:
+        logging.warning(f"{snapshot_file} is corrupted, ignoring it.")
+        return None
+    return marshal.loads(payload)
+
+
+def write_snapshot(entry_list, parent_child_file, db_version, outfile):
+    snapshot = {
+        "db_version": str(db_version).strip(),
+        "source_sizes": {
+            os.path.basename(entry_list): os.path.getsize(entry_list),
+            os.path.basename(parent_child_file): os.path.getsize(parent_child_file),
+        },
+        "entries": parse_entry_list(entry_list),
+        "hierarchy": parse_hierarchy(parent_child_file),
+    }
+    payload = marshal.dumps(snapshot)
+    with open(outfile, "wb") as file_out:
+        marshal.dump(
+            (SNAPSHOT_FORMAT, hashlib.sha256(payload).hexdigest(), payload), file_out
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Build a snapshot of the InterPro entry list and hierarchy that the annotation "
+            "scripts can load without parsing the text files."
+        )
+    )
+    parser.add_argument(
+        "--ipr-entries",
+        required=True,
+        help="The path to the entry.list file from InterPro.",
+    )
+    parser.add_argument(
+        "--ipr-hierarchy",
+        required=True,
+        help="The path to the ParentChildTreeFile.txt file from InterPro.",
+    )
+    parser.add_argument(
+        "--db-version",
+        required=True,
+        help="InterPro release the files come from, for example 94.0.",
+    )
+    parser.add_argument(
+        "-o",
+        dest="outfile",
+        required=False,
+        help=(
+            f"Path to the output file. Default: {SNAPSHOT_NAME} in the folder of the entry list, "
+            f"which is where the annotation scripts look for it."
+        ),
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    outfile = args.outfile or os.path.join(
+        os.path.dirname(args.ipr_entries), SNAPSHOT_NAME
+    )
+    write_snapshot(args.ipr_entries, args.ipr_hierarchy, args.db_version, outfile)
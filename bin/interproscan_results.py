@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Loading of InterProScan TSV results, shared by the scripts in bin/.
+
+Matches are held column by column: text columns are tuples and numeric columns are typed
+arrays. Rows that fail the e-value filter are dropped while reading, before the whole line is
+split, and the other filters select row indices from whole columns.
+"""
+
+import sys
+from array import array
+from functools import lru_cache
+
+EVALUE_CUTOFF = 1e-10
+
+
+@lru_cache(maxsize=1)
+def load_interproscan_results(ips_file, evalue_cutoff=EVALUE_CUTOFF):
+    """
+    Load the matches from an InterProScan TSV with an e-value at or below evalue_cutoff. Matches
+    without an e-value are not loaded.
+
+    The most recently loaded file is cached so scripts that use the results in several places
+    only parse it once; the returned columns must not be modified.
+
+    :param ips_file: path to the InterProScan TSV
+    :param evalue_cutoff: maximum e-value of a match
+    :return: dictionary where key = column name, value = column values in the order of the file.
+        Columns: protein, db, sig_acc, sig_desc, ipr_acc, ipr_desc ("-" if InterProScan was run
+        without --iprlookup), length, start, end, evalue and match (fraction of the protein
+        covered by the match)
+    """
+    proteins, dbs, sig_accs, sig_descs, ipr_accs, ipr_descs = ([] for _ in range(6))
+    lengths, starts, ends = array("q"), array("q"), array("q")
+    evalues = array("d")
+    with open(ips_file) as file_in:
+        for line in file_in:
+            # the e-value is the 9th column: split the rest of the line only for matches that pass
+            cols = line.split("\t", 9)
+            if len(cols) < 10:
+                continue
+            evalue = parse_evalue(cols[8])
+            if evalue > evalue_cutoff:
+                continue
+            status_cols = cols[9].rstrip().split("\t")
+            proteins.append(sys.intern(cols[0]))
+            dbs.append(cols[3])
+            sig_accs.append(cols[4])
+            sig_descs.append(cols[5])
+            lengths.append(int(cols[2]))
+            starts.append(int(cols[6]))
+            ends.append(int(cols[7]))
+            evalues.append(evalue)
+            if len(status_cols) > 3:
+                ipr_accs.append(status_cols[2])
+                ipr_descs.append(status_cols[3])
+            else:
+                ipr_accs.append("-")
+                ipr_descs.append("-")
+    return {
+        "protein": tuple(proteins),
+        "db": tuple(dbs),
+        "sig_acc": tuple(sig_accs),
+        "sig_desc": tuple(sig_descs),
+        "ipr_acc": tuple(ipr_accs),
+        "ipr_desc": tuple(ipr_descs),
+        "length": lengths,
+        "start": starts,
+        "end": ends,
+        "evalue": evalues,
+        "match": array(
+            "d",
+            [
+                (end - start) / length
+                for start, end, length in zip(starts, ends, lengths)
+            ],
+        ),
+    }
+
+
+def parse_evalue(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float("inf")
+
+
+def select_rows(values, selected_values, exclude=False):
+    """
+    Return the indices of the rows where the value of a column is in selected_values (or not in
+    selected_values if exclude is True).
+    """
+    return [
+        row for row, value in enumerate(values) if (value in selected_values) != exclude
+    ]
+
+
+def group_rows_by_protein(ips_results, rows=None):
+    """
+    Group row indices by protein.
+
+    :param ips_results: results loaded by load_interproscan_results
+    :param rows: indices of the rows to group, all rows if None
+    :return: dictionary where key = protein, value = list of row indices in the order of the
+        file. Proteins are in the order they first appear.
+    """
+    proteins = ips_results["protein"]
+    if rows is None:
+        rows = range(len(proteins))
+    groups = dict()
+    for row in rows:
+        protein = proteins[row]
+        if protein in groups:
+            groups[protein].append(row)
+        else:
+            groups[protein] = [row]
+    return groups
@@ -15,60 +15,182 @@
 #
 
 import argparse
+import heapq
 import logging
 import os
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+from prepare_unifire_input import load_shard_folders
 
 logging.basicConfig(level=logging.INFO)
 
+INPUTS = {
+    "ARBA": "predictions_arba.out",
+    "UniRule": "predictions_unirule.out",
+    "UniRule-PIRSR": "predictions_unirule-pirsr.out",
+}
+
+HEADER = "Source\tEvidence\tProteinId\tAnnotationType\tValue\tStart\tEnd\n"
+
+# number of prediction lines sorted in memory at a time when an input is not sorted by protein
+CHUNK_SIZE = 1000000
+
+
+def main(indir, outfile, chunk_size=CHUNK_SIZE, manifest=None):
+    """
+    Combine the predictions of the three UniFIRE tools into one file, sorted by protein. The
+    predictions for each protein are listed in ARBA, UniRule, UniRule-PIRSR order. If a shard
+    manifest from prepare_unifire_input is given, the outputs in all the shard folders are
+    combined instead of the ones in indir, and the predictions of each tool are taken in shard
+    order.
+
+    Inputs that are already sorted by protein are merged as they are read. The others are first
+    split into sorted runs of chunk_size lines saved to temporary files, so the memory used does
+    not depend on the number of predictions.
+    """
+    indirs = load_shard_folders(manifest) if manifest else [indir]
+    for folder in indirs:
+        for filename in INPUTS.values():
+            if not os.path.exists(os.path.join(folder, filename)):
+                logging.error(
+                    f"File {filename} does not exist in folder {folder}. Aborting."
+                )
+                sys.exit()
+    inputs = [
+        (dbname, os.path.join(folder, filename))
+        for dbname, filename in INPUTS.items()
+        for folder in indirs
+    ]
 
-def main(indir, outfile):
-    inputs = {
-        "ARBA": "predictions_arba.out",
-        "UniRule": "predictions_unirule.out",
-        "UniRule-PIRSR": "predictions_unirule-pirsr.out",
-    }
-    header = "Source\tEvidence\tProteinId\tAnnotationType\tValue\tStart\tEnd\n"
-    result = dict()
-    for dbname, filename in inputs.items():
-        result = load_file(dbname, indir, filename, result)
-
-    with open(outfile, "w") as file_out:
-        file_out.write(header)
-        for prot, lines in result.items():
-            for line in lines:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ThreadPoolExecutor(max_workers=len(INPUTS)) as executor:
+            runs = list(
+                executor.map(
+                    lambda item: make_sorted_runs(item[1], tmpdir, chunk_size),
+                    inputs,
+                )
+            )
+        # runs are listed in tool order and, for each tool, in shard and file order;
+        # heapq.merge keeps the lines with the same protein in that order
+        readers = [
+            read_predictions(run, dbname)
+            for (dbname, _), file_runs in zip(inputs, runs)
+            for run in file_runs
+        ]
+        with open(outfile, "w") as file_out:
+            file_out.write(HEADER)
+            for _, line in heapq.merge(*readers, key=itemgetter(0)):
                 file_out.write(line)
 
 
-def load_file(dbname, indir, filename, result):
-    if not os.path.exists(os.path.join(indir, filename)):
-        logging.error(f"File {filename} does not exist in folder {indir}. Aborting.")
-        sys.exit()
-    with open(os.path.join(indir, filename)) as file_in:
+def make_sorted_runs(path, tmpdir, chunk_size):
+    """
+    Split a UniFIRE predictions file into files sorted by protein.
+
+    :param path: path to the predictions file
+    :param tmpdir: folder to save the sorted runs to
+    :param chunk_size: maximum number of lines in a run
+    :return: list of paths to the sorted runs, in file order; just the input if it is already
+        sorted by protein
+    """
+    if is_sorted_by_protein(path):
+        return [path]
+    runs = list()
+    chunk = list()
+    with open(path) as file_in:
+        for line in file_in:
+            if line.startswith("Evidence"):
+                continue
+            # the sort can move the last line of the file before another one
+            if not line.endswith("\n"):
+                line += "\n"
+            chunk.append((get_protein_id(line), line))
+            if len(chunk) == chunk_size:
+                runs.append(write_run(chunk, tmpdir))
+                chunk = list()
+    if chunk:
+        runs.append(write_run(chunk, tmpdir))
+    return runs
+
+
+def is_sorted_by_protein(path):
+    previous_protein = ""
+    with open(path) as file_in:
+        for line in file_in:
+            if line.startswith("Evidence"):
+                continue
+            protein = get_protein_id(line)
+            if protein < previous_protein:
+                return False
+            previous_protein = protein
+    return True
+
+
+def write_run(chunk, tmpdir):
+    # the sort is stable, so the predictions for a protein keep their order
+    chunk.sort(key=itemgetter(0))
+    with tempfile.NamedTemporaryFile(
+        "w", dir=tmpdir, suffix=".run", delete=False
+    ) as file_out:
+        file_out.writelines(line for _, line in chunk)
+    return file_out.name
+
+
+def read_predictions(path, dbname):
+    """
+    Yield (protein ID, output line) tuples for the predictions in a file.
+    """
+    with open(path) as file_in:
         for line in file_in:
-            if not line.startswith("Evidence"):
-                prot = line.split("\t")[1]
-                new_line = f"{dbname}\t{line}"
-                result.setdefault(prot, list()).append(new_line)
-    return result
+            if line.startswith("Evidence"):
+                continue
+            if not line.endswith("\n"):
+                line += "\n"
+            yield get_protein_id(line), f"{dbname}\t{line}"
+
+
+def get_protein_id(line):
+    return line.split("\t", 2)[1]
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
         description=("The script combines UniFIRE output files into one.")
     )
-    parser.add_argument(
+    inputs = parser.add_mutually_exclusive_group(required=True)
+    inputs.add_argument(
         "-i",
         dest="infolder",
-        required=True,
         help="Folder with UniFIRE outputs.",
     )
+    inputs.add_argument(
+        "--manifest",
+        dest="manifest",
+        help=(
+            "Shard manifest written by prepare_unifire_input.py. The UniFIRE outputs in all "
+            "the shard folders are combined."
+        ),
+    )
     parser.add_argument(
         "-o",
         dest="outfile",
         required=True,
         help=("Path to the output file."),
     )
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        required=False,
+        type=int,
+        default=CHUNK_SIZE,
+        help=(
+            "Number of predictions sorted in memory at a time when a UniFIRE output is not "
+            f"sorted by protein. Default: {CHUNK_SIZE}"
+        ),
+    )
     return parser.parse_args()
 
 
@@ -77,4 +199,6 @@ if __name__ == "__main__":
     main(
         args.infolder,
         args.outfile,
+        args.chunk_size,
+        args.manifest,
     )
@@ -15,7 +15,8 @@
 #
 
 import argparse
-import re
+
+from gff_attributes import parse_attributes, serialize_attributes
 
 
 def main(infile, outfile):
@@ -40,9 +41,20 @@ def modify_line(line):
         return line.strip()
 
     # Parse the 9th field into key-value pairs
-    attributes_dict = dict(
-        re.split(r"(?<!\\)=", item) for item in re.split(r"(?<!\\);", columns[8])
-    )
+    attributes_dict = prepare_attributes(parse_attributes(columns[8]))
+
+    # Reconstruct the 9th field
+    columns[8] = serialize_attributes(attributes_dict)
+
+    # Return the modified line
+    return "\t".join(columns)
+
+
+def prepare_attributes(attributes_dict):
+    """
+    Reformat column 9 of a feature for conversion: GO terms, Pfam, Rfam and InterPro accessions
+    are moved into Dbxref and tool-specific annotations are moved into Note.
+    """
     # Move all GO terms into Dbxref and deduplicate if needed
     attributes_dict = collect_go_terms(attributes_dict)
 
@@ -83,13 +95,7 @@ def modify_line(line):
         "defense_finder_type": "anti-phage_system_type",
         "defense_finder_subtype": "anti-phage_system_subtype",
     }
-    attributes_dict = move_values_to_note(attributes_dict, attributes_to_move_to_note)
-
-    # Reconstruct the 9th field
-    columns[8] = ";".join([f"{key}={value}" for key, value in attributes_dict.items()])
-
-    # Return the modified line
-    return "\t".join(columns)
+    return move_values_to_note(attributes_dict, attributes_to_move_to_note)
 
 
 def move_values_to_note(attributes_dict, attributes_to_move_to_note):
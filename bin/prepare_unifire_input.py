@@ -22,21 +22,123 @@ import sys
 logging.basicConfig(level=logging.INFO)
 
 
-def main(infile, taxid, outdir):
+MANIFEST = "shards.tsv"
+MANIFEST_COLUMNS = ["shard", "folder", "sequences", "residues"]
+
+
+def main(infile, taxid, outdir, shards=1, balance_by="count"):
     check_dir(outdir)
     if not taxid.isdigit():
         sys.exit(
             f"Taxid must consist of digits only. Taxid {taxid} is not valid. Exiting."
         )
     outfile = "proteins.fasta"
-    outpath = os.path.join(outdir, outfile)
-    with open(outpath, "w") as file_out, open(infile) as file_in:
+    if shards == 1:
+        outpath = os.path.join(outdir, outfile)
+        with open(outpath, "w") as file_out, open(infile) as file_in:
+            for line in file_in:
+                if line.startswith(">"):
+                    formatted_line = reformat_line(line, taxid)
+                    file_out.write(formatted_line)
+                else:
+                    file_out.write(line)
+        return
+    sequences, residues = count_sequences(infile)
+    sizes = sequences if balance_by == "count" else residues
+    shard_ends = split_evenly(sizes, shards)
+    width = len(str(len(shard_ends)))
+    folders = [f"shard_{index:0{width}d}" for index in range(1, len(shard_ends) + 1)]
+    for folder in folders:
+        check_dir(os.path.join(outdir, folder))
+    with open(infile) as file_in:
+        sequence_index = 0
+        shard_index = 0
+        file_out = open(os.path.join(outdir, folders[shard_index], outfile), "w")
         for line in file_in:
             if line.startswith(">"):
-                formatted_line = reformat_line(line, taxid)
-                file_out.write(formatted_line)
+                if sequence_index == shard_ends[shard_index]:
+                    file_out.close()
+                    shard_index += 1
+                    file_out = open(
+                        os.path.join(outdir, folders[shard_index], outfile), "w"
+                    )
+                sequence_index += 1
+                file_out.write(reformat_line(line, taxid))
             else:
                 file_out.write(line)
+        file_out.close()
+    write_manifest(outdir, folders, shard_ends, residues)
+
+
+def count_sequences(infile):
+    """
+    Count the residues of every sequence in a FASTA file.
+
+    :param infile: path to the FASTA file
+    :return: list with a 1 for each sequence, list of the number of residues of each sequence
+    """
+    residues = list()
+    with open(infile) as file_in:
+        for line in file_in:
+            if line.startswith(">"):
+                residues.append(0)
+            elif residues:
+                residues[-1] += len(line.strip())
+    return [1] * len(residues), residues
+
+
+def split_evenly(sizes, shards):
+    """
+    Split a list of sequences into consecutive shards of about the same total size.
+
+    :param sizes: size of each sequence, in file order
+    :param shards: number of shards to make; fewer are made if there are not enough sequences
+    :return: list of the index of the first sequence after each shard
+    """
+    shards = max(1, min(shards, len(sizes)))
+    total = sum(sizes)
+    shard_ends = list()
+    cumulative_size = 0
+    for index, size in enumerate(sizes):
+        cumulative_size += size
+        remaining_shards = shards - len(shard_ends) - 1
+        remaining_sequences = len(sizes) - index - 1
+        # close the shard once it reaches its share of the total, leaving at least one
+        # sequence for each of the remaining shards
+        if remaining_shards and (
+            cumulative_size * shards >= total * (len(shard_ends) + 1)
+            or remaining_sequences == remaining_shards
+        ):
+            shard_ends.append(index + 1)
+    shard_ends.append(len(sizes))
+    return shard_ends
+
+
+def write_manifest(outdir, folders, shard_ends, residues):
+    with open(os.path.join(outdir, MANIFEST), "w") as file_out:
+        file_out.write("\t".join(MANIFEST_COLUMNS) + "\n")
+        shard_start = 0
+        for index, (folder, shard_end) in enumerate(zip(folders, shard_ends), start=1):
+            shard_residues = sum(residues[shard_start:shard_end])
+            file_out.write(
+                f"{index}\t{folder}\t{shard_end - shard_start}\t{shard_residues}\n"
+            )
+            shard_start = shard_end
+
+
+def load_shard_folders(manifest):
+    """
+    Return the paths to the shard folders listed in a manifest written by this script, in shard
+    order. Merging the outputs of the shards in that order gives the same order as the input.
+    """
+    folders = list()
+    with open(manifest) as file_in:
+        for line in file_in:
+            cols = line.rstrip("\n").split("\t")
+            if cols[0] == MANIFEST_COLUMNS[0]:
+                continue
+            folders.append(os.path.join(os.path.dirname(manifest), cols[1]))
+    return folders
 
 
 def check_dir(directory_path):
@@ -81,6 +183,26 @@ def parse_args():
         required=True,
         help=("Path to the folder where the output will be saved to."),
     )
+    parser.add_argument(
+        "--shards",
+        dest="shards",
+        required=False,
+        type=int,
+        default=1,
+        help=(
+            "Number of shards to split the proteins into so UniFIRE can process them in "
+            f"parallel. Each shard is saved to its own folder and listed in {MANIFEST}. "
+            "Default: 1 (no sharding)"
+        ),
+    )
+    parser.add_argument(
+        "--balance-by",
+        dest="balance_by",
+        required=False,
+        choices=["count", "residues"],
+        default="count",
+        help="Balance the shards by number of sequences or number of residues. Default: count",
+    )
     return parser.parse_args()
 
 
@@ -90,4 +212,6 @@ if __name__ == "__main__":
         args.infile,
         args.taxid,
         args.outdir,
+        args.shards,
+        args.balance_by,
     )
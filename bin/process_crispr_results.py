@@ -18,124 +18,173 @@
 import argparse
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-from Bio import SeqIO
+from indexed_fasta import IndexedFasta
 
 logging.basicConfig(level=logging.INFO)
 
 
-def main(tsv_report, gffs, tsv_output, gff_output, gff_output_hq, fasta):
+def main(tsv_report, gffs, tsv_output, gff_output, gff_output_hq, fasta, threads=None):
     hits, hq_hits, evidence_levels = process_tsv(tsv_report, tsv_output)
-    create_gff(gffs, gff_output, hits, fasta, hq_hits, gff_output_hq, evidence_levels)
+    # the FASTA is only indexed if a GFF line needs its sequence
+    with IndexedFasta(fasta) as fasta_index:
+        create_gff(
+            gffs,
+            gff_output,
+            hits,
+            fasta_index,
+            hq_hits,
+            gff_output_hq,
+            evidence_levels,
+            threads,
+        )
 
 
 def create_gff(
-    gffs, gff_output, hits, fasta, high_qual_hits, gff_output_high_qual, evidence_levels
+    gffs,
+    gff_output,
+    hits,
+    fasta_index,
+    high_qual_hits,
+    gff_output_high_qual,
+    evidence_levels,
+    threads=None,
 ):
+    # CRISPRCasFinder writes one GFF per sequence: only the ones with hits are read, in parallel,
+    # and written out in the order they were given
+    gffs_with_hits = [gff for gff in gffs if gff.split("/")[-1].split(".")[0] in hits]
     # generate 2 gffs: one with all hits, one with high-quality hits only
     with open(gff_output, "w") as gff_out, open(
         gff_output_high_qual, "w"
-    ) as hq_gff_out:
+    ) as hq_gff_out, ThreadPoolExecutor(max_workers=threads) as executor:
         gff_out.write("##gff-version 3\n")
         hq_gff_out.write("##gff-version 3\n")
-        for gff in gffs:
-            filename_base = gff.split("/")[-1].split(".")[0]
-            if filename_base in hits:
-                with open(gff) as gff_in:
-                    for line in gff_in:
-                        if line.startswith("#") or len(line.strip()) == 0:
-                            continue
-
-                        parts = line.strip().split("\t")
-                        # fix the GFF feature if it extends outside a contig (CRISPRCasFinder bug)
-                        if (
-                            not all(x > 0 for x in [int(parts[3]), int(parts[4])])
-                            or "sequence=UNKNOWN" in line
-                        ):
-                            line = fix_gff_line(line, fasta)
-                            if not line:
-                                continue
-                        # Get crispr_id here - before it has been fixed in CRISPR lines and before we remove it
-                        # in flanks
-                        crispr_id = get_crispr_id(line)
-                        if parts[2] == "CRISPR":
-                            line = add_evidence_level(line, evidence_levels)
-                            line = fix_crispr_id(line)
-                            line = fix_capitalisation(line)
-                        if "FLANK" in parts[2]:
-                            line = remove_parent(line)
-                            line = remove_leader_attribute(line)
-                        if crispr_id in high_qual_hits:
-                            hq_gff_out.write(line)
-                        gff_out.write(line)
-
-
-def fix_capitalisation(line):
+        processed_gffs = executor.map(
+            lambda gff: process_gff(gff, fasta_index, evidence_levels),
+            gffs_with_hits,
+        )
+        for processed_lines in processed_gffs:
+            for line, crispr_id in processed_lines:
+                if crispr_id in high_qual_hits:
+                    hq_gff_out.write(line)
+                gff_out.write(line)
+
+
+def process_gff(gff, fasta_index, evidence_levels):
+    """
+    Fix the lines of a GFF produced by CRISPRCasFinder.
+
+    :return: list of (fixed line, ID of the CRISPR array the line belongs to)
+    """
+    processed_lines = list()
+    with open(gff) as gff_in:
+        for line in gff_in:
+            if line.startswith("#") or len(line.strip()) == 0:
+                continue
+            processed_line = process_gff_line(line, fasta_index, evidence_levels)
+            if processed_line:
+                processed_lines.append(processed_line)
+    return processed_lines
+
+
+def process_gff_line(line, fasta_index, evidence_levels):
+    """
+    Split a GFF line once and apply all fixes to its fields.
+
+    :return: fixed line and the ID of the CRISPR array it belongs to, or None if the feature is
+        entirely outside its contig
+    """
+    fields = line.strip().split("\t")
+    feature = fields[2]
+    modified = False
+    # fix the GFF feature if it extends outside a contig (CRISPRCasFinder bug)
+    if (
+        not all(x > 0 for x in [int(fields[3]), int(fields[4])])
+        or "sequence=UNKNOWN" in fields[8]
+    ):
+        fields = fix_gff_fields(fields, fasta_index)
+        if not fields:
+            return None
+        modified = True
+    # Get crispr_id here - before it has been fixed in CRISPR lines and before we remove it
+    # in flanks
+    crispr_id = get_crispr_id(feature, fields[8])
+    if feature == "CRISPR":
+        fields[8] = add_evidence_level(fields[8], crispr_id, evidence_levels)
+        fields[8] = fix_crispr_id(fields[8])
+        fields[8] = fix_capitalisation(fields[8])
+        modified = True
+    if "FLANK" in feature:
+        annotation = remove_leader_attribute(remove_parent(fields[8]))
+        modified = modified or annotation != fields[8]
+        fields[8] = annotation
+    if modified:
+        line = "\t".join(fields) + "\n"
+    return line, crispr_id
+
+
+def fix_capitalisation(annotation):
     # Some attributes in GFFs produced by CRISPRCasFinder are capitalised making the GFF invalid
-    if "DR=" in line:
-        line = line.replace("DR=", "dr=")
-    if "Number_of_spacers" in line:
-        line = line.replace("Number_of_spacers", "number_of_spacers")
-    if "DR_length=" in line:
-        line = line.replace("DR_length=", "dr_length=")
-    return line
+    if "DR=" in annotation:
+        annotation = annotation.replace("DR=", "dr=")
+    if "Number_of_spacers" in annotation:
+        annotation = annotation.replace("Number_of_spacers", "number_of_spacers")
+    if "DR_length=" in annotation:
+        annotation = annotation.replace("DR_length=", "dr_length=")
+    return annotation
 
 
-def remove_leader_attribute(line):
+def remove_leader_attribute(annotation):
     """GFFs produced by CRISPRCasFinder have a "leader" attribute without any value making the GFF invalid"""
-    if ";leader;" in line:
-        line = line.replace("leader;", "")
-    return line
+    if ";leader;" in annotation:
+        annotation = annotation.replace("leader;", "")
+    return annotation
 
 
-def remove_parent(line):
+def remove_parent(annotation):
     # Leaving parent in makes the GFF invalid
-    if "Parent" in line:
+    if "Parent" in annotation:
         pattern = r"Parent=[^;]*;"
-        line = re.sub(pattern, "", line)
-    return line
+        annotation = re.sub(pattern, "", annotation)
+    return annotation
 
 
-def fix_crispr_id(line):
-    fields = line.strip().split("\t")
-    annot = fields[8]
-    annot_elements = annot.split(";")
+def fix_crispr_id(annotation):
+    annot_elements = annotation.split(";")
     for a in annot_elements:
         if a.startswith("Name="):
             name = a.split("=")[1]
         elif a.startswith("ID="):
             id = a.split("=")[1]
     # swap the values of "name" and "id"
-    fixed_annot = re.sub(f"ID={id}", f"ID={name}", annot)
+    fixed_annot = re.sub(f"ID={id}", f"ID={name}", annotation)
     fixed_annot = re.sub(f"Name={name}", f"Name={id}", fixed_annot)
-    fields[8] = fixed_annot
-    return "\t".join(fields) + "\n"
+    return fixed_annot
 
 
-def add_evidence_level(line, evidence_levels):
-    crispr_id = get_crispr_id(line)
-    try:
-        line = f"{line.strip()}evidence_level={evidence_levels[crispr_id]}\n"
-    except Exception:
+def add_evidence_level(annotation, crispr_id, evidence_levels):
+    if crispr_id in evidence_levels:
+        annotation = f"{annotation}evidence_level={evidence_levels[crispr_id]}"
+    else:
         logging.error(f"Cannot get evidence level for CRISPR {crispr_id}")
-    return line
+    return annotation
 
 
-def get_crispr_id(line):
+def get_crispr_id(feature, annotation):
     crispr_id = ""
-    if line.strip().split("\t")[2] == "CRISPR":
+    if feature == "CRISPR":
         annotation_field = "Name="
     else:
         annotation_field = "Parent="
-    annotation_parts = line.strip().split("\t")[8].split(";")
-    for a in annotation_parts:
+    for a in annotation.split(";"):
         if a.startswith(annotation_field):
             crispr_id = a.split("=")[1]
             break
     return crispr_id
 
 
-def fix_gff_line(line, fasta):
+def fix_gff_fields(fields, fasta_index):
     (
         contig,
         tool,
@@ -146,7 +195,7 @@ def fix_gff_line(line, fasta):
         blank2,
         blank3,
         annotation,
-    ) = line.strip().split("\t")
+    ) = fields
     # fix the start coordinate if it's invalid (extends past contig start)
     # return nothing if flanking sequence on the left is entirely outside the contig
     if int(start) < 1 and int(end) < 1:
@@ -155,30 +204,24 @@ def fix_gff_line(line, fasta):
         start = 1
     # fix sequence, at% and verify the end coordinate
     if "sequence=UNKNOWN" in annotation:
-        seq_records = SeqIO.to_dict(SeqIO.parse(fasta, "fasta"))
-        end = check_end_position(contig, end, seq_records)
+        end = check_end_position(contig, end, fasta_index)
         # return nothing if flanking sequence on the right is entirely outside the contig
         if int(end) - int(start) < 1:
             return None
-        feature_seq = seq_records[contig][int(start) - 1 : end].seq
+        feature_seq = fasta_index.fetch(contig, int(start) - 1, end)
         at_percentage = calc_at_percentage(feature_seq)
         annotation = fix_annotation(feature_seq, at_percentage, annotation)
-    return (
-        "\t".join(
-            [
-                contig,
-                tool,
-                feature,
-                str(start),
-                str(end),
-                blank1,
-                blank2,
-                blank3,
-                annotation,
-            ]
-        )
-        + "\n"
-    )
+    return [
+        contig,
+        tool,
+        feature,
+        str(start),
+        str(end),
+        blank1,
+        blank2,
+        blank3,
+        annotation,
+    ]
 
 
 def fix_annotation(feature_seq, at_percentage, annotation):
@@ -193,19 +236,20 @@ def calc_at_percentage(feature_seq):
     return str(int(round((a + t) * 100 / len(feature_seq), 0)))
 
 
-def check_end_position(contig, end, seq_records):
+def check_end_position(contig, end, fasta_index):
     # CRISPRCasFinder has a bug where it doesn't check how long the contig
     # is to identify flanking sequence positions. Adjust the end position
     # if it extends past the edge of the contig.
-    if int(end) > len(seq_records[contig].seq):
-        return len(seq_records[contig].seq)
+    contig_length = fasta_index.length(contig)
+    if int(end) > contig_length:
+        return contig_length
     else:
         return int(end)
 
 
 def process_tsv(tsv_report, tsv_output):
-    hits = list()
-    hq_hits = list()
+    hits = set()
+    hq_hits = set()
     evidence_levels = dict()
     with open(tsv_output, "w") as tsv_out:
         with open(tsv_report) as tsv_in:
@@ -220,17 +264,17 @@ def process_tsv(tsv_report, tsv_output):
                     continue
                 parts = line.strip().split("\t")
                 # add sequence basename to hits
-                hits.append(parts[2])
+                hits.add(parts[2])
                 # make crispr_id that the GFFs use
                 crispr_id = f"{parts[1]}_{parts[5]}_{parts[6]}"
                 # check if evidence level is high (2, 3 or 4)
                 if parts[-1] in ["2", "3", "4"]:
                     # add CRISPR ID (contig_start_end)
                     # to the high quality hit list
-                    hq_hits.append(crispr_id)
+                    hq_hits.add(crispr_id)
                 # save evidence level
                 evidence_levels[crispr_id] = parts[-1]
-    return list(set(hits)), list(set(hq_hits)), evidence_levels
+    return hits, hq_hits, evidence_levels
 
 
 def parse_args():
@@ -274,6 +318,12 @@ def parse_args():
     )
     parser.add_argument("--version", action="version", version="1.0")
     parser.add_argument("--fasta", required=True, help="Path to the genome Fasta file")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        required=False,
+        help="Number of GFFs read at the same time (default: chosen by Python from the CPU count)",
+    )
     return parser.parse_args()
 
 
@@ -286,4 +336,5 @@ if __name__ == "__main__":
         args.gff_output,
         args.gff_output_hq,
         args.fasta,
+        args.threads,
     )
@@ -18,6 +18,9 @@ import argparse
 import csv
 import logging
 import re
+import sys
+from collections import Counter
+from itertools import groupby
 
 logging.basicConfig(level=logging.INFO)
 
@@ -26,7 +29,8 @@ def main(arba, unirule, pirsr, gff, outfile):
     arba_dict = load_unirule_arba(arba)
     unirule_dict = load_unirule_arba(unirule)
     pirsr_dict = load_pirsr(pirsr)
-    combine_and_print(arba_dict, unirule_dict, pirsr_dict, gff, outfile)
+    predictions = combine_predictions([arba_dict, unirule_dict, pirsr_dict])
+    combine_and_print(predictions, gff, outfile)
     """
     for record in unirule_dict:
         print("\n\n{}".format(record))
@@ -48,24 +52,27 @@ def main(arba, unirule, pirsr, gff, outfile):
     """
 
 
-def combine_and_print(arba_dict, unirule_dict, pirsr_dict, gff, outfile):
-    fields_dict = {
-        "protein.recommendedName.fullName": "uf_prot_rec_fullname",
-        "protein.recommendedName.shortName": "uf_prot_rec_shortname",
-        "protein.recommendedName.ecNumber": "uf_prot_rec_ecnumber",
-        "protein.alternativeName.fullName": "uf_prot_alt_fullname",
-        "protein.alternativeName.shortName": "uf_prot_alt_shortname",
-        "protein.alternativeName.ecNumber": "uf_prot_alt_ecnumber",
-        "chebi": "uf_chebi",
-        "xref.GO": "uf_ontology_term",
-        "keyword": "uf_keyword",
-        "gene.name.primary": "uf_gene_name",
-        "gene.name.synonym": "uf_gene_name_synonym",
-        "pirsr_name": "uf_pirsr_cofactor",
-    }
+UNIFIRE_FIELDS = {
+    "protein.recommendedName.fullName": "uf_prot_rec_fullname",
+    "protein.recommendedName.shortName": "uf_prot_rec_shortname",
+    "protein.recommendedName.ecNumber": "uf_prot_rec_ecnumber",
+    "protein.alternativeName.fullName": "uf_prot_alt_fullname",
+    "protein.alternativeName.shortName": "uf_prot_alt_shortname",
+    "protein.alternativeName.ecNumber": "uf_prot_alt_ecnumber",
+    "chebi": "uf_chebi",
+    "xref.GO": "uf_ontology_term",
+    "keyword": "uf_keyword",
+    "gene.name.primary": "uf_gene_name",
+    "gene.name.synonym": "uf_gene_name_synonym",
+    "pirsr_name": "uf_pirsr_cofactor",
+}
 
+
+RESERVED_CHARACTERS = str.maketrans({";": "\\;", "=": "\\=", "&": "\\&", ",": "\\,"})
+
+
+def combine_and_print(predictions, gff, outfile):
     fasta_flag = False
-    list_of_dicts = [arba_dict, unirule_dict, pirsr_dict]
     with open(outfile, "w") as file_out, open(gff) as file_in:
         writer = csv.writer(file_out, delimiter="\t")
         for line in file_in:
@@ -81,79 +88,82 @@ def combine_and_print(arba_dict, unirule_dict, pirsr_dict, gff, outfile):
                     contig, tool, feature, start, end, blank1, strand, blank2, col9 = (
                         line.strip().split("\t")
                     )
+                    unifire_attributes = None
                     if feature == "CDS":
-                        id = get_id(col9)
-                        combined_dict = dict()
-                        for db_dict in list_of_dicts:
-                            if id in db_dict:
-                                for key, value in db_dict[id].items():
-                                    if key in combined_dict:
-                                        combined_dict[key].extend(value)
-                                    else:
-                                        combined_dict[key] = value.copy()
-                        if len(combined_dict) > 0:
-                            combined_dict = condense_dict(combined_dict)
-                            combined_dict = escape_reserved_characters(combined_dict)
-                            added_annot = ""
-                            for key, value in combined_dict.items():
-                                if key in fields_dict:
-                                    added_annot += ";{}={}".format(
-                                        fields_dict[key], ",".join(value)
-                                    )
-                            new_col_9 = col9 + added_annot
-                            writer.writerow(
-                                [
-                                    contig,
-                                    tool,
-                                    feature,
-                                    start,
-                                    end,
-                                    blank1,
-                                    strand,
-                                    blank2,
-                                    new_col_9,
-                                ]
-                            )
-                        else:
-                            file_out.write(line)
+                        unifire_attributes = predictions.get(get_id(col9))
+                    if unifire_attributes:
+                        added_annot = "".join(
+                            f";{field}={value}"
+                            for field, value in unifire_attributes.items()
+                        )
+                        writer.writerow(
+                            [
+                                contig,
+                                tool,
+                                feature,
+                                start,
+                                end,
+                                blank1,
+                                strand,
+                                blank2,
+                                col9 + added_annot,
+                            ]
+                        )
                     else:
                         file_out.write(line)
 
 
-def escape_reserved_characters(combined_dict):
-    reserved_characters = [";", "=", "&", ","]
-    for key, list_of_values in combined_dict.items():
-        remove_values = list()
-        add_values = list()
-        for value in list_of_values:
-            changes_flag = False
-            old_value = value
-            if value.endswith(";"):
-                value = value[:-1]
-                changes_flag = True
-            for ch in reserved_characters:
-                if ch in value:
-                    changes_flag = True
-                    value = value.replace(ch, f"\{ch}")
-            if changes_flag:
-                remove_values.append(old_value)
-                add_values.append(value)
-        for v in remove_values:
-            list_of_values.remove(v)
-        for v in add_values:
-            list_of_values.append(v)
-        combined_dict[key] = list_of_values
-
-    return combined_dict
-
-
-def condense_dict(combined_dict):
-    for key, list_to_condense in combined_dict.items():
-        list_to_condense = list(set(list_to_condense))
+def combine_predictions(list_of_dicts):
+    """
+    Combine the UniFIRE predictions into GFF attributes for every protein.
+
+    :param list_of_dicts: ARBA, UniRule and PIRSR predictions as loaded by load_unirule_arba and
+        load_pirsr
+    :return: dictionary where key = protein ID, value = dictionary where key = attribute name,
+        value = escaped attribute value; proteins without reportable predictions are left out
+    """
+    protein_ids = dict.fromkeys(
+        protein_id for db_dict in list_of_dicts for protein_id in db_dict
+    )
+    predictions = dict()
+    for protein_id in protein_ids:
+        attributes = get_unifire_attributes(protein_id, list_of_dicts)
+        if attributes:
+            predictions[protein_id] = attributes
+    return predictions
+
+
+def get_unifire_attributes(protein_id, list_of_dicts):
+    """
+    Combine the UniFIRE predictions for one protein into GFF attributes.
+
+    :param protein_id: protein ID from column 9
+    :param list_of_dicts: ARBA, UniRule and PIRSR predictions as loaded by load_unirule_arba and
+        load_pirsr
+    :return: dictionary where key = attribute name, value = escaped attribute value; empty if
+        there are no predictions for the protein
+    """
+    combined_dict = dict()
+    for db_dict in list_of_dicts:
+        for key, values in db_dict.get(protein_id, dict()).items():
+            # dictionary keys keep the values unique and in the order they were predicted in
+            combined_dict.setdefault(key, dict()).update(dict.fromkeys(values))
+    attributes = dict()
+    for key, values in combined_dict.items():
+        if key not in UNIFIRE_FIELDS:
+            continue
         if key == "keyword":
-            list_to_condense = collapse_keywords(list_to_condense)
-        combined_dict[key] = list_to_condense
-    return combined_dict
+            values = collapse_keywords(values)
+        attributes[UNIFIRE_FIELDS[key]] = ",".join(
+            escape_reserved_characters(value) for value in values
+        )
+    return attributes
+
+
+def escape_reserved_characters(value):
+    if value.endswith(";"):
+        value = value[:-1]
+    return value.translate(RESERVED_CHARACTERS)
 
 
 def get_id(col9):
@@ -169,6 +179,7 @@ def load_pirsr(pirsr):
             if not line.startswith("Evidence"):
                 if any(keyword in line for keyword in ["keyword", "comment.cofactor"]):
                     evidence, protein_id, annot_type, value = line.strip().split("\t")
+                    annot_type = sys.intern(annot_type)
                     if annot_type == "comment.cofactor":
                         elements = value.split(";")
                         for element in elements:
@@ -187,7 +198,7 @@ def load_pirsr(pirsr):
                     else:
                         results_dict.setdefault(protein_id, dict()).setdefault(
                             annot_type, list()
-                        ).append(value)
+                        ).append(sys.intern(value))
     for record in results_dict:
         if "keyword" in results_dict[record]:
             if len(results_dict[record]["keyword"]) > 1:
@@ -210,6 +221,7 @@ def load_unirule_arba(file):
                     pass  # don't do anything to feature lines with start and end coordinates
                 else:
                     evidence, protein_id, annot_type, value = line.strip().split("\t")
+                    annot_type = sys.intern(annot_type)
                     if (
                         not annot_type.startswith("comment")
                         and not annot_type.startswith("protein.domain")
@@ -217,7 +229,7 @@ def load_unirule_arba(file):
                     ):
                         results_dict.setdefault(protein_id, dict()).setdefault(
                             annot_type, list()
-                        ).append(value)
+                        ).append(sys.intern(value))
     for record in results_dict:
         if "keyword" in results_dict[record]:
             if len(results_dict[record]["keyword"]) > 1:
@@ -228,17 +240,30 @@ def load_unirule_arba(file):
 
 
 def collapse_keywords(keyword_list):
-    collapsed_list = list()
-
-    for keyword in keyword_list:
-        redundant = False
-        for other_keyword in keyword_list:
-            if keyword != other_keyword and keyword.lower() in other_keyword.lower():
-                redundant = True
-        if not redundant:
-            collapsed_list.append(keyword)
-    collapsed_list = list(set(collapsed_list))
-    return collapsed_list
+    """
+    Remove the keywords that are contained in another keyword, ignoring case. Keywords that only
+    differ in case contain each other and are all removed.
+
+    :param keyword_list: keywords to collapse
+    :return: list of the remaining unique keywords, in the order they were first seen
+    """
+    keywords = list(dict.fromkeys(keyword_list))
+    lowered = [keyword.lower() for keyword in keywords]
+    spellings = Counter(lowered)
+    contained = set()
+    # a keyword can only be contained in a longer one, so each keyword is searched for in all
+    # the longer ones at once
+    longer_keywords = ""
+    for _, group in groupby(sorted(spellings, key=len, reverse=True), key=len):
+        group = list(group)
+        if longer_keywords:
+            contained.update(keyword for keyword in group if keyword in longer_keywords)
+        longer_keywords += "\0" + "\0".join(group)
+    return [
+        keyword
+        for keyword, lower_keyword in zip(keywords, lowered)
+        if spellings[lower_keyword] == 1 and lower_keyword not in contained
+    ]
 
 
 def parse_args():
@@ -27,6 +27,7 @@ process ANNOTATE_GFF {
         file(unirule),                 // empty in fast mode
         file(pirsr)                    // empty in fast mode
     tuple path(interpro_entry_list), val(db_version)
+    path rfam_ncrna_classes
 
     output:
     tuple val(meta), path("*_annotations.gff"),                                   emit: annotated_gff
@@ -44,7 +45,6 @@ process ANNOTATE_GFF {
     def df_flag = "";
     def pseudofinder_flag = "";
     def ips_flag = "";
-    def hypothetical_ips_flags = "";
     def sanntis_flag = "";
     if ( crisprcas_hq_gff ) {
         crisprcas_flag = "-c ${crisprcas_hq_gff} ";
@@ -68,55 +68,35 @@ process ANNOTATE_GFF {
         pseudofinder_flag = "--pseudofinder ${pseudofinder_gff} --pseudogene-report ${meta.prefix}_pseudogene_report.txt"
     }
     if ( ips_annotations_tsv ) {
-        ips_flag = "-i ${ips_annotations_tsv}"
-        hypothetical_ips_flags = [
-            "--ipr-entries ${interpro_entry_list}/entry.list",
+        ips_flag = [
+            "-i ${ips_annotations_tsv}",
             "--ipr-hierarchy ${interpro_entry_list}/ParentChildTreeFile.txt",
-            "--ipr-output ${ips_annotations_tsv}",
         ].join(" ")
     }
     if ( sanntis_annotations_gff ) {
         sanntis_flag = "-s ${sanntis_annotations_gff} ";
     }
-    def hypothetical_tmp_gff = "${meta.prefix}_temp_with_unifire.gff"
-    if ( params.fast ) {
-        hypothetical_tmp_gff = "${meta.prefix}_temp.gff"
+    def unifire_flags = "";
+    def descriptions_flag = "";
+    if ( !params.fast ) {
+        unifire_flags = "--arba ${arba} --unirule ${unirule} --pirsr ${pirsr}"
+        descriptions_flag = "--descriptions-output ${meta.prefix}_annotations_with_descriptions.gff"
     }
     """
-    annotate_gff.py \
-    -g ${gff} \
-    -e ${eggnog_annotations_tsv} \
-    -r ${ncrna_tsv} \
-    -t ${trna_gff} \
-    -o ${meta.prefix}_temp.gff \
-    ${crisprcas_flag} ${sanntis_flag} ${amrfinder_flag} ${pseudofinder_flag}\
+    annotate_gff_pipeline.py \\
+    -g ${gff} \\
+    -e ${eggnog_annotations_tsv} \\
+    -r ${ncrna_tsv} \\
+    --rfam-classes ${rfam_ncrna_classes} \\
+    -t ${trna_gff} \\
+    --ipr-entries ${interpro_entry_list}/entry.list \\
+    --ipr-version ${db_version.toString().trim()} \\
+    --annotations-output ${meta.prefix}_annotations.gff \\
+    --submission-output ${meta.prefix}_submission.gff \\
+    ${descriptions_flag} ${unifire_flags} \\
+    ${crisprcas_flag} ${sanntis_flag} ${amrfinder_flag} ${pseudofinder_flag} \\
     ${antismash_flag} ${gecco_flag} ${dbcan_flag} ${df_flag} ${ips_flag}
 
-    if [ "${params.fast}" == "false" ]; then
-        process_unifire_output.py \\
-        -g ${meta.prefix}_temp.gff \\
-        -a ${arba} \\
-        -u ${unirule} \\
-        -p ${pirsr} \\
-        -o ${meta.prefix}_temp_with_unifire.gff
-    fi
-
-    add_hypothetical_protein_descriptions.py \\
-    --eggnog-output ${eggnog_annotations_tsv} \\
-    -i ${hypothetical_tmp_gff} \\
-    -o ${meta.prefix}_annotations.gff ${hypothetical_ips_flags}
-
-    prepare_gff_for_conversion.py \\
-    -i ${meta.prefix}_annotations.gff \\
-    -o ${meta.prefix}_submission.gff
-
-    if [ "${params.fast}" == "false" ]; then
-        add_interpro_descriptions.py \\
-        --ipr-entries ${interpro_entry_list}/entry.list \\
-        -i ${meta.prefix}_annotations.gff \\
-        -o ${meta.prefix}_annotations_with_descriptions.gff
-    fi
-
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
         python: \$(python --version 2>&1 | sed 's/Python //g')
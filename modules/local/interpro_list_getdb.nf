@@ -6,8 +6,6 @@ process INTEPRO_ENTRY_LIST_GETDB {
         'https://depot.galaxyproject.org/singularity/gnu-wget:1.18--h36e9172_9' :
         'biocontainers/gnu-wget:1.18--h36e9172_9' }"
 
-    publishDir "${params.dbs}", mode: 'copy'
-
     output:
     tuple path("interpro_entry_list/", type: "dir"), val("94.0"), emit: interpro_entry_list
 
@@ -0,0 +1,37 @@
+process INTERPRO_ENTRY_LIST_SNAPSHOT {
+
+    tag "InterPro Entry List ${db_version}"
+
+    label 'process_nano'
+
+    container "${ workflow.containerEngine in ['singularity', 'apptainer'] ?
+        'https://depot.galaxyproject.org/singularity/python:3.9' :
+        'biocontainers/python:3.9' }"
+
+    publishDir "${params.dbs}", mode: 'copy'
+
+    input:
+    tuple path(interpro_entry_list, stageAs: "downloaded_entry_list"), val(db_version)
+
+    output:
+    tuple path("interpro_entry_list/", type: "dir"), val(db_version), emit: interpro_entry_list
+
+    script:
+    """
+    mkdir -p interpro_entry_list
+
+    cp -L ${interpro_entry_list}/* interpro_entry_list/
+
+    interpro_entries.py \\
+    --ipr-entries interpro_entry_list/entry.list \\
+    --ipr-hierarchy interpro_entry_list/ParentChildTreeFile.txt \\
+    --db-version ${db_version} \\
+    -o interpro_entry_list/interpro_entries.snapshot
+    """
+
+    stub:
+    """
+    mkdir -p interpro_entry_list
+    touch interpro_entry_list/interpro_entries.snapshot
+    """
+}
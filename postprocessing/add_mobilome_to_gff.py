@@ -15,14 +15,20 @@
 #
 
 import argparse
+import bisect
 import re
+from collections import namedtuple
+
+MobilomeIndex = namedtuple("MobilomeIndex", "starts ends orders lines longest")
 
 
 def main(mobilome_file, infile, outfile):
     mobilome_dict = load_mobilome(mobilome_file)
-    printed_list = (
-        list()
-    )  # record which mobilome lines have already been printed to the output file
+    mobilome_index = index_mobilome(mobilome_dict)
+    # record which mobilome lines have already been printed to the output file
+    printed_lines = set()
+    # number of records on each contig, in order of start, that the annotation GFF has moved past
+    sweep_positions = dict()
     fasta_flag = False
     with open(infile) as file_in, open(outfile, "w") as file_out:
         previous_contig = ""
@@ -30,6 +36,14 @@ def main(mobilome_file, infile, outfile):
             if line.startswith("#"):
                 if line.startswith("##FASTA"):
                     fasta_flag = True
+                    # print the MGEs that are located after the last feature of the last contig
+                    write_mobilome_lines(
+                        file_out,
+                        look_for_lines_to_print(
+                            mobilome_index, previous_contig, printed_lines
+                        ),
+                        printed_lines,
+                    )
                 file_out.write(line)
             elif fasta_flag:
                 # We are printing the FASTA sequence at the end of the file now
@@ -41,38 +55,44 @@ def main(mobilome_file, infile, outfile):
                 if previous_contig and contig != previous_contig:
                     # We switched to a new contig, check if there are any MGE lines left on the previous contig that
                     # were not printed.
-                    last_contig_lines_to_print = look_for_lines_to_print(
-                        mobilome_dict, previous_contig, 9999999999999, printed_list
+                    write_mobilome_lines(
+                        file_out,
+                        look_for_lines_to_print(
+                            mobilome_index, previous_contig, printed_lines
+                        ),
+                        printed_lines,
                     )
-                    for line_to_print in last_contig_lines_to_print:
-                        file_out.write(line_to_print)
-                        printed_list.append(line_to_print)
                 previous_contig = contig
 
                 # Now process the current line, check if there is an overlap with any MGEs
                 start, end = int(start), int(end)
                 overlap, lines_to_print = check_overlap(
-                    mobilome_dict, contig, start, end
+                    mobilome_index, contig, start, end
                 )
                 # Before printing any results, check if there are earlier mobilome lines on this contig
                 # that haven't been printed yet
-                extra_lines_to_print = look_for_lines_to_print(
-                    mobilome_dict, contig, start, printed_list
+                extra_lines_to_print = sweep_to(
+                    mobilome_index, sweep_positions, contig, start, printed_lines
+                )
+                write_mobilome_lines(
+                    file_out,
+                    [
+                        line
+                        for line in extra_lines_to_print
+                        if line not in lines_to_print
+                    ],
+                    printed_lines,
                 )
-                for extra_line in extra_lines_to_print:
-                    if extra_line not in lines_to_print:
-                        file_out.write(extra_line)
-                        printed_list.append(extra_line)
                 if overlap:
                     add_to_cds = ""
                     mge_ids = list()
                     mge_types = list()
                     # Add mobilome record info to CDS
                     for line_to_print in lines_to_print:
-                        if line_to_print not in printed_list:
+                        if line_to_print not in printed_lines:
                             # print the mobilome line first
                             file_out.write(line_to_print)
-                            printed_list.append(line_to_print)
+                            printed_lines.add(line_to_print)
                         if feature == "CDS":
                             # extract information to add to the CDS
                             mge_col9 = line_to_print.strip().split("\t")[8]
@@ -112,26 +132,80 @@ def main(mobilome_file, infile, outfile):
                     file_out.write(line)
                 else:
                     file_out.write(line)
-    sanity_check(mobilome_dict, printed_list)
+        if not fasta_flag:
+            write_mobilome_lines(
+                file_out,
+                look_for_lines_to_print(mobilome_index, previous_contig, printed_lines),
+                printed_lines,
+            )
+    sanity_check(mobilome_dict, printed_lines)
 
 
-def sanity_check(mobilome_dict, printed_list):
+def sanity_check(mobilome_dict, printed_lines):
     """Check that the number of records added to the GFF matches the number of records in the mobilome file"""
-    printed_list_length = len(list(set(printed_list)))
+    printed_list_length = len(printed_lines)
     mobilome_count = sum(len(inner_dict) for inner_dict in mobilome_dict.values())
     assert (
         printed_list_length == mobilome_count
     ), f"The number of mobilome entries added to the GFF does not match the expected count: added {printed_list_length}, expected{mobilome_count}"
 
 
-def look_for_lines_to_print(mobilome_dict, contig, start, printed_list):
-    lines_to_print = list()
-    if contig not in mobilome_dict:
-        return lines_to_print
-    for interval in mobilome_dict[contig]:
-        if interval[0] < start and mobilome_dict[contig][interval] not in printed_list:
-            lines_to_print.append(mobilome_dict[contig][interval])
-    return lines_to_print
+def write_mobilome_lines(file_out, lines, printed_lines):
+    for line in lines:
+        file_out.write(line)
+        printed_lines.add(line)
+
+
+def index_mobilome(mobilome_dict):
+    """
+    Sort the MGE records of each contig by start so that the annotation GFF can be swept against
+    them and the records that cover a feature can be found with a binary search.
+
+    :param mobilome_dict: MGE records loaded by load_mobilome
+    :return: dictionary where key = contig, value = MobilomeIndex with the starts, ends, positions
+        in the mobilome file and lines of the records in order of start, and the length of the
+        longest record
+    """
+    mobilome_index = dict()
+    for contig, records in mobilome_dict.items():
+        order_by_start = sorted(
+            enumerate(records.items()), key=lambda record: record[1][0]
+        )
+        mobilome_index[contig] = MobilomeIndex(
+            starts=[start for _, ((start, _), _) in order_by_start],
+            ends=[end for _, ((_, end), _) in order_by_start],
+            orders=[order for order, _ in order_by_start],
+            lines=[line for _, (_, line) in order_by_start],
+            longest=max(end - start + 1 for start, end in records),
+        )
+    return mobilome_index
+
+
+def sweep_to(mobilome_index, sweep_positions, contig, start, printed_lines):
+    """
+    Advance the sweep of a contig to start and return the records that begin before start and
+    have not been printed yet, in the order of the mobilome file. Records that begin before an
+    earlier position of the sweep have already been printed.
+    """
+    if contig not in mobilome_index:
+        return list()
+    index = mobilome_index[contig]
+    first = sweep_positions.get(contig, 0)
+    last = bisect.bisect_left(index.starts, start)
+    if last <= first:
+        return list()
+    sweep_positions[contig] = last
+    passed = sorted(range(first, last), key=index.orders.__getitem__)
+    return [index.lines[i] for i in passed if index.lines[i] not in printed_lines]
+
+
+def look_for_lines_to_print(mobilome_index, contig, printed_lines):
+    """Return the records of a contig that have not been printed yet, in the order of the mobilome file."""
+    if contig not in mobilome_index:
+        return list()
+    index = mobilome_index[contig]
+    remaining = sorted(range(len(index.lines)), key=index.orders.__getitem__)
+    return [index.lines[i] for i in remaining if index.lines[i] not in printed_lines]
 
 
 def calculate_overlap_fraction(interval1, interval2):
@@ -151,13 +225,26 @@ def calculate_overlap_fraction(interval1, interval2):
         return 0.0
 
 
-def check_overlap(dictionary, sequence, start, end):
+def check_overlap(mobilome_index, sequence, start, end):
     """Check if at least 75% of the CDS overlaps with any entry in the MGE dictionary."""
     result = list()
-    if sequence in dictionary:
-        for region, text in dictionary[sequence].items():
-            if calculate_overlap_fraction((start, end), region) >= 0.75:
-                result.append(text)
+    if sequence in mobilome_index:
+        index = mobilome_index[sequence]
+        # an MGE that covers 75% of the CDS starts no later than the last 75% of the CDS begins
+        # and no earlier than the longest MGE reaching the first 75% of the CDS would
+        covered_length = 0.75 * (end - start + 1)
+        last = bisect.bisect_right(index.starts, end - covered_length + 1)
+        first = bisect.bisect_left(index.starts, start + covered_length - index.longest)
+        candidates = [
+            i
+            for i in range(first, last)
+            if calculate_overlap_fraction(
+                (start, end), (index.starts[i], index.ends[i])
+            )
+            >= 0.75
+        ]
+        candidates.sort(key=index.orders.__getitem__)
+        result = [index.lines[i] for i in candidates]
     if len(result) > 0:
         return True, result
     else:
@@ -16,32 +16,81 @@
 
 import argparse
 import logging
+import os
 import re
 import sys
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 logging.basicConfig(level=logging.INFO)
 
+# the gene name can be the last attribute
+GENE_PATTERN = re.compile(r";gene=([^;]*)")
+LOCUS_PATTERN = re.compile(r";locus_tag=(.*?);")
+ALIAS_PATTERN = re.compile(r";Alias=(.*?);")
 
-def main(reference, target, outfile, species):
-    # Choose stable ID prefix depending on the species
-    species_prefix = get_prefix(species)
+# how to read the reference of a species: the stable ID prefix of its genes, and the patterns
+# that capture the stable ID and the gene name from column 9
+SpeciesConfig = namedtuple("SpeciesConfig", ["prefix", "id_pattern", "name_pattern"])
+
+SPECIES_CONFIG = {
+    "uniformis": SpeciesConfig(
+        "BACUNI", re.compile(r"ID=gene:(.*?);"), re.compile(r";Name=(.*?);")
+    ),
+    "vulgatus": SpeciesConfig("BVU", re.compile(r"old_locus_tag=(.*?)$"), GENE_PATTERN),
+}
+
+REPORT_COLUMNS = ("replaced", "unable_to_decide", "unknowns_only")
+
+# gene record from the GFF being deduplicated; name, locus and alias are None if missing
+GeneRecord = namedtuple("GeneRecord", ["name", "locus", "alias"])
+
+# genes of the GFF being deduplicated: the gene records in file order, the number of genes with
+# each alias, and the records of the numbered copies (e.g. susC_1) grouped by base name (susC)
+GeneTable = namedtuple("GeneTable", ["genes", "by_alias", "by_base"])
+
+# one target of a batch run, as listed in the manifest
+MANIFEST_COLUMNS = ("genome", "species", "reference", "target")
+BatchTarget = namedtuple("BatchTarget", MANIFEST_COLUMNS)
+
+
+def main(reference, target, outfile, species, species_config=None, report_prefix=None):
+    # Choose how to read the reference depending on the species
+    config = get_species_config(species, species_config)
     # Load known gene names and aliases from the reference
-    alias_genename_dict = load_ref_genenames(reference, species_prefix)
+    alias_genename_dict = load_ref_genenames(reference, config)
+    return resolve_duplicates(
+        alias_genename_dict, target, outfile, report_prefix or species
+    )
+
+
+def resolve_duplicates(alias_genename_dict, target, outfile, report_prefix):
+    """
+    Remove the copy numbers from the gene names of the target that the reference can tell
+    apart. The decisions are saved to <report_prefix>_stats.txt and the renamed genes to
+    <report_prefix>_replacements.txt.
+
+    :param alias_genename_dict: gene names of the reference, as loaded by load_ref_genenames
+    :return: dictionary with the number of gene groups in each outcome
+    """
     # Get duplicate gene names from the GFF we are modifying.
     # In dedupl_dict, key = base gene name (e.g. susC), value = dictionary where:
     # key = full gene name (e.g. susC_1), value = dictionary where:
     # key = "locus", value = locus name (e.g. BU_ATCC8492_00006); key = "alias", value = alias name (e.g. BACUNI_00053)
     # gene_occurrence_counter has the number of times every single gene appears in the genome we are deduplicating
-    dedupl_dict, gene_occurrence_counter, alias_repeats = load_duplicates(target)
+    gene_table = load_gene_table(target)
+    dedupl_dict, gene_occurrence_counter, alias_repeats = load_duplicates(gene_table)
     # Todo: articifially create a file with alias repeated and gene name assigned to test deduplication
     #  with extra_copy_number > 1
 
     counter = 0  # track total number of gene groups to deduplicate
     stats_dict = dict()  # stats for printing
     replacements = dict()  # gene names to change
+    # how many times each gene name is used as a replacement
+    replacement_counts = Counter()
     replacements_ids = dict()  # changes to make if alias is None
     reverse = list()  # undo some planned changes (remove these from replacements)
-    stats_out = open(f"{species}_stats.txt", "w")
+    stats_out = open(f"{report_prefix}_stats.txt", "w")
     stats_out.write("Gene\tCopy number\tReplaced\tWhy not replaced/ Comment\n")
     for base in dedupl_dict:
         if (
@@ -94,7 +143,7 @@ def main(reference, target, outfile, species):
                         sys.exit(
                             f"Error: something went wrong, alias {alias} is already in replacements"
                         )
-                    replacements[alias] = base
+                    set_replacement(replacements, replacement_counts, alias, base)
                     stats_dict["replaced"] = stats_dict.get("replaced", 0) + 1
                     replace = True
                     printed_stat += "Yes\t\n"
@@ -127,7 +176,7 @@ def main(reference, target, outfile, species):
                     )
                 else:
                     already_present_in_replacements, reverse = check_gene_presence(
-                        decision_dict, replacements, reverse
+                        decision_dict, replacement_counts, reverse
                     )
 
                     if already_present_in_replacements:
@@ -148,7 +197,9 @@ def main(reference, target, outfile, species):
                         for gene_name, alias_list in decision_dict.items():
                             alias = alias_list[0]
                             if alias not in replacements:
-                                replacements[alias] = gene_name
+                                set_replacement(
+                                    replacements, replacement_counts, alias, gene_name
+                                )
                             else:
                                 (f"Alias {alias} is already in replacements")
                                 sys.exit()
@@ -178,19 +229,20 @@ def main(reference, target, outfile, species):
                             )
                             if "Yes" in printed_stat:
                                 replace = True
-        if replace:
-            replacements, printed_stat, replacements_ids = (
-                try_to_remove_more_underscores(
-                    replacements,
-                    base,
-                    printed_stat,
-                    decision_dict,
-                    dedupl_dict[base],
-                    replacements_ids,
+            if replace:
+                replacements, printed_stat, replacements_ids = (
+                    try_to_remove_more_underscores(
+                        replacements,
+                        base,
+                        printed_stat,
+                        decision_dict,
+                        dedupl_dict[base],
+                        replacements_ids,
+                        replacement_counts,
+                    )
                 )
-            )
-        stats_out.write(printed_stat)
-    print("replacement ids", replacements_ids)
+            stats_out.write(printed_stat)
+    logging.debug(f"Replacement IDs: {replacements_ids}")
     if (
         len(set(replacements.values())) != len(replacements.values())
         or len(reverse) > 0
@@ -198,7 +250,7 @@ def main(reference, target, outfile, species):
         sys.exit("Non-unique values in replacements")
     else:
         made_replacements = make_replacement_file(
-            target, outfile, replacements, replacements_ids, species
+            target, outfile, replacements, replacements_ids, report_prefix
         )
     if made_replacements != (len(replacements) + len(replacements_ids)):
         sys.exit(
@@ -219,6 +271,7 @@ def try_to_remove_more_underscores(
     decision_dict,
     deduplication_section,
     replacements_ids,
+    replacement_counts,
 ):
     # Check if after the replacements have been made we can remove more underscores.
     # This can only happen if replacements have been made to genes that are not the base value
@@ -232,10 +285,10 @@ def try_to_remove_more_underscores(
             ]
             for key in deduplication_section.keys():
                 if deduplication_section[key]["alias"] is None:
-                    print("Alias is none", deduplication_section[key])
-                    replacements_ids[deduplication_section[key]["locus"]] = key.split(
-                        "_"
-                    )[0]
+                    logging.debug(f"Alias is none {deduplication_section[key]}")
+                    replacements_ids[deduplication_section[key]["locus"]] = get_base(
+                        key
+                    )
                     printed_stat = printed_stat.replace(
                         "\n",
                         "Removed underscore from {} because it was the only duplicate "
@@ -243,9 +296,12 @@ def try_to_remove_more_underscores(
                     ).format(key)
                     return replacements, printed_stat, replacements_ids
                 if deduplication_section[key]["alias"] not in bacunis_already_replaced:
-                    replacements[deduplication_section[key]["alias"]] = key.split("_")[
-                        0
-                    ]
+                    set_replacement(
+                        replacements,
+                        replacement_counts,
+                        deduplication_section[key]["alias"],
+                        get_base(key),
+                    )
                     printed_stat = printed_stat.replace(
                         "\n",
                         "Removed underscore from {} because it was the only duplicate "
@@ -254,59 +310,69 @@ def try_to_remove_more_underscores(
     return replacements, printed_stat, replacements_ids
 
 
-def make_replacement_file(target, outfile, replacements, replacements_ids, species):
+def set_replacement(replacements, replacement_counts, alias, gene_name):
+    if alias in replacements:
+        replacement_counts[replacements[alias]] -= 1
+    replacements[alias] = gene_name
+    replacement_counts[gene_name] += 1
+
+
+def make_replacement_file(
+    target, outfile, replacements, replacements_ids, report_prefix
+):
     seq_flag = False
-    count_replacements = list()
-    rep_out = open(f"{species}_replacements.txt", "w")
-    with open(target) as file_in, open(outfile, "w") as file_out:
+    count_replacements = set()
+    gene_alias_name = gene_id = None
+    with open(target) as file_in, open(outfile, "w") as file_out, open(
+        f"{report_prefix}_replacements.txt", "w"
+    ) as rep_out:
         for line in file_in:
+            if seq_flag:
+                file_out.write(line)
+                continue
             if line.startswith("#"):
                 if line.startswith("##FASTA"):
                     seq_flag = True
                 file_out.write(line)
-            elif seq_flag:
+                continue
+            fields = line.strip().split("\t")
+            if fields[2] not in ("gene", "CDS", "mRNA", "exon"):
                 file_out.write(line)
-            else:
-                fields = line.strip().split("\t")
-                if fields[2] == "gene":
-                    id = fields[8].split(";")[0].split("=")[1]
-                    print(id)
-                    alias_pattern = r";Alias=(.*?);"
-                    try:
-                        alias_name = re.search(alias_pattern, fields[8]).group(1)
-                    except:  # noqa: E722
-                        alias_name = None
-                    gene_alias_name = alias_name
-                    gene_id = id
-                if fields[2] in ["gene", "CDS", "mRNA", "exon"]:
-                    gene_pattern = r";gene=(.*?);"
-                    try:
-                        gene_name = re.search(gene_pattern, fields[8]).group(1)
-                    except:  # noqa E722
-                        gene_name = None
-                    if fields[2] in ["CDS", "mRNA", "exon"]:
-                        alias_name = gene_alias_name
-                        id = gene_id
-                    if alias_name and alias_name in replacements:
-                        if fields[2] == "gene":
-                            rep_out.write(f"{gene_name}\t{replacements[alias_name]}\n")
-                        line = line.replace(gene_name, replacements[alias_name])
-                        count_replacements.append(alias_name)
-                    print(f"ID is {id}")
-                    if id in replacements_ids:
-                        print("ID IS IN IDS")
-                        if fields[2] == "gene":
-                            rep_out.write(f"{gene_name}\t{replacements_ids[id]}\n")
-                            print(
-                                "made replacement of", gene_name, replacements_ids[id]
-                            )
-                        line = line.replace(gene_name, replacements_ids[id])
-                        count_replacements.append(id)
-                    file_out.write(line)
-                else:
-                    file_out.write(line)
-    rep_out.close()
-    return len(set(count_replacements))
+                continue
+            gene_name = search_attribute(GENE_PATTERN, fields[8])
+            if fields[2] == "gene":
+                gene_id = fields[8].split(";")[0].split("=")[1]
+                gene_alias_name = search_attribute(ALIAS_PATTERN, fields[8])
+            new_name = None
+            if gene_alias_name and gene_alias_name in replacements:
+                new_name = replacements[gene_alias_name]
+                count_replacements.add(gene_alias_name)
+            if gene_id in replacements_ids:
+                # the gene is only renamed once, by its alias if it has a replacement
+                new_name = new_name or replacements_ids[gene_id]
+                count_replacements.add(gene_id)
+            if new_name is None or gene_name is None:
+                file_out.write(line)
+                continue
+            if fields[2] == "gene":
+                if gene_alias_name in replacements:
+                    rep_out.write(f"{gene_name}\t{replacements[gene_alias_name]}\n")
+                if gene_id in replacements_ids:
+                    rep_out.write(f"{gene_name}\t{replacements_ids[gene_id]}\n")
+            fields[8] = rename_gene(fields[8], gene_name, new_name)
+            file_out.write("\t".join(fields) + "\n")
+    return len(count_replacements)
+
+
+def rename_gene(col9, gene_name, new_name):
+    # only whole attribute values are replaced, so a gene name that is the start of another
+    # (susC_1 and susC_10) or that appears in free text is left alone
+    attributes = col9.split(";")
+    for index, attribute in enumerate(attributes):
+        key, separator, value = attribute.partition("=")
+        if value == gene_name:
+            attributes[index] = f"{key}{separator}{new_name}"
+    return ";".join(attributes)
 
 
 def resolve_duplicate(
@@ -346,13 +412,13 @@ def resolve_duplicate(
     return replacements, reverse, stats_dict, printed_stat
 
 
-def check_gene_presence(decision_dict, replacements, reverse):
+def check_gene_presence(decision_dict, replacement_counts, reverse):
     result = False
     check_values = [
         value for values_list in decision_dict.values() for value in values_list
     ]
     for val in check_values:
-        if val in replacements.values():
+        if replacement_counts[val] > 0:
             result = True
             reverse.append(val)
     return result, reverse
@@ -368,90 +434,278 @@ def check_value_uniqueness(my_dict):
         return False
 
 
-def load_duplicates(infile):
-    dedupl_dict = dict()
-    gene_occurrence_counter = dict()
-    alias_repeats = dict()
+def search_attribute(pattern, col9):
+    match = pattern.search(col9)
+    return match.group(1) if match else None
+
+
+def get_base(gene_name):
+    return gene_name.rsplit("_", 1)[0]
+
+
+def load_gene_table(infile):
+    """
+    Read the named genes of the GFF being deduplicated.
+
+    :param infile: GFF generated by Prokka with aliases added from the reference by Liftoff
+    :return: GeneTable
+    """
+    genes = list()
+    by_alias = Counter()
+    by_base = dict()
     with open(infile) as file_in:
         for line in file_in:
-            if not line.startswith("#"):
-                if line.startswith(">"):
-                    break
-                _, _, feature, _, _, _, _, _, annot = line.strip().split("\t")
-                if feature == "gene" and "gene=" in annot:
-                    gene_pattern = r";gene=(.*?);"
-                    locus_pattern = r";locus_tag=(.*?);"
-                    alias_pattern = r";Alias=(.*?);"
-                    try:
-                        gene_name = re.search(gene_pattern, annot).group(1)
-                    except:  # noqa E722
-                        gene_name = None
-                    try:
-                        locus_name = re.search(locus_pattern, annot).group(1)
-                    except:  # noqa E722
-                        locus_name = None
-                    try:
-                        alias_name = re.search(alias_pattern, annot).group(1)
-                    except:  # noqa E722
-                        alias_name = None
-                    if alias_name:
-                        alias_repeats[alias_name] = alias_repeats.get(alias_name, 0) + 1
-                    if "_" in gene_name:
-                        base, copy_num = gene_name.split("_")
-                        gene_occurrence_counter[base] = (
-                            gene_occurrence_counter.get(base, 0) + 1
-                        )
-                        try:
-                            int(copy_num)
-                            dedupl_dict.setdefault(base, dict()).setdefault(
-                                gene_name, dict()
-                            )
-                            dedupl_dict[base][gene_name] = {
-                                "locus": locus_name,
-                                "alias": alias_name,
-                            }
-                        except ValueError:
-                            pass
-                    else:
-                        gene_occurrence_counter[gene_name] = (
-                            gene_occurrence_counter.get(gene_name, 0) + 1
-                        )
-    return dedupl_dict, gene_occurrence_counter, alias_repeats
+            if line.startswith("#"):
+                continue
+            if line.startswith(">"):
+                break
+            _, _, feature, _, _, _, _, _, annot = line.strip().split("\t")
+            if feature != "gene" or "gene=" not in annot:
+                continue
+            gene = GeneRecord(
+                search_attribute(GENE_PATTERN, annot),
+                search_attribute(LOCUS_PATTERN, annot),
+                search_attribute(ALIAS_PATTERN, annot),
+            )
+            if not gene.name:
+                logging.warning(f"Skipping a gene without a gene name: {annot}")
+                continue
+            genes.append(gene)
+            if gene.alias:
+                by_alias[gene.alias] += 1
+            if "_" in gene.name:
+                base, copy_num = gene.name.rsplit("_", 1)
+                try:
+                    int(copy_num)
+                    by_base.setdefault(base, list()).append(gene)
+                except ValueError:
+                    pass
+    return GeneTable(genes, by_alias, by_base)
 
 
-def get_prefix(species):
-    if species.lower() == "uniformis":
-        return "BACUNI"
-    elif species.lower() == "vulgatus":
-        return "BVU"
-    else:
+def load_duplicates(gene_table):
+    """
+    Get the numbered gene copies to deduplicate from the gene table.
+
+    :param gene_table: GeneTable from load_gene_table
+    :return: dedupl_dict, where key = base gene name (e.g. susC), value = dictionary where
+        key = full gene name (e.g. susC_1), value = dictionary with the "locus" and "alias" of the
+        gene; gene_occurrence_counter, the number of genes with each base name; alias_repeats,
+        the number of genes with each alias
+    """
+    dedupl_dict = dict()
+    for base, genes in gene_table.by_base.items():
+        dedupl_dict[base] = {
+            gene.name: {"locus": gene.locus, "alias": gene.alias} for gene in genes
+        }
+    gene_occurrence_counter = Counter(get_base(gene.name) for gene in gene_table.genes)
+    return dedupl_dict, gene_occurrence_counter, gene_table.by_alias
+
+
+def get_species_config(species, species_config=None):
+    species_config = species_config or SPECIES_CONFIG
+    try:
+        return species_config[species.lower()]
+    except KeyError:
         raise ValueError("Unknown species")
 
 
-def load_ref_genenames(reference, species_prefix):
+def load_species_config(config_file):
+    """
+    Read a species table: a TSV with the columns species, prefix (the stable ID prefix of the
+    reference genes), id_pattern and name_pattern (regular expressions capturing the stable ID
+    and the gene name from column 9 of the reference), with or without a header line.
+
+    :return: dictionary where key = lower case species name, value = SpeciesConfig; the
+        built-in species are included unless the table redefines them
+    """
+    species_config = dict(SPECIES_CONFIG)
+    with open(config_file) as file_in:
+        for line in file_in:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            cols = line.split("\t")
+            if len(cols) != 4:
+                sys.exit(
+                    f"Species table lines need 4 tab separated columns (species, prefix, "
+                    f"id_pattern, name_pattern), found {len(cols)}: {line}"
+                )
+            if cols[0] == "species":
+                continue
+            species, prefix, id_pattern, name_pattern = cols
+            species_config[species.lower()] = SpeciesConfig(
+                prefix, re.compile(id_pattern), re.compile(name_pattern)
+            )
+    return species_config
+
+
+def load_ref_genenames(reference, species_config):
     alias_genename_dict = dict()
+    species_prefix, id_pattern, name_pattern = species_config
     with open(reference) as file_in:
         for line in file_in:
-            if not line.startswith("#"):
-                _, _, feature, _, _, _, _, _, annot = line.strip().split("\t")
-                if feature == "gene":
-                    if ";Name=" in annot and species_prefix in annot:
-                        if species_prefix == "BACUNI":
-                            id_pattern = r"ID=gene:(.*?);"
-                            name_pattern = r";Name=(.*?);"
-                        elif species_prefix == "BVU":
-                            if "old_locus_tag" in annot and "gene=" in annot:
-                                id_pattern = r"old_locus_tag=(.*?)$"
-                                name_pattern = r";gene=(.*?);"
-                            else:
-                                continue
-                        id = re.search(id_pattern, annot).group(1)
-                        gene_name = re.search(name_pattern, annot).group(1)
-                        alias_genename_dict[id] = gene_name
-    print(alias_genename_dict)
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                continue
+            _, _, feature, _, _, _, _, _, annot = line.strip().split("\t")
+            if (
+                feature != "gene"
+                or ";Name=" not in annot
+                or species_prefix not in annot
+            ):
+                continue
+            id_match = id_pattern.search(annot)
+            name_match = name_pattern.search(annot)
+            if id_match and name_match:
+                alias_genename_dict[id_match.group(1)] = name_match.group(1)
+    logging.debug(f"Reference gene names: {alias_genename_dict}")
     return alias_genename_dict
 
 
+def load_manifest(manifest):
+    """
+    Read the targets of a batch run from a TSV with the columns genome, species, reference and
+    target. A first line made of these column names is skipped. The genome name prefixes the
+    output files of the target, so it must be unique.
+
+    :return: list of BatchTarget, in the order of the manifest
+    """
+    targets = list()
+    genome_lines = dict()
+    with open(manifest) as file_in:
+        for line_number, line in enumerate(file_in, start=1):
+            cols = line.rstrip("\n").split("\t")
+            if cols == [""]:
+                continue
+            if line_number == 1 and tuple(cols) == MANIFEST_COLUMNS:
+                continue
+            if len(cols) != len(MANIFEST_COLUMNS):
+                sys.exit(
+                    f"Line {line_number} of {manifest} has {len(cols)} columns instead of "
+                    f"{len(MANIFEST_COLUMNS)}: {', '.join(MANIFEST_COLUMNS)}"
+                )
+            target = BatchTarget(*cols)
+            if target.genome in genome_lines:
+                sys.exit(
+                    f"Line {line_number} of {manifest} reuses the genome name {target.genome} "
+                    f"of line {genome_lines[target.genome]}"
+                )
+            genome_lines[target.genome] = line_number
+            targets.append(target)
+    return targets
+
+
+def reference_key(target):
+    return target.species.lower(), target.reference
+
+
+def load_references(targets, species_config, threads):
+    """
+    Read the reference gene names needed by the targets, once for each species and reference.
+
+    :return: dictionary where key = (lower case species, reference), value = reference gene
+        names; dictionary with the same keys and the error for the references that could not
+        be read, including those of unknown species
+    """
+    references = dict()
+    errors = dict()
+    futures = dict()
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        for target in targets:
+            key = reference_key(target)
+            if key in futures or key in errors:
+                continue
+            try:
+                config = get_species_config(target.species, species_config)
+            except ValueError:
+                errors[key] = f"unknown species {target.species}"
+                continue
+            futures[key] = executor.submit(load_ref_genenames, target.reference, config)
+        for key, future in futures.items():
+            try:
+                references[key] = future.result()
+            except Exception as e:
+                errors[key] = f"cannot read reference {key[1]}: {type(e).__name__}: {e}"
+    return references, errors
+
+
+# reference gene names shared with the batch worker processes, see run_batch
+_references = dict()
+
+
+def set_references(references):
+    _references.update(references)
+
+
+def resolve_target(target, outfile, report_prefix):
+    """
+    Resolve the duplicates of one target of a batch run. Errors are returned rather than
+    raised, so the other targets are still processed.
+
+    :return: stats dictionary, error message or None
+    """
+    try:
+        stats = resolve_duplicates(
+            _references[reference_key(target)], target.target, outfile, report_prefix
+        )
+    except SystemExit as e:
+        return dict(), str(e.code)
+    except Exception as e:
+        return dict(), f"{type(e).__name__}: {e}"
+    return stats, None
+
+
+def run_batch(manifest, outdir, report_file, threads, species_config=None):
+    """
+    Resolve the duplicates of every target in the manifest, using a pool of threads worker
+    processes. Each reference is read once and shared by all the targets of its species.
+    Outputs are saved to outdir/<genome>_deduplicated.gff, <genome>_stats.txt and
+    <genome>_replacements.txt. report_file gets one line per genome in the order of the
+    manifest, with the error of the genomes that failed.
+    """
+    targets = load_manifest(manifest)
+    os.makedirs(outdir, exist_ok=True)
+    references, reference_errors = load_references(targets, species_config, threads)
+    with ProcessPoolExecutor(
+        max_workers=threads, initializer=set_references, initargs=(references,)
+    ) as executor, open(report_file, "w") as report:
+        futures = dict()
+        for target in targets:
+            if reference_key(target) in reference_errors:
+                continue
+            futures[target.genome] = executor.submit(
+                resolve_target,
+                target,
+                os.path.join(outdir, f"{target.genome}_deduplicated.gff"),
+                os.path.join(outdir, target.genome),
+            )
+        report.write(
+            "\t".join(
+                ["genome", "species", "deduplicated_gff", *REPORT_COLUMNS, "status"]
+            )
+            + "\n"
+        )
+        for target in targets:
+            if target.genome in futures:
+                stats, error = futures[target.genome].result()
+            else:
+                stats, error = dict(), reference_errors[reference_key(target)]
+            report.write(
+                "\t".join(
+                    [
+                        target.genome,
+                        target.species,
+                        os.path.join(outdir, f"{target.genome}_deduplicated.gff"),
+                    ]
+                    + [str(stats.get(column, 0)) for column in REPORT_COLUMNS]
+                    + ["done" if error is None else f"failed: {error}"]
+                )
+                + "\n"
+            )
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         description=(
@@ -464,36 +718,76 @@ def parse_args():
     parser.add_argument(
         "-r",
         dest="reference",
-        required=True,
         help="The reference GFF file that has the 'correct' gene names.",
     )
     parser.add_argument(
         "-t",
         dest="target",
-        required=True,
         help="The GFF file generated by Prokka with aliases added from reference by liftoff.",
     )
     parser.add_argument(
         "-o",
         dest="outfile",
-        required=True,
         help="The name of the file the result will be saved to.",
     )
     parser.add_argument(
         "-s",
         dest="species",
-        required=True,
-        choices=["uniformis", "vulgatus"],
-        help="The name of the species - uniformis or vulgatus.",
+        help="The name of the species - uniformis, vulgatus or one from the species table.",
+    )
+    parser.add_argument(
+        "--species-config",
+        dest="species_config",
+        help="TSV with the columns species, prefix, id_pattern and name_pattern describing how to "
+        "read the reference of each species, in addition to the built-in uniformis and vulgatus.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--manifest",
+        dest="manifest",
+        help="Batch mode: TSV with the columns genome, species, reference and target, one target "
+        "per line. Replaces -r, -t, -o and -s.",
+    )
+    parser.add_argument(
+        "--outdir",
+        dest="outdir",
+        default=".",
+        help="Batch mode: folder for the deduplicated GFFs and the per-genome stats (default: "
+        "current folder).",
+    )
+    parser.add_argument(
+        "--report",
+        dest="report",
+        default="deduplication_report.tsv",
+        help="Batch mode: TSV with the number of resolved gene groups per genome (default: "
+        "deduplication_report.tsv).",
+    )
+    parser.add_argument(
+        "--threads",
+        dest="threads",
+        type=int,
+        default=1,
+        help="Batch mode: number of targets processed in parallel (default: 1).",
+    )
+    args = parser.parse_args()
+    if not args.manifest and not all(
+        [args.reference, args.target, args.outfile, args.species]
+    ):
+        parser.error("-r, -t, -o and -s are required without --manifest")
+    return args
 
 
 if __name__ == "__main__":
     args = parse_args()
-    main(
-        args.reference,
-        args.target,
-        args.outfile,
-        args.species,
-    )
+    species_config = None
+    if args.species_config:
+        species_config = load_species_config(args.species_config)
+    if args.manifest:
+        run_batch(args.manifest, args.outdir, args.report, args.threads, species_config)
+    else:
+        main(
+            args.reference,
+            args.target,
+            args.outfile,
+            args.species,
+            species_config,
+        )
@@ -17,7 +17,19 @@
 # ruff: noqa: F841, N806, N803
 
 import argparse
+import heapq
+import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+SUMMARY_COLUMNS = (
+    "promge_unique",
+    "MAP_unique",
+    "MAP_boundaries",
+    "complete_overlap",
+    "partial_overlap",
+)
 
 
 def gff_parser(current_line):
@@ -222,12 +234,19 @@ def promge_parser(promge, meta):
 
 
 def mapper(momofy_dict, promge_dict):
-    momo_unique = []
-    pro_unique = []
-    momo_used = []
-    pro_used = []
-    overlapped = []
+    """
+    Cluster the proMGE and MAP elements that overlap each other.
+
+    The elements of each contig are swept in order of start and every proMGE element that
+    overlaps a MAP element is joined with it in a union-find. Clusters of the same contig whose
+    spans overlap are then collapsed into one.
+
+    :return: ids of the MAP elements and of the proMGE elements that do not overlap an element of
+        the other tool, clusters of overlapping element ids, metadata of every element by id
+    """
     permge_metadata = {}
+    # per contig: (start, end, tool, element id)
+    contig_elements = {}
 
     pro_all = []
     for contig in promge_dict:
@@ -235,7 +254,9 @@ def mapper(momofy_dict, promge_dict):
             pro_seq_id = pro_element[4]
             pro_all.append(pro_seq_id)
             permge_metadata[pro_seq_id] = pro_element
-            # print('proMGE',pro_seq_id, pro_element)
+            contig_elements.setdefault(contig, []).append(
+                (int(pro_element[2]), int(pro_element[3]), "promge", pro_seq_id)
+            )
 
     momo_all = []
     for contig in momofy_dict:
@@ -244,139 +265,102 @@ def mapper(momofy_dict, promge_dict):
             momo_seq_id = contig + ":" + momo_coords
             momo_all.append(momo_seq_id)
             permge_metadata[momo_seq_id] = momo_element
-            # print('momo',momo_seq_id, momo_element)
-
-    contigs_list = list(set(list(momofy_dict.keys()) + list(promge_dict.keys())))
-    for contig in contigs_list:
-        if contig in promge_dict:
-            for pro_element in promge_dict[contig]:
-                pro_seq_type = pro_element[1]
-                pro_start = pro_element[2]
-                pro_end = pro_element[3]
-                pro_seq_id = pro_element[4]
-                pro_len = int(pro_end) - int(pro_start)
-                pro_range = range(int(pro_start), int(pro_end) + 1)
-                flag = 0
-
-                if pro_seq_id not in pro_used:
-                    if contig in momofy_dict:
-                        for momo_element in momofy_dict[contig]:
-                            momo_seq_type = momo_element[1]
-                            momo_start = momo_element[2]
-                            momo_end = momo_element[3]
-                            momo_seq_id = contig + ":" + momo_start + "-" + momo_end
-                            momo_len = int(momo_end) - int(momo_start)
-                            momo_range = range(int(momo_start), int(momo_end) + 1)
-                            intersection = len(list(set(pro_range) & set(momo_range)))
-                            if intersection > 0:
-                                flag = 1
-                                momo_used.append(momo_seq_id)
-                                pro_used.append(pro_seq_id)
-                                pair = [pro_seq_id, momo_seq_id]
-                                cluster_flag = 0
-                                index = -1
-                                for cluster in overlapped:
-                                    index += 1
-                                    if any(
-                                        [pro_seq_id in cluster, momo_seq_id in cluster]
-                                    ):
-                                        cluster_flag = 1
-                                        overlapped[index].append(pro_seq_id)
-                                        overlapped[index].append(momo_seq_id)
-
-                                if cluster_flag == 0:
-                                    overlapped.append(pair)
-
-                if flag == 0:
-                    pro_unique.append(pro_seq_id)
-
-        momo_unique = list(set(momo_all) - set(momo_used))
+            contig_elements.setdefault(contig, []).append(
+                (int(momo_element[2]), int(momo_element[3]), "MAP", momo_seq_id)
+            )
+
+    parents = {}
+    for elements in contig_elements.values():
+        for pro_seq_id, momo_seq_id in find_overlapping_pairs(elements):
+            union(parents, pro_seq_id, momo_seq_id)
 
     ## Collapsing overlapping clusters
-    # saving cluster elements coordinates
-    cluster_counter = 0
     final_overlapped = []
-    clusters_dict = {}
-    clusters_labels = {}
-    for cluster in overlapped:
-        cluster_counter += 1
-        cluster = list(set(cluster))
-        # print('clstr_'+str(cluster_counter)+' '+','.join(cluster)+'\n')
-        for element in cluster:
-            contig = element.split(":")[0]
-            start = int(element.split(":")[1].split("-")[0])
-            end = int(element.split(":")[1].split("-")[1])
-            composite_key = (contig, cluster_counter)
-            # print(contig+', clstr_'+str(cluster_counter)+', '+str(start)+', '+str(end))
-            if composite_key in clusters_dict:
-                clusters_dict[composite_key].append(start)
-                clusters_dict[composite_key].append(end)
+    for contig, elements in contig_elements.items():
+        clusters = {}
+        for start, end, _, seq_id in sorted(elements):
+            if seq_id in parents:
+                clusters.setdefault(find(parents, seq_id), []).append(
+                    (start, end, seq_id)
+                )
+        # clusters in order of their first element, which is their start
+        collapsed = []
+        collapsed_end = None
+        for cluster in clusters.values():
+            cluster_start = cluster[0][0]
+            cluster_end = max(end for _, end, _ in cluster)
+            if collapsed and cluster_start <= collapsed_end:
+                collapsed[-1].extend(cluster)
+                collapsed_end = max(collapsed_end, cluster_end)
             else:
-                clusters_dict[composite_key] = [start, end]
-        clusters_labels[composite_key] = cluster
-
-    # saving clusters boundaries
-    clust_bounderies = {}
-    for comp_key in clusters_dict:
-        min_coord = sorted(clusters_dict[comp_key])[0]
-        max_coord = sorted(clusters_dict[comp_key])[-1]
-        coords = (min_coord, max_coord)
-        clust_bounderies[comp_key] = coords
-        # print(comp_key,min_coord,max_coord)
-
-    # Finding overlapping clusters
-    clst_used = []
-    clst_2_add = {}
-    for comp_key_1 in clust_bounderies:
-        contig_1 = comp_key_1[0]
-        cluster_1 = comp_key_1[1]
-        clst_1_start = clust_bounderies[comp_key_1][0]
-        clst_1_end = clust_bounderies[comp_key_1][1]
-        clst_1_range = (int(clst_1_start), int(clst_1_end) + 1)
-        for comp_key_2 in clust_bounderies:
-            contig_2 = comp_key_2[0]
-            cluster_2 = comp_key_2[1]
-            if contig_1 == contig_2:
-                if comp_key_1 != comp_key_2:
-                    clst_2_start = clust_bounderies[comp_key_2][0]
-                    clst_2_end = clust_bounderies[comp_key_2][1]
-                    clst_2_range = (int(clst_2_start), int(clst_2_end) + 1)
-                    intersection = len(list(set(clst_1_range) & set(clst_2_range)))
-                    if intersection > 0:
-                        if all(
-                            [comp_key_1 not in clst_used, comp_key_2 not in clst_used]
-                        ):
-                            boundaries_list = [
-                                clst_1_start,
-                                clst_1_end,
-                                clst_2_start,
-                                clst_2_end,
-                            ]
-                            new_min = sorted(boundaries_list)[0]
-                            new_max = sorted(boundaries_list)[1]
-                            collapsed_cluster = list(
-                                set(
-                                    clusters_labels[comp_key_1]
-                                    + clusters_labels[comp_key_2]
-                                )
-                            )
-                            cluster_counter += 1
-                            collapsed_key = (contig_1, cluster_counter)
-                            clst_2_add[collapsed_key] = collapsed_cluster
-                            # print(comp_key_1, comp_key_2, new_min, new_max, collapsed_cluster)
-                            clst_used.append(comp_key_1)
-                            clst_used.append(comp_key_2)
+                collapsed.append(list(cluster))
+                collapsed_end = cluster_end
+        for cluster in collapsed:
+            final_overlapped.append(
+                list(dict.fromkeys(seq_id for _, _, seq_id in sorted(cluster)))
+            )
 
-    for comp_key in clst_used:
-        del clusters_labels[comp_key]
+    momo_unique = list(
+        dict.fromkeys(seq_id for seq_id in momo_all if seq_id not in parents)
+    )
+    pro_unique = [seq_id for seq_id in pro_all if seq_id not in parents]
 
-    for comp_key in clst_2_add:
-        clusters_labels[comp_key] = clst_2_add[comp_key]
+    return (momo_unique, pro_unique, final_overlapped, permge_metadata)
 
-    for cluster in clusters_labels:
-        final_overlapped.append(clusters_labels[cluster])
 
-    return (momo_unique, pro_unique, final_overlapped, permge_metadata)
+def find_overlapping_pairs(elements):
+    """
+    Find the proMGE and MAP elements of one contig that share at least one base.
+
+    :param elements: list of (start, end, tool, element id) where tool is "promge" or "MAP"
+    :return: list of (proMGE element id, MAP element id)
+    """
+    pairs = []
+    # elements that may still overlap the next ones, as heaps of (end, element id)
+    active = {"promge": [], "MAP": []}
+    for start, end, tool, seq_id in sorted(elements):
+        for tool_active in active.values():
+            while tool_active and tool_active[0][0] < start:
+                heapq.heappop(tool_active)
+        if tool == "promge":
+            pairs.extend((seq_id, momo_seq_id) for _, momo_seq_id in active["MAP"])
+        else:
+            pairs.extend((pro_seq_id, seq_id) for _, pro_seq_id in active["promge"])
+        heapq.heappush(active[tool], (end, seq_id))
+    return pairs
+
+
+def find(parents, element):
+    root = element
+    while parents[root] != root:
+        root = parents[root]
+    # point the whole path to the root so the next lookups are shorter
+    while parents[element] != root:
+        parents[element], element = root, parents[element]
+    return root
+
+
+def union(parents, element_1, element_2):
+    parents.setdefault(element_1, element_1)
+    parents.setdefault(element_2, element_2)
+    root_1 = find(parents, element_1)
+    root_2 = find(parents, element_2)
+    if root_1 != root_2:
+        parents[root_2] = root_1
+
+
+def covered_length(intervals):
+    """Return the number of positions covered by a list of (start, end) intervals."""
+    length = 0
+    covered_end = None
+    for start, end in sorted(intervals):
+        if covered_end is None or start > covered_end:
+            length += end - start + 1
+            covered_end = end
+        elif end > covered_end:
+            length += end - covered_end
+            covered_end = end
+    return length
 
 
 def to_print(metadata_tuple, genome, source, extra_attributes):
@@ -417,9 +401,21 @@ def merger(
     momo_subtypes,
     mgeR,
     genome_name,
+    outfile=None,
 ):
-    with open(genome_name + "_merged.gff", "w") as to_merged:
+    """
+    Write the merged MGEs of a genome to outfile, genome_name + "_merged.gff" by default.
+
+    :return: number of records written, by merged_label (boundaries are counted separately)
+    """
+    if outfile is None:
+        outfile = genome_name + "_merged.gff"
+    counts = dict.fromkeys(SUMMARY_COLUMNS, 0)
+    with open(outfile, "w") as to_merged:
         to_merged.write("##gff-version 3\n")
+        counts["promge_unique"] = len(pro_unique)
+        counts["MAP_unique"] = len(momo_unique)
+        counts["MAP_boundaries"] = len(irdr_dict)
         for mge in pro_unique:
             source = "promge"
             extra_attributes = [
@@ -480,7 +476,6 @@ def merger(
             to_merged.write(line)
 
         for cluster in final_overlapped:
-            cluster = list(set(cluster))
             starts = []
             ends = []
             coord_list = []
@@ -504,14 +499,13 @@ def merger(
                 mge_end = int(element.split(":")[1].split("-")[1])
                 ends.append(mge_end)
 
-                element_range = list(range(int(mge_start), int(mge_end) + 1))
                 if element in mgeR:
                     mgeR_list.append(mgeR[element])
-                    promge_positions = promge_positions + element_range
+                    promge_positions.append((mge_start, mge_end))
 
                 if element in momo_subtypes:
                     momosub_list.append(momo_subtypes[element])
-                    momofy_positions = momofy_positions + element_range
+                    momofy_positions.append((mge_start, mge_end))
 
                 mge_data = element_type + ":" + element.split(":")[1]
                 coord_list.append(mge_data)
@@ -521,8 +515,8 @@ def merger(
             end = sorted(ends)[-1]
 
             # Finding coverage per method
-            promge_positions = len(list(set(promge_positions)))
-            momofy_positions = len(list(set(momofy_positions)))
+            promge_positions = covered_length(promge_positions)
+            momofy_positions = covered_length(momofy_positions)
             merged_len = int(end) - int(start)
             promge_cov = float(promge_positions) / float(merged_len)
             momo_cov = float(momofy_positions) / float(merged_len)
@@ -531,13 +525,14 @@ def merger(
                 mge_type = "complete_overlap"
             else:
                 mge_type = "partial_overlap"
+            counts[mge_type] += 1
 
             global_id = (
                 "ID=" + genome_name + "|" + contig + ":" + str(start) + "-" + str(end)
             )
 
             merge_info = ",".join(coord_list)
-            nested_info = ",".join(list(set(nested_types)))
+            nested_info = ",".join(dict.fromkeys(nested_types))
             mgeR_info = ",".join(mgeR_list)
             momo_sub_info = ",".join(momosub_list)
 
@@ -569,6 +564,122 @@ def merger(
             )
 
             to_merged.write(line)
+    return counts
+
+
+def merge_genome(genome_name, mobannot, promge, meta, outfile=None):
+    """
+    Merge the MAP and proMGE predictions of one genome.
+
+    :return: genome name, path to the merged GFF, number of records by merged_label
+    """
+    (momofy_dict, irdr_dict, momo_subtypes) = momo_parser(mobannot)
+    (promge_dict, mgeR) = promge_parser(promge, meta)
+
+    (momo_unique, pro_unique, final_overlapped, permge_metadata) = mapper(
+        momofy_dict, promge_dict
+    )
+
+    if outfile is None:
+        outfile = genome_name + "_merged.gff"
+    counts = merger(
+        momo_unique,
+        pro_unique,
+        final_overlapped,
+        permge_metadata,
+        irdr_dict,
+        momo_subtypes,
+        mgeR,
+        genome_name,
+        outfile,
+    )
+    return genome_name, outfile, counts
+
+
+def load_manifest(manifest):
+    """
+    Read a batch manifest: a TSV with the columns genome, mobannot, proMGE and meta (the
+    arguments of a single genome run), with or without a header line. Genome names must be
+    unique.
+
+    :return: list of (genome, mobannot, proMGE, meta)
+    """
+    genomes = []
+    seen_genomes = set()
+    with open(manifest) as input_file:
+        for line in input_file:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            cols = line.split("\t")
+            if len(cols) != 4:
+                sys.exit(
+                    f"Manifest lines need 4 tab separated columns (genome, mobannot, proMGE, "
+                    f"meta), found {len(cols)}: {line}"
+                )
+            if cols[0] == "genome" and not genomes:
+                continue
+            if cols[0] in seen_genomes:
+                sys.exit(
+                    f"Genome {cols[0]} is listed twice in the manifest, genome names must "
+                    f"be unique as they name the output files"
+                )
+            seen_genomes.add(cols[0])
+            genomes.append(tuple(cols))
+    return genomes
+
+
+def merge_batch_genome(genome_name, mobannot, promge, meta, outfile):
+    """
+    Merge one genome of a batch. A genome that fails is reported in the summary instead of
+    stopping the batch.
+
+    :return: path to the merged GFF, dictionary of record counts, status
+    """
+    try:
+        _, outfile, counts = merge_genome(genome_name, mobannot, promge, meta, outfile)
+    except SystemExit as e:
+        return outfile, dict(), f"failed: {e.code}"
+    except Exception as e:
+        return outfile, dict(), f"failed: {e!r}"
+    return outfile, counts, "done"
+
+
+def run_batch(manifest, outdir, summary_file, threads):
+    """
+    Merge the predictions of every genome in the manifest, using a pool of threads worker
+    processes. Each genome is written to outdir/<genome>_merged.gff as soon as it is done, and
+    summary_file gets one line per genome in the order of the manifest, with its status.
+    """
+    genomes = load_manifest(manifest)
+    os.makedirs(outdir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=threads) as executor, open(
+        summary_file, "w"
+    ) as summary:
+        futures = [
+            executor.submit(
+                merge_batch_genome,
+                genome,
+                mobannot,
+                promge,
+                meta,
+                os.path.join(outdir, genome + "_merged.gff"),
+            )
+            for genome, mobannot, promge, meta in genomes
+        ]
+        summary.write(
+            "\t".join(["genome", "merged_gff", *SUMMARY_COLUMNS, "status"]) + "\n"
+        )
+        for (genome, _, _, _), future in zip(genomes, futures):
+            outfile, counts, status = future.result()
+            summary.write(
+                "\t".join(
+                    [genome, outfile]
+                    + [str(counts.get(label, 0)) for label in SUMMARY_COLUMNS]
+                    + [status]
+                )
+                + "\n"
+            )
 
 
 def main():
@@ -579,46 +690,56 @@ def main():
         "--mobannot",
         type=str,
         help="Mobilome Annotation Pipeline v2.0 predictions (no genes) (gff)",
-        required=True,
     )
     parser.add_argument(
         "--proMGE",
         type=str,
         help="ProMGE annotation file (gff)",
-        required=True,
     )
     parser.add_argument(
         "--meta",
         type=str,
         help="ProMGE metadata file (tsv)",
-        required=True,
     )
     parser.add_argument(
         "--genome_name",
         type=str,
         help="Genome name will be used to build the mge id and as prefix for the output file",
-        required=True,
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="Batch mode: TSV with the columns genome, mobannot, proMGE and meta, one genome per line. Replaces the single genome arguments",
+    )
+    parser.add_argument(
+        "--outdir",
+        type=str,
+        default=".",
+        help="Batch mode: folder for the merged GFFs (default: current folder)",
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default="merged_summary.tsv",
+        help="Batch mode: TSV with the number of merged records per genome (default: merged_summary.tsv)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Batch mode: number of genomes merged in parallel (default: 1)",
     )
     args = parser.parse_args()
 
     ### Calling functions
-    (momofy_dict, irdr_dict, momo_subtypes) = momo_parser(args.mobannot)
-    (promge_dict, mgeR) = promge_parser(args.proMGE, args.meta)
-
-    (momo_unique, pro_unique, final_overlapped, permge_metadata) = mapper(
-        momofy_dict, promge_dict
-    )
-
-    merger(
-        momo_unique,
-        pro_unique,
-        final_overlapped,
-        permge_metadata,
-        irdr_dict,
-        momo_subtypes,
-        mgeR,
-        args.genome_name,
-    )
+    if args.manifest:
+        run_batch(args.manifest, args.outdir, args.summary, args.threads)
+    elif all([args.mobannot, args.proMGE, args.meta, args.genome_name]):
+        merge_genome(args.genome_name, args.mobannot, args.proMGE, args.meta)
+    else:
+        parser.error(
+            "--mobannot, --proMGE, --meta and --genome_name are required without --manifest"
+        )
 
 
 if __name__ == "__main__":
@@ -17,11 +17,20 @@
 import argparse
 import re
 
+FEATURES = ("CDS", "exon", "mRNA", "gene")
 
-def main(infile, outfile, liftoff_file, field_from, field_to):
-    alias_dictionary = load_aliases(liftoff_file, field_from)
+# separators that are not escaped with a backslash
+ATTRIBUTE_SEPARATOR = re.compile(r"(?<!\\);")
+
+
+def main(infile, outfile, liftoff_files, field_from, field_to):
+    if isinstance(liftoff_files, str):
+        liftoff_files = [liftoff_files]
+    alias_dictionary = load_aliases(liftoff_files, field_from)
     fasta_flag = False
     fields_to_check = return_fields_to_print_to(field_to)
+    # aliases of the features seen so far, so children can take the alias of their parent
+    feature_aliases = dict()
     with open(infile) as file_in, open(outfile, "w") as file_out:
         for line in file_in:
             if line.startswith("#"):
@@ -32,52 +41,93 @@ def main(infile, outfile, liftoff_file, field_from, field_to):
                 file_out.write(line)
             else:
                 fields = line.strip().split("\t")
-                if fields[2] in fields_to_check:
-                    attributes_dict = dict(
-                        re.split(r"(?<!\\)=", item)
-                        for item in re.split(r"(?<!\\);", fields[8])
-                    )
-                    if fields[2] == "gene":
-                        id = attributes_dict["ID"]
-                    else:
-                        id = attributes_dict["ID"].split(":")[1]
-                    if id in alias_dictionary:
-                        line = line.strip() + f";{alias_dictionary[id]}" + "\n"
+                if fields[2] in FEATURES:
+                    attributes = get_attributes(fields[8], ("ID", "Parent"))
+                    feature_id = attributes.get("ID")
+                    alias = None
+                    if feature_id is not None:
+                        if fields[2] != "gene":
+                            # IDs of the children look like cds:<gene ID>
+                            feature_id = feature_id.split(":", 1)[-1]
+                        alias = alias_dictionary.get(feature_id)
+                    if alias is None and "Parent" in attributes:
+                        alias = next(
+                            (
+                                feature_aliases[parent]
+                                for parent in attributes["Parent"].split(",")
+                                if parent in feature_aliases
+                            ),
+                            None,
+                        )
+                    if alias is not None:
+                        if "ID" in attributes:
+                            feature_aliases[attributes["ID"]] = alias
+                        if fields[2] in fields_to_check:
+                            line = line.strip() + f";{alias}" + "\n"
                 file_out.write(line)
 
 
 def return_fields_to_print_to(field_to):
     if field_to == "all":
-        return ["CDS", "exon", "mRNA", "gene"]
+        return list(FEATURES)
     else:
         return [field_to]
 
 
-def load_aliases(liftoff_file, field_from):
+def get_attributes(col9, keys):
+    """
+    Read some attributes from column 9 without splitting the others.
+
+    :param col9: column 9 of a GFF line
+    :param keys: names of the attributes to read
+    :return: dictionary where key = attribute name, value = attribute value, for the attributes
+        in keys that are present
+    """
+    attributes = dict()
+    items = ATTRIBUTE_SEPARATOR.split(col9) if "\\" in col9 else col9.split(";")
+    for item in items:
+        key, _, value = item.partition("=")
+        if key in keys:
+            attributes[key] = value
+    return attributes
+
+
+def load_aliases(liftoff_files, field_from):
+    """
+    Collect the aliases that LiftOff transferred to the features of the genome.
+
+    :param liftoff_files: GFF files produced by LiftOff; if they give different aliases for the
+        same feature, the first file wins
+    :param field_from: feature type to take the aliases from
+    :return: dictionary where key = feature ID, value = Alias attribute, followed by the
+        extra_copy_number attribute if there is one
+    """
     alias_dictionary = dict()
-    with open(liftoff_file) as file_in:
-        for line in file_in:
-            if line.startswith("#"):
-                continue
-            fields = line.strip().split("\t")
-            if fields[1].lower() == "liftoff":
-                # Don't use lines that LiftOff added in from the reference
-                continue
-            if not fields[2] == field_from:
-                continue
-            attributes_dict = dict(
-                re.split(r"(?<!\\)=", item) for item in re.split(r"(?<!\\);", fields[8])
-            )
-            if "Alias" in attributes_dict:
-                alias_dictionary[attributes_dict["ID"]] = "Alias={}".format(
-                    attributes_dict["Alias"]
-                )
-            if "extra_copy_number" in attributes_dict:
-                alias_dictionary[
-                    attributes_dict["ID"]
-                ] += ";extra_copy_number={}".format(
-                    attributes_dict["extra_copy_number"]
+    for liftoff_file in liftoff_files:
+        file_aliases = dict()
+        with open(liftoff_file) as file_in:
+            for line in file_in:
+                if line.startswith("#"):
+                    continue
+                fields = line.strip().split("\t")
+                if fields[1].lower() == "liftoff":
+                    # Don't use lines that LiftOff added in from the reference
+                    continue
+                if not fields[2] == field_from or "Alias=" not in fields[8]:
+                    continue
+                attributes = get_attributes(
+                    fields[8], ("ID", "Alias", "extra_copy_number")
                 )
+                if "Alias" not in attributes:
+                    continue
+                alias = "Alias={}".format(attributes["Alias"])
+                if "extra_copy_number" in attributes:
+                    alias += ";extra_copy_number={}".format(
+                        attributes["extra_copy_number"]
+                    )
+                file_aliases[attributes["ID"]] = alias
+        for feature_id, alias in file_aliases.items():
+            alias_dictionary.setdefault(feature_id, alias)
     return alias_dictionary
 
 
@@ -103,7 +153,9 @@ def parse_args():
     parser.add_argument(
         "--liftoff",
         required=True,
-        help="The path to the GFF file produced by LiftOff.",
+        nargs="+",
+        help="The path to the GFF file produced by LiftOff. Several files can be given, for "
+        "lifts from different references; the first one that has an alias for a feature is used.",
     )
     parser.add_argument(
         "--field-from",
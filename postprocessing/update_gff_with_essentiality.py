@@ -14,7 +14,15 @@
 # limitations under the License.
 #
 
-import sys
+import argparse
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+MATCH_MODES = ("exact", "tolerance", "overlap")
+
+# essentiality calls sorted by start, with the (start, end) key each came from in the
+# coordinates file and the length of the longest call
+CoordinatesIndex = namedtuple("CoordinatesIndex", "starts ends keys longest")
 
 
 def read_coordinates_file(coord_file):
@@ -26,30 +34,100 @@ def read_coordinates_file(coord_file):
     return coordinates_dict
 
 
-def update_gff_with_status(gff_file, coordinates_dict):
-    updated_lines = []
+def index_coordinates(coordinates_dict):
+    """
+    Sort the essentiality calls by start so the calls matching a CDS can be found with a binary
+    search. The coordinates file has no contig column, so every call can match a CDS on any
+    contig. Calls without an essentiality or whose coordinates are not integers, such as a
+    header row, are left out, so they end up in the unmatched file.
+
+    :param coordinates_dict: essentiality calls loaded by read_coordinates_file
+    :return: CoordinatesIndex
+    """
+    calls = list()
+    for (start, end), essentiality in coordinates_dict.items():
+        if not essentiality:
+            continue
+        try:
+            calls.append((int(start), int(end), (start, end)))
+        except ValueError:
+            continue
+    calls.sort()
+    return CoordinatesIndex(
+        starts=[start for start, _, _ in calls],
+        ends=[end for _, end, _ in calls],
+        keys=[key for _, _, key in calls],
+        longest=max((end - start + 1 for start, end, _ in calls), default=0),
+    )
+
+
+def find_match(coordinates_index, start, end, mode, tolerance, min_overlap):
+    """
+    Find the essentiality call that best matches a CDS.
+
+    :param mode: "exact" to only match calls with the same coordinates; "tolerance" to match
+        calls whose start and end are each at most tolerance bases away from the CDS ones,
+        preferring the closest; "overlap" to match calls that overlap the CDS by at least
+        min_overlap of the length of both, preferring the largest overlap
+    :return: the (start, end) key of the matched call in the coordinates file, or None
+    """
+    starts, ends, keys, longest = coordinates_index
+    if mode == "overlap":
+        first = bisect_left(starts, start - longest + 1)
+        last = bisect_right(starts, end)
+    else:
+        window = tolerance if mode == "tolerance" else 0
+        first = bisect_left(starts, start - window)
+        last = bisect_right(starts, start + window)
+    best_key = None
+    best_score = None
+    for index in range(first, last):
+        call_start, call_end = starts[index], ends[index]
+        if mode == "overlap":
+            overlap = min(end, call_end) - max(start, call_start) + 1
+            score = -min(
+                overlap / (end - start + 1), overlap / (call_end - call_start + 1)
+            )
+            if -score < min_overlap:
+                continue
+        else:
+            if abs(call_end - end) > window:
+                continue
+            score = abs(call_start - start) + abs(call_end - end)
+        if best_score is None or score < best_score:
+            best_key, best_score = keys[index], score
+    return best_key
+
+
+def update_gff_with_status(
+    gff_file,
+    output_file,
+    coordinates_dict,
+    mode="exact",
+    tolerance=0,
+    min_overlap=1.0,
+):
+    coordinates_index = index_coordinates(coordinates_dict)
     matched_coordinates = set()
-    with open(gff_file) as file:
-        for line in file:
+    with open(gff_file) as file_in, open(output_file, "w") as file_out:
+        for line in file_in:
             columns = line.strip().split("\t")
             if len(columns) >= 9 and columns[2] == "CDS":
-                start, end = columns[3], columns[4]
-                essentiality = coordinates_dict.get((start, end))
-                if essentiality:
+                key = find_match(
+                    coordinates_index,
+                    int(columns[3]),
+                    int(columns[4]),
+                    mode,
+                    tolerance,
+                    min_overlap,
+                )
+                if key:
                     columns[
                         8
-                    ] += f";transit_combined_hmm_gumbel_essentiality={essentiality}"
-                    matched_coordinates.add((start, end))
-            updated_lines.append("\t".join(columns) + "\n")
-        else:
-            updated_lines.append(line)
-    return updated_lines, matched_coordinates
-
-
-def write_updated_gff(output_file, updated_lines):
-    with open(output_file, "w") as file:
-        for line in updated_lines:
-            file.write(line)
+                    ] += f";transit_combined_hmm_gumbel_essentiality={coordinates_dict[key]}"
+                    matched_coordinates.add(key)
+            file_out.write("\t".join(columns) + "\n")
+    return matched_coordinates
 
 
 def write_not_matched_file(not_matched_file, coordinates_dict, matched_coordinates):
@@ -62,27 +140,58 @@ def write_not_matched_file(not_matched_file, coordinates_dict, matched_coordinat
         file.writelines(not_matched_lines)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 5:
-        print(
-            """
-                Usage: python script.py <gff_file> <essentiality_file> <output_gff_file> <not_matched_file>
-
-                Match coordinates from essentiality file, produce modified GFF with new key-value pair and a file containing unmatched essentiality lines.
-                The key inserted into the 9th column of CDS lines only is transit_combined_hmm_gumbel_essentiality (all lower case to fit with GFF specs)
-                Note that the input is a summary of essentiality data (i.e. medium ignored for now)
-        """
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Match coordinates from essentiality file, produce modified GFF with new key-value pair and a file "
+            "containing unmatched essentiality lines. The key inserted into the 9th column of CDS lines only is "
+            "transit_combined_hmm_gumbel_essentiality (all lower case to fit with GFF specs). Note that the input "
+            "is a summary of essentiality data (i.e. medium ignored for now)."
         )
-        sys.exit(1)
+    )
+    parser.add_argument("gff_file", help="GFF file to add the essentiality calls to.")
+    parser.add_argument(
+        "essentiality_file",
+        help="Essentiality calls: gene name, start, end, essentiality and one more column.",
+    )
+    parser.add_argument("output_gff_file", help="Path to the output GFF.")
+    parser.add_argument(
+        "not_matched_file",
+        help="Path to the file listing the essentiality calls that matched no CDS.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=MATCH_MODES,
+        default="exact",
+        help="How calls are matched to CDS: exact coordinates, start and end within "
+        "--tolerance bases, or a reciprocal overlap of at least --min-overlap. Default: exact",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=3,
+        help="Maximum distance in bases between the call and CDS start and end in the "
+        "tolerance mode. Default: 3",
+    )
+    parser.add_argument(
+        "--min-overlap",
+        type=float,
+        default=0.9,
+        help="Minimum fraction of both the call and the CDS covered by their overlap in the "
+        "overlap mode. Default: 0.9",
+    )
+    return parser.parse_args()
 
-    gff_file = sys.argv[1]
-    coordinates_file = sys.argv[2]
-    output_file = sys.argv[3]
-    not_matched_file = sys.argv[4]
 
-    coordinates_dict = read_coordinates_file(coordinates_file)
-    updated_lines, matched_coordinates = update_gff_with_status(
-        gff_file, coordinates_dict
+if __name__ == "__main__":
+    args = parse_args()
+    coordinates_dict = read_coordinates_file(args.essentiality_file)
+    matched_coordinates = update_gff_with_status(
+        args.gff_file,
+        args.output_gff_file,
+        coordinates_dict,
+        args.mode,
+        args.tolerance,
+        args.min_overlap,
     )
-    write_updated_gff(output_file, updated_lines)
-    write_not_matched_file(not_matched_file, coordinates_dict, matched_coordinates)
+    write_not_matched_file(args.not_matched_file, coordinates_dict, matched_coordinates)
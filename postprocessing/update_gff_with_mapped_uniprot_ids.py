@@ -15,10 +15,17 @@
 #
 
 import argparse
+import hashlib
+import logging
 import os
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
 
 
 def load_uniprot_descriptions(uniprot_tsv):
@@ -56,28 +63,155 @@ def escape_reserved_characters(string):
     return string
 
 
-def run_blast(pipeline_fasta, uniprot_fasta, blast_output):
-    # Create blast database
+def run_blast(
+    pipeline_fasta, uniprot_fasta, blast_output, threads=1, shards=None, db_cache="."
+):
+    """
+    Search the UniProt proteins against the pipeline proteins. The UniProt FASTA is split into
+    shards that are searched at the same time, and their results are appended to the output in
+    shard order, so the output is the same as a single blastp run over the whole file.
+
+    :param pipeline_fasta: protein FASTA generated by the pipeline, used as the BLAST database
+    :param uniprot_fasta: UniProt protein FASTA, used as the query
+    :param blast_output: path to the tabular blastp output
+    :param threads: number of blastp processes run at the same time
+    :param shards: number of query shards, default: one per thread
+    :param db_cache: folder where BLAST databases are kept between runs
+    """
+    blast_db = make_blast_db(pipeline_fasta, db_cache)
+    threads = max(1, threads)
+    with tempfile.TemporaryDirectory(
+        dir=os.path.dirname(os.path.abspath(blast_output))
+    ) as tmpdir:
+        query_shards = split_fasta(uniprot_fasta, shards or threads, tmpdir)
+        partial_output = os.path.join(tmpdir, "blastp.out")
+        with ThreadPoolExecutor(max_workers=threads) as executor, open(
+            partial_output, "wb"
+        ) as file_out:
+            futures = [
+                executor.submit(run_blastp, blast_db, query_shard, f"{query_shard}.out")
+                for query_shard in query_shards
+            ]
+            for future in futures:
+                shard_output = future.result()
+                with open(shard_output, "rb") as file_in:
+                    shutil.copyfileobj(file_in, file_out)
+                os.remove(shard_output)
+        # the output only appears once every shard has finished, so an interrupted run is not
+        # mistaken for a complete one
+        os.replace(partial_output, blast_output)
+
+
+def make_blast_db(pipeline_fasta, db_cache):
+    """
+    Build the BLAST database of the pipeline proteins, or reuse the one built by an earlier run
+    from a FASTA with the same content.
+
+    :param pipeline_fasta: protein FASTA generated by the pipeline
+    :param db_cache: folder where BLAST databases are kept between runs
+    :return: name of the database to give to blastp
+    """
+    os.makedirs(db_cache, exist_ok=True)
+    name = os.path.splitext(os.path.basename(pipeline_fasta))[0]
+    blast_db = os.path.join(db_cache, f"{name}.{fasta_checksum(pipeline_fasta)}")
+    # makeblastdb writes several files; the marker is only written once they are all complete
+    marker = f"{blast_db}.done"
+    if os.path.exists(marker):
+        logging.info(f"Using the cached BLAST database {blast_db}")
+        return blast_db
     subprocess.run(
-        ["makeblastdb", "-in", pipeline_fasta, "-parse_seqids", "-dbtype", "prot"]
+        [
+            "makeblastdb",
+            "-in",
+            pipeline_fasta,
+            "-out",
+            blast_db,
+            "-parse_seqids",
+            "-dbtype",
+            "prot",
+        ],
+        check=True,
     )
+    open(marker, "w").close()
+    return blast_db
+
+
+def fasta_checksum(fasta, block_size=1 << 20):
+    checksum = hashlib.sha256()
+    with open(fasta, "rb") as file_in:
+        for block in iter(lambda: file_in.read(block_size), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def split_fasta(fasta, shards, outdir):
+    """
+    Split a FASTA file into consecutive shards with about the same number of residues.
+
+    :param fasta: path to the FASTA file
+    :param shards: number of shards to make; fewer are made if there are not enough sequences
+    :param outdir: folder where the shards are written
+    :return: list of paths to the shards, in file order
+    """
+    residues = list()
+    with open(fasta) as file_in:
+        for line in file_in:
+            if line.startswith(">"):
+                residues.append(0)
+            elif residues:
+                residues[-1] += len(line.strip())
+    shards = max(1, min(shards, len(residues)))
+    shard_size = sum(residues) / shards
+    shard_paths = [
+        os.path.join(outdir, f"query_{index}.fasta") for index in range(1, shards + 1)
+    ]
+    with open(fasta) as file_in:
+        shard_index = 0
+        cumulative_size = 0
+        sequence_index = -1
+        file_out = open(shard_paths[0], "w")
+        for line in file_in:
+            if line.startswith(">"):
+                sequence_index += 1
+                remaining_sequences = len(residues) - sequence_index
+                remaining_shards = shards - shard_index - 1
+                # move to the next shard once this one has its share of the residues, leaving
+                # at least one sequence for each of the remaining shards
+                if (
+                    sequence_index
+                    and remaining_shards
+                    and (
+                        cumulative_size >= shard_size * (shard_index + 1)
+                        or remaining_sequences == remaining_shards
+                    )
+                ):
+                    file_out.close()
+                    shard_index += 1
+                    file_out = open(shard_paths[shard_index], "w")
+                cumulative_size += residues[sequence_index]
+            file_out.write(line)
+        file_out.close()
+    return shard_paths
 
-    # Run blastp
+
+def run_blastp(blast_db, query, output):
     subprocess.run(
         [
             "blastp",
             "-db",
-            pipeline_fasta,
+            blast_db,
             "-query",
-            uniprot_fasta,
+            query,
             "-out",
-            blast_output,
+            output,
             "-outfmt",
             "6",
             "-evalue",
             "1e-10",
-        ]
+        ],
+        check=True,
     )
+    return output
 
 
 def extract_best_hits(blast_output):
@@ -200,6 +334,26 @@ if __name__ == "__main__":
         help="Provide a path to UniProt TSV if using the --description flag.",
         required=False,
     )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of blastp processes run at the same time. Default: 1",
+        required=False,
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Number of parts the UniProt FASTA is split into. Default: one per thread",
+        required=False,
+    )
+    parser.add_argument(
+        "--db-cache",
+        default="blast_db_cache",
+        help="Folder where BLAST databases are kept and reused if the pipeline FASTA has not changed. "
+        "Default: blast_db_cache",
+        required=False,
+    )
 
     args = parser.parse_args()
 
@@ -223,7 +377,14 @@ if __name__ == "__main__":
 
     # Run blast if blast results do not already exist
     if not os.path.exists(blast_output):
-        run_blast(pipeline_fasta, uniprot_fasta, blast_output)
+        run_blast(
+            pipeline_fasta,
+            uniprot_fasta,
+            blast_output,
+            args.threads,
+            args.shards,
+            args.db_cache,
+        )
 
     # Extract best hits
     best_hits = extract_best_hits(blast_output)
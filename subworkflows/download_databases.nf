@@ -10,6 +10,7 @@ include { DEFENSE_FINDER_GETDB     } from '../modules/local/defense_finder_getdb
 include { EGGNOG_MAPPER_GETDB      } from '../modules/local/eggnog_getdb'
 include { INTEPROSCAN_GETDB        } from '../modules/local/interproscan_getdb'
 include { INTEPRO_ENTRY_LIST_GETDB } from '../modules/local/interpro_list_getdb'
+include { INTERPRO_ENTRY_LIST_SNAPSHOT } from '../modules/local/interpro_list_snapshot'
 include { RFAM_GETMODELS           } from '../modules/local/rfam_getmodels'
 include { BAKTA_GETDB              } from '../modules/local/bakta_getdb'
 include { PSEUDOFINDER_GETDB       } from '../modules/local/pseudofinder_getdb'
@@ -104,7 +105,9 @@ workflow DOWNLOAD_DATABASES {
             )
         } else {
             INTEPRO_ENTRY_LIST_GETDB()
-            interpro_entry_list = INTEPRO_ENTRY_LIST_GETDB.out.interpro_entry_list.first()
+            // the text files are parsed once into a snapshot that ANNOTATE_GFF loads instead
+            INTERPRO_ENTRY_LIST_SNAPSHOT(INTEPRO_ENTRY_LIST_GETDB.out.interpro_entry_list)
+            interpro_entry_list = INTERPRO_ENTRY_LIST_SNAPSHOT.out.interpro_entry_list.first()
         }
 
         if (eggnog_data_dir.exists()) {
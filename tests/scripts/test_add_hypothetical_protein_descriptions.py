@@ -26,6 +26,7 @@ from bin.add_hypothetical_protein_descriptions import (
     insert_product_source,
     keep_or_move_to_note,
     move_function_to_note,
+    select_best_hit,
 )
 
 
@@ -267,3 +268,16 @@ def test_move_function_to_note_with_no_note():
     }
     result = move_function_to_note("some function", col9_dict)
     assert result == expected_result
+
+
+def test_select_best_hit():
+    def hit(match, level):
+        return {"match": match, "ipr_desc": "-", "sig_desc": "desc", "level": level}
+
+    hits = [hit(0.9, 0), hit(0.3, 1), hit(0.5, 1), hit(0.5, 1)]
+    # a more specific term wins over a better match, the first of equal hits is kept
+    assert select_best_hit(hits, "Family") is hits[2]
+    # superfamily hits are only compared at the depth of the first hit
+    assert select_best_hit(hits, "Homologous_superfamily") is hits[0]
+    member_db_hits = [hit(0.9, None), hit(0.2, None)]
+    assert select_best_hit(member_db_hits, "no_type") is member_db_hits[1]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from postprocessing.add_mobilome_to_gff import (
+    check_overlap,
+    index_mobilome,
+    load_mobilome,
+    main,
+)
+
+MOBILOME = (
+    "##gff-version 3\n"
+    "contig_1\tmobileOG\tprophage\t100\t5000\t.\t+\t.\t"
+    "ID=phage_1;merged_types=NA;mge_recombinase=NA\n"
+    "contig_1\tISEScan\tinsertion_sequence\t150\t1000\t.\t+\t.\tID=is_1\n"
+    "contig_1\tISEScan\tinsertion_sequence\t8000\t9000\t.\t+\t.\tID=is_2\n"
+    "contig_2\tISEScan\tinsertion_sequence\t10\t500\t.\t+\t.\tID=is_3\n"
+)
+
+ANNOTATIONS = (
+    "##gff-version 3\n"
+    "contig_1\tProkka\tCDS\t200\t900\t.\t+\t0\tID=cds_1\n"
+    "contig_1\tProkka\tCDS\t4800\t5600\t.\t+\t0\tID=cds_2\n"
+    "contig_1\tProkka\tCDS\t9500\t9900\t.\t+\t0\tID=cds_3\n"
+    "contig_2\tProkka\tCDS\t1000\t1900\t.\t+\t0\tID=cds_4\n"
+    "##FASTA\n"
+    ">contig_1\n"
+    "ACGT\n"
+)
+
+
+def test_check_overlap(tmp_path):
+    mobilome_file = tmp_path / "mobilome.gff"
+    mobilome_file.write_text(MOBILOME)
+    mobilome_index = index_mobilome(load_mobilome(mobilome_file))
+    overlap, lines = check_overlap(mobilome_index, "contig_1", 200, 900)
+    assert overlap
+    assert [line.strip().split("\t")[8].split(";")[0] for line in lines] == [
+        "ID=phage_1",
+        "ID=is_1",
+    ]
+    # less than 75% of the CDS is inside the prophage
+    assert check_overlap(mobilome_index, "contig_1", 4800, 5600) == (False, "")
+    assert check_overlap(mobilome_index, "contig_3", 1, 100) == (False, "")
+
+
+def test_main(tmp_path):
+    mobilome_file = tmp_path / "mobilome.gff"
+    mobilome_file.write_text(MOBILOME)
+    annotations_file = tmp_path / "annotations.gff"
+    annotations_file.write_text(ANNOTATIONS)
+    outfile = tmp_path / "annotations_with_mobilome.gff"
+    main(mobilome_file, annotations_file, outfile)
+    ids = [
+        line.strip().split("\t")[8].split(";")[0]
+        for line in outfile.read_text().splitlines()
+        if line.startswith("contig")
+    ]
+    assert ids == [
+        "ID=phage_1",
+        "ID=is_1",
+        "ID=cds_1",
+        "ID=cds_2",
+        "ID=is_2",
+        "ID=cds_3",
+        "ID=is_3",
+        "ID=cds_4",
+    ]
+    assert (
+        "ID=cds_1;mge_id=phage_1,is_1;mge_types=prophage,insertion_sequence"
+        in outfile.read_text()
+    )
+    assert outfile.read_text().endswith("##FASTA\n>contig_1\nACGT\n")
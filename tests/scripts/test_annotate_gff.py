@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bin.annotate_gff import (
+    add_annotations_to_line,
+    build_annotation_table,
+    build_interval_index,
+    find_enclosing_clusters,
+    get_bgcs,
+    get_ncrnas,
+    load_annotations,
+    load_crispr,
+    write_results_to_file,
+)
+
+
+def test_find_enclosing_clusters_nested():
+    index = build_interval_index(
+        [
+            (100, 5000, 0, "gecco", {}),
+            (1000, 2000, 1, "gecco", {}),
+            (1500, 1600, 2, "gecco", {}),
+            (6000, 7000, 3, "gecco", {}),
+        ]
+    )
+    result = find_enclosing_clusters(index, 1200, 1900)
+    assert sorted(cluster[2] for cluster in result) == [0, 1]
+
+
+def test_find_enclosing_clusters_partial_overlap():
+    index = build_interval_index([(100, 500, 0, "gecco", {})])
+    assert find_enclosing_clusters(index, 50, 300) == []
+    assert find_enclosing_clusters(index, 300, 600) == []
+    assert find_enclosing_clusters(index, 100, 500) == [(100, 500, 0, "gecco", {})]
+
+
+def test_get_bgcs(tmp_path):
+    gff = tmp_path / "genome.gff"
+    gff.write_text(
+        "##gff-version 3\n"
+        "contig_1\tProdigal\tCDS\t150\t400\t.\t+\t0\tID=cds_1;locus_tag=cds_1\n"
+        "contig_1\tProdigal\tCDS\t450\t900\t.\t+\t0\tID=cds_2;locus_tag=cds_2\n"
+        "contig_2\tProdigal\tCDS\t150\t400\t.\t+\t0\tID=cds_3;locus_tag=cds_3\n"
+        "##FASTA\n"
+        ">contig_1\n"
+        "ACGT\n"
+    )
+    gecco = tmp_path / "gecco.gff"
+    gecco.write_text(
+        "contig_1\tGECCO\tBGC\t100\t1000\t.\t.\t.\tID=bgc_1;Type=NRP\n"
+        "contig_1\tGECCO\tBGC\t120\t500\t.\t.\t.\tID=bgc_2;Type=Polyketide\n"
+    )
+    sanntis = tmp_path / "sanntis.gff"
+    sanntis.write_text(
+        "contig_1\tSanntiS\tCDS\t100\t450\t.\t.\t.\t"
+        "ID=bgc_3;nearest_MiBIG=BGC0000001;nearest_MiBIG_class=Polyketide\n"
+    )
+    result = get_bgcs({"sanntis": sanntis, "gecco": gecco, "antismash": None}, gff)
+    assert result == {
+        "cds_1": {
+            "nearest_MiBIG": "BGC0000001",
+            "nearest_MiBIG_class": "Polyketide",
+            "gecco_bgc_type": "NRP",
+        },
+        "cds_2": {"gecco_bgc_type": "NRP"},
+    }
+
+
+def test_load_crispr_keeps_records_on_their_contig(tmp_path):
+    crispr = tmp_path / "crispr.gff"
+    crispr.write_text(
+        "##gff-version 3\n"
+        "contig_1\tCRISPRCasFinder\tCRISPR\t100\t200\t.\t+\t.\tID=a;Name=b\n"
+        "contig_1\tCRISPRCasFinder\tCRISPRdr\t201\t230\t.\t+\t.\tParent=b\n"
+        "contig_2\tCRISPRCasFinder\tCRISPR\t50\t150\t.\t+\t.\tID=c;Name=d\n"
+    )
+    result = load_crispr(crispr)
+    assert list(result.keys()) == ["contig_1", "contig_2"]
+    assert [start for start, _ in result["contig_1"]] == [100]
+    assert len(result["contig_1"][0][1]) == 2
+    assert [start for start, _ in result["contig_2"]] == [50]
+
+
+def test_write_results_to_file_merges_by_position(tmp_path):
+    gff = tmp_path / "genome.gff"
+    gff.write_text(
+        "##gff-version 3\n"
+        "contig_1\tProdigal\tCDS\t500\t900\t.\t+\t0\tID=cds_2;locus_tag=cds_2\n"
+        "contig_1\tProdigal\tCDS\t100\t400\t.\t+\t0\tID=cds_1;locus_tag=cds_1\n"
+        "##FASTA\n"
+        ">contig_1\n"
+        "ACGT\n"
+    )
+    eggnog = tmp_path / "eggnog.tsv"
+    eggnog.write_text("")
+    annotations = load_annotations(
+        gff, eggnog, None, None, None, None, None, None, None, None
+    )
+    trnas = {"contig_1": [(450, "contig_1\ttRNAscan-SE\ttRNA\t450\t480")]}
+    ncrnas = {"contig_2": [(10, "contig_2\tINFERNAL\tncRNA\t10\t80")]}
+    outfile = tmp_path / "out.gff"
+    write_results_to_file(gff, outfile, annotations, ncrnas, trnas, {})
+    lines = outfile.read_text().splitlines()
+    assert [line.split("\t")[3] for line in lines[1:5]] == ["100", "450", "500", "10"]
+    assert lines[5:] == ["##FASTA", ">contig_1", "ACGT"]
+
+
+def test_add_annotations_to_line():
+    annotation_table = build_annotation_table(
+        eggnogs={"cds_1": [["411479.X"], ["G"], ["-"], ["GO:0000001", "GO:0000002"]]},
+        iprs={"cds_1": [{"PF00002", "PF00001"}, set()]},
+        antifams=["cds_3"],
+        bgcs={"cds_1": {"gecco_bgc_type": "NRP"}},
+        amr_annotations={},
+        dbcan_annotations={"cds_1": "dbcan_prot_type=CAZyme"},
+        defense_finder_annotations={},
+        pseudogenes={"cds_1": "frameshift"},
+    )
+    report = dict()
+    line = (
+        "contig_1\tProdigal\tCDS\t1\t90\t.\t+\t0\tID=cds_1;locus_tag=cds_1;product=x\n"
+    )
+    _, _, result = add_annotations_to_line(line, annotation_table, report)
+    assert result.split("\t")[8] == ";".join(
+        [
+            "ID=cds_1",
+            "locus_tag=cds_1",
+            "Note=frameshift",
+            "product=x",
+            "pseudo=true",
+            "eggNOG=411479.X",
+            "cog=G",
+            "Ontology_term=GO:0000001,GO:0000002",
+            "pfam=PF00001,PF00002",
+            "gecco_bgc_type=NRP",
+            "dbcan_prot_type=CAZyme",
+        ]
+    )
+    assert report == {"cds_1": {"gene_caller": False, "pseudofinder": True}}
+    antifam_line = line.replace("cds_1", "cds_3")
+    assert add_annotations_to_line(antifam_line, annotation_table, report) is None
+
+
+def tblout_row(index, name, accession, contig, description):
+    return (
+        f"{index} {name} {accession} {contig} - cm 1 100 x 101 200 + no 1 0.5 0.0 50.0 "
+        f"1e-10 ! - - - - - - - - - {description}\n"
+    )
+
+
+def test_get_ncrnas_uses_rfam_classes(tmp_path):
+    tblout = tmp_path / "rfam.tblout"
+    tblout.write_text(
+        "#idx target name\n"
+        + tblout_row(0, "5S_rRNA", "RF00001", "contig_1", "5S ribosomal RNA")
+        + tblout_row(1, "RNaseP_bact_a", "RF00010", "contig_1", "Bacterial RNase P")
+        + tblout_row(2, "mir-1", "RF00103", "contig_1", "mir-1 microRNA")
+        + tblout_row(3, "FMN", "RF00050", "contig_1", "FMN riboswitch")
+    )
+    features = [
+        (
+            line.split("\t")[2],
+            line.split("ncRNA_class=")[-1] if "ncRNA_class" in line else "",
+        )
+        for _, line in get_ncrnas(tblout)["contig_1"]
+    ]
+    assert features == [
+        ("rRNA", ""),
+        ("ncRNA", "RNase_P_RNA"),
+        ("ncRNA", "pre_miRNA"),
+        ("ncRNA", "other"),
+    ]
+
+    # a new Rfam release only needs a new table
+    rfam_classes = tmp_path / "rfam_ncrna_classes.tsv"
+    rfam_classes.write_text(
+        "rfam_accession\tfeature\tncrna_class\nRF00050\tncRNA\triboswitch\n"
+    )
+    lines = [line for _, line in get_ncrnas(tblout, rfam_classes)["contig_1"]]
+    assert lines[0].split("\t")[2] == "ncRNA"
+    assert lines[3].endswith("ncRNA_class=riboswitch")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from bin import (
+    add_hypothetical_protein_descriptions,
+    add_interpro_descriptions,
+    annotate_gff,
+    annotate_gff_pipeline,
+    prepare_gff_for_conversion,
+    process_unifire_output,
+)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    files = {
+        "gff": (
+            "##gff-version 3\n"
+            "contig_1\tBakta\tregion\t1\t1000\t.\t+\t.\tID=region_1;Dbxref=GO:0000001\n"
+            "contig_1\tProdigal\tCDS\t100\t400\t.\t+\t0\t"
+            "ID=cds_1;locus_tag=cds_1;product=hypothetical protein\n"
+            "contig_1\tProdigal\tCDS\t500\t900\t.\t+\t0\t"
+            "ID=cds_2;locus_tag=cds_2;product=hypothetical protein;interpro=IPR000001\n"
+            "##FASTA\n"
+            ">contig_1\n"
+            "ACGT\n"
+        ),
+        "eggnog": "",
+        "rfam": "",
+        "trnas": "",
+        "arba": (
+            "Evidence\tProteinId\tAnnotationType\tValue\n"
+            "ARBA1\tcds_1\tprotein.recommendedName.fullName\tThing; synthase\n"
+            "ARBA1\tcds_1\txref.GO\tGO:0000002\n"
+        ),
+        "unirule": "Evidence\tProteinId\tAnnotationType\tValue\n",
+        "pirsr": "Evidence\tProteinId\tAnnotationType\tValue\n",
+        "entries": "ENTRY_AC\tENTRY_TYPE\tENTRY_NAME\nIPR000001\tDomain\tKringle\n",
+    }
+    paths = dict()
+    for name, content in files.items():
+        paths[name] = tmp_path / name
+        paths[name].write_text(content)
+    return paths
+
+
+def test_pipeline_matches_separate_scripts(inputs, tmp_path):
+    temp_gff = tmp_path / "temp.gff"
+    unifire_gff = tmp_path / "temp_with_unifire.gff"
+    expected = {
+        "annotations": tmp_path / "annotations.gff",
+        "submission": tmp_path / "submission.gff",
+        "descriptions": tmp_path / "annotations_with_descriptions.gff",
+    }
+    annotate_gff.main(
+        inputs["gff"],
+        None,
+        inputs["eggnog"],
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        inputs["rfam"],
+        inputs["trnas"],
+        temp_gff,
+        None,
+    )
+    process_unifire_output.main(
+        inputs["arba"], inputs["unirule"], inputs["pirsr"], temp_gff, unifire_gff
+    )
+    add_hypothetical_protein_descriptions.main(
+        inputs["entries"],
+        None,
+        None,
+        inputs["eggnog"],
+        unifire_gff,
+        expected["annotations"],
+    )
+    prepare_gff_for_conversion.main(expected["annotations"], expected["submission"])
+    add_interpro_descriptions.main(
+        inputs["entries"], expected["annotations"], expected["descriptions"]
+    )
+
+    outputs = {name: tmp_path / f"fused_{name}.gff" for name in expected}
+    annotate_gff_pipeline.main(
+        inputs["gff"],
+        None,
+        inputs["eggnog"],
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        inputs["rfam"],
+        inputs["trnas"],
+        (inputs["arba"], inputs["unirule"], inputs["pirsr"]),
+        inputs["entries"],
+        None,
+        None,
+        outputs["annotations"],
+        outputs["submission"],
+        outputs["descriptions"],
+        None,
+    )
+    for name, path in expected.items():
+        # process_unifire_output writes the lines it changes with Windows line endings, the
+        # pipeline ends every line with \n
+        assert outputs[name].read_text() == path.read_text().replace("\r", "")
+    annotations = outputs["annotations"].read_text()
+    assert "product=Thing\\/ synthase;product_source=UniFIRE" in annotations
+    assert "IPR000001: Kringle [D]" in outputs["descriptions"].read_text()
+
+
+def test_pipeline_without_unifire_and_descriptions(inputs, tmp_path):
+    annotations = tmp_path / "annotations.gff"
+    submission = tmp_path / "submission.gff"
+    annotate_gff_pipeline.main(
+        inputs["gff"],
+        None,
+        inputs["eggnog"],
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        None,
+        inputs["rfam"],
+        inputs["trnas"],
+        None,
+        inputs["entries"],
+        None,
+        None,
+        annotations,
+        submission,
+        None,
+        None,
+    )
+    lines = annotations.read_text().splitlines()
+    assert lines[2].endswith("product=hypothetical protein;product_source=Prokka")
+    assert lines[-3:] == ["##FASTA", ">contig_1", "ACGT"]
+    submission_lines = submission.read_text().splitlines()
+    assert submission_lines[3].endswith(
+        "product_source=Prokka;Dbxref=InterPro:IPR000001"
+    )
+    assert submission_lines[1].endswith("ID=region_1;Dbxref=GO:0000001")
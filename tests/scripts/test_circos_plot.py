@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from Bio.SeqFeature import SeqFeature, SimpleLocation
+
+from bin.circos_plot import bucket_features, load_plot_features, merge_feature_spans
+
+
+def feature(feature_type, start, end, strand=1, **qualifiers):
+    return SeqFeature(
+        location=SimpleLocation(start, end, strand),
+        type=feature_type,
+        qualifiers={key: [value] for key, value in qualifiers.items()},
+    )
+
+
+def test_bucket_features():
+    forward = feature("CDS", 0, 100, 1, antismash_bgc_function="NRP")
+    reverse = feature("CDS", 200, 300, -1, nearest_MiBIG="BGC0000001")
+    no_strand = feature("CDS", 400, 500, 0)
+    trna = feature("tRNA", 600, 680)
+    island = feature("mobility_island", 1000, 5000)
+    # phage types are matched whatever their case
+    prophage = feature("Prophage", 6000, 9000)
+    gene = feature("gene", 0, 100)
+    features = [forward, reverse, no_strand, trna, island, prophage, gene]
+
+    assert bucket_features(features, mobilome=True, skip_sanntis=False) == {
+        ("f_cds", "hotpink"): [forward],
+        ("r_cds", "steelblue"): [reverse, no_strand],
+        ("antismash", "tomato"): [forward],
+        ("sanntis", "firebrick"): [reverse],
+        ("rna", "darkmagenta"): [trna],
+        ("mobilome", "lightseagreen"): [island],
+        ("mobilome", "blue"): [prophage],
+    }
+    assert bucket_features(features, mobilome=False, skip_sanntis=True) == {
+        ("f_cds", "hotpink"): [forward],
+        ("r_cds", "steelblue"): [reverse, no_strand],
+        ("antismash", "tomato"): [forward],
+        ("rna", "darkmagenta"): [trna],
+    }
+
+
+def test_merge_feature_spans():
+    features = [
+        feature("CDS", 500, 600),
+        feature("CDS", 0, 100),
+        # 9 bases after the first block: joined to it
+        feature("CDS", 109, 200),
+        # inside the first block
+        feature("CDS", 150, 180),
+        # 10 bases after the first block: a new block
+        feature("CDS", 210, 250),
+    ]
+    assert merge_feature_spans(features, 10) == [(0, 200), (210, 250), (500, 600)]
+    assert merge_feature_spans(features, 0) == [
+        (0, 100),
+        (109, 200),
+        (210, 250),
+        (500, 600),
+    ]
+    assert merge_feature_spans([], 10) == []
+
+
+def test_load_plot_features(tmp_path):
+    gff = tmp_path / "annotations.gff"
+    gff.write_text(
+        "##gff-version 3\n"
+        "##sequence-region contig_1 1 10000\n"
+        "##sequence-region contig_1 1 20000\n"
+        "contig_1\tProdigal\tgene\t1\t100\t.\t+\t.\tID=gene_1\n"
+        "contig_1\tProdigal\tCDS\t1\t100\t.\t+\t0\t"
+        "ID=cds_1;product=a\\=b;antismash_bgc_function=NRP\\=PKS;gecco_bgc_type=Polyketide\n"
+        "contig_2\tProdigal\tCDS\t50\t300\t.\t-\t0\tID=cds_2\n"
+        "contig_2\tProdigal\tgene\t1\t2000\t.\t-\t.\tID=gene_2\n"
+        "contig_2\ttRNAscan-SE\ttRNA\t400\t480\t.\t+\t.\tID=trna_1\n"
+        "##FASTA\n"
+        ">contig_1\n"
+        "contig_3\tProdigal\tCDS\t1\t100\t.\t+\t0\tID=cds_3\n"
+    )
+    seqid2size, seqid2features = load_plot_features(gff)
+    # the first sequence-region wins; without one, the end of the last feature is used
+    assert seqid2size == {"contig_1": 10000, "contig_2": 2000}
+    assert list(seqid2features) == ["contig_1", "contig_2"]
+
+    [cds_1] = seqid2features["contig_1"]
+    assert cds_1.type == "CDS"
+    assert (cds_1.location.start, cds_1.location.end, cds_1.location.strand) == (
+        0,
+        100,
+        1,
+    )
+    # only the qualifiers that choose a track are kept, and values are not unescaped
+    assert cds_1.qualifiers == {
+        "antismash_bgc_function": ["NRP\\=PKS"],
+        "gecco_bgc_type": ["Polyketide"],
+    }
+    assert [
+        (feature.type, feature.location.strand)
+        for feature in seqid2features["contig_2"]
+    ] == [("CDS", -1), ("tRNA", 1)]
+
+
+def test_load_plot_features_empty(tmp_path):
+    gff = tmp_path / "empty.gff"
+    gff.write_text("##gff-version 3\n")
+    with pytest.raises(ValueError, match="Failed to parse"):
+        load_plot_features(gff)
@@ -15,7 +15,16 @@
 
 import os
 
-from postprocessing.duplicate_resolution import main
+import pytest
+
+from postprocessing.duplicate_resolution import (
+    load_gene_table,
+    load_manifest,
+    load_species_config,
+    main,
+    rename_gene,
+    run_batch,
+)
 
 
 def test_main(shared_datadir, tmp_path):
@@ -28,3 +37,93 @@ def test_main(shared_datadir, tmp_path):
     os.remove("uniformis_replacements.txt")
     os.remove("uniformis_stats.txt")
     assert result == {"replaced": 6, "unable_to_decide": 5}
+
+
+def test_load_gene_table(shared_datadir):
+    gene_table = load_gene_table(shared_datadir / "deduplication_script_test_input.gff")
+    assert [gene.name for gene in gene_table.by_base["fucP"]] == ["fucP_1", "fucP_2"]
+    assert gene_table.by_base["fucP"][1].alias == "BACUNI_03974"
+    assert gene_table.by_alias["BACUNI_03974"] == 1
+
+
+def test_load_gene_table_last_or_empty_name(tmp_path):
+    gff = tmp_path / "target.gff"
+    gff.write_text(
+        "contig_1\tProkka\tgene\t1\t100\t.\t+\t.\tID=BU_1;locus_tag=BU_1;gene=susC_1\n"
+        "contig_1\tProkka\tgene\t200\t300\t.\t+\t.\tID=BU_2;locus_tag=BU_2;gene=\n"
+        "contig_1\tProkka\tgene\t400\t500\t.\t+\t.\tID=BU_3;gene=;locus_tag=BU_3;\n"
+    )
+    gene_table = load_gene_table(gff)
+    assert [gene.name for gene in gene_table.genes] == ["susC_1"]
+    assert [gene.locus for gene in gene_table.by_base["susC"]] == ["BU_1"]
+
+
+def test_rename_gene():
+    assert (
+        rename_gene("ID=X_1;Name=susC_1;gene=susC_1;note=susC_10", "susC_1", "susC")
+        == "ID=X_1;Name=susC;gene=susC;note=susC_10"
+    )
+
+
+def test_run_batch(shared_datadir, tmp_path):
+    reference = shared_datadir / "dummy_reference.gff"
+    target = shared_datadir / "deduplication_script_test_input.gff"
+    # the same reference read through a species table
+    species_table = tmp_path / "species.tsv"
+    species_table.write_text(
+        "species\tprefix\tid_pattern\tname_pattern\n"
+        "Custom\tBACUNI\tID=gene:(.*?);\t;Name=(.*?);\n"
+    )
+    # a line without 9 columns fails this genome only
+    broken_target = tmp_path / "broken.gff"
+    broken_target.write_text("contig_1\tProkka\tgene\t1\t100\n")
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text(
+        "genome\tspecies\treference\ttarget\n"
+        f"strain_1\tuniformis\t{reference}\t{target}\n"
+        f"strain_2\tuniformis\t{reference}\t{target}\n"
+        f"strain_3\tcustom\t{reference}\t{target}\n"
+        f"strain_4\tuniformis\t{reference}\t{broken_target}\n"
+        f"strain_5\tfragilis\t{reference}\t{target}\n"
+        f"strain_6\tvulgatus\t{tmp_path / 'missing.gff'}\t{target}\n"
+    )
+    outdir = tmp_path / "deduplicated"
+    report = tmp_path / "report.tsv"
+    run_batch(manifest, outdir, report, 2, load_species_config(species_table))
+
+    report_lines = report.read_text().splitlines()
+    assert report_lines[0].split("\t") == [
+        "genome",
+        "species",
+        "deduplicated_gff",
+        "replaced",
+        "unable_to_decide",
+        "unknowns_only",
+        "status",
+    ]
+    for line, genome in zip(report_lines[1:4], ["strain_1", "strain_2", "strain_3"]):
+        cols = line.split("\t")
+        assert cols[0] == genome
+        assert cols[3:] == ["6", "5", "0", "done"]
+        assert (outdir / f"{genome}_stats.txt").exists()
+    assert (outdir / "strain_1_deduplicated.gff").read_text() == (
+        outdir / "strain_3_deduplicated.gff"
+    ).read_text()
+    # failed genomes are reported without stopping the others
+    statuses = [line.split("\t")[6] for line in report_lines[4:]]
+    assert statuses[0].startswith("failed: ValueError")
+    assert statuses[1] == "failed: unknown species fragilis"
+    assert statuses[2].startswith("failed: cannot read reference")
+    assert all(line.split("\t")[3:6] == ["0", "0", "0"] for line in report_lines[4:])
+
+
+def test_load_manifest_errors(tmp_path):
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text(
+        "strain_1\tuniformis\tref.gff\ta.gff\nstrain_1\tuniformis\tref.gff\tb.gff\n"
+    )
+    with pytest.raises(SystemExit, match="reuses the genome name strain_1 of line 1"):
+        load_manifest(manifest)
+    manifest.write_text("strain_1\tuniformis\tref.gff\n")
+    with pytest.raises(SystemExit, match="Line 1 of .* has 3 columns instead of 4"):
+        load_manifest(manifest)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from bin.add_hypothetical_protein_descriptions import load_eggnog
+from bin.annotate_gff import get_eggnog
+from bin.eggnog_annotations import (
+    EggnogRecord,
+    is_informative_description,
+    load_eggnog_annotations,
+)
+
+HEADER = (
+    "#query\tseed_ortholog\tevalue\tscore\teggNOG_OGs\tmax_annot_lvl\tCOG_category\t"
+    "Description\tPreferred_name\tGOs\tEC\tKEGG_ko\tKEGG_Pathway\tKEGG_Module\t"
+    "KEGG_Reaction\tKEGG_rclass\tBRITE\tKEGG_TC\tCAZy\tBiGG_Reaction\tPFAMs"
+)
+
+
+def eggnog_row(protein, evalue, cog, description, gos="-", kegg="-"):
+    cols = [protein, "1.A", evalue, "100", "COG1", "Bacteria", cog, description]
+    cols += ["-", gos, "-", kegg] + ["-"] * 9
+    return "\t".join(cols)
+
+
+@pytest.fixture
+def eggnog_file(tmp_path):
+    path = tmp_path / "eggnog.tsv"
+    path.write_text(
+        "\n".join(
+            [
+                HEADER,
+                eggnog_row(
+                    "prot_1", "1e-50", "E", "- Amino acid permease", "GO:1,GO:2"
+                ),
+                eggnog_row("prot_2", "1e-50", "KT", "Protein of unknown function"),
+                eggnog_row("prot_3", "1e-5", "E", "Kinase"),
+                eggnog_row("prot_4", "1e-50", "S", "2 homolog", kegg="ko:K1"),
+            ]
+        )
+        + "\n"
+    )
+    return path
+
+
+def test_load_eggnog_annotations(eggnog_file):
+    records = load_eggnog_annotations(eggnog_file)
+    assert list(records) == ["prot_1", "prot_2", "prot_4"]
+    assert records["prot_1"] == EggnogRecord(
+        "1.A", "E", "-", "GO:1,GO:2", "- Amino acid permease"
+    )
+
+
+def test_cache_is_reused(eggnog_file, tmp_path):
+    cache_file = tmp_path / "eggnog.cache"
+    records = load_eggnog_annotations(eggnog_file, cache_file)
+    assert cache_file.exists()
+    load_eggnog_annotations.cache_clear()
+    assert load_eggnog_annotations(eggnog_file, cache_file) == records
+    # a cache saved from other annotations is replaced
+    eggnog_file.write_text(HEADER + "\n")
+    load_eggnog_annotations.cache_clear()
+    assert load_eggnog_annotations(eggnog_file, cache_file) == {}
+    load_eggnog_annotations.cache_clear()
+    assert load_eggnog_annotations(eggnog_file, cache_file) == {}
+
+
+def test_is_informative_description():
+    assert is_informative_description("Amino acid permease")
+    assert not is_informative_description("Protein of unknown function")
+    assert not is_informative_description("Contains PROTEINS OF UNKNOWN FUNCTION here")
+    assert not is_informative_description("2 homolog")
+    assert not is_informative_description(" ".join(["word"] * 71))
+
+
+def test_scripts_share_records(eggnog_file):
+    assert get_eggnog(eggnog_file) == {
+        "prot_1": [["1.A"], ["E"], ["-"], ["GO:1", "GO:2"]],
+        "prot_2": [["1.A"], ["R"], ["-"], ["-"]],
+        "prot_4": [["1.A"], ["S"], ["ko:K1"], ["-"]],
+    }
+    assert load_eggnog(eggnog_file) == {"prot_1": "Amino acid permease"}
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bin.gff_attributes import (
+    insert_attribute_after,
+    parse_attributes,
+    serialize_attributes,
+    split_values,
+)
+
+
+def test_parse_attributes_plain():
+    assert parse_attributes("ID=cds_1;locus_tag=cds_1;product=x;") == {
+        "ID": "cds_1",
+        "locus_tag": "cds_1",
+        "product": "x",
+    }
+
+
+def test_parse_attributes_escaped():
+    col9 = "ID=cds_1;uf_prot_rec_fullname=Thing\\; synthase\\=A\\,B;Note=a=b"
+    assert parse_attributes(col9) == {
+        "ID": "cds_1",
+        "uf_prot_rec_fullname": "Thing\\; synthase\\=A\\,B",
+        "Note": "a=b",
+    }
+
+
+def test_serialize_attributes_round_trip():
+    col9 = "ID=cds_1;product=Thing\\; synthase\\=A\\,B;pfam=PF00001,PF00002"
+    assert serialize_attributes(parse_attributes(col9)) == col9
+
+
+def test_split_values():
+    assert split_values("PF00001,PF00002") == ["PF00001", "PF00002"]
+    assert split_values("A\\,B,C") == ["A\\,B", "C"]
+
+
+def test_insert_attribute_after():
+    attributes = {"ID": "cds_1", "locus_tag": "cds_1", "product": "x"}
+    assert list(insert_attribute_after(attributes, "locus_tag", "Note", "n")) == [
+        "ID",
+        "locus_tag",
+        "Note",
+        "product",
+    ]
+    assert list(insert_attribute_after(attributes, "gene", "Note", "n")) == [
+        "ID",
+        "locus_tag",
+        "product",
+        "Note",
+    ]
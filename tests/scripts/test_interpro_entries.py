@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from bin.interpro_entries import (
+    SNAPSHOT_NAME,
+    find_snapshot,
+    is_ancestor,
+    load_entries,
+    load_hierarchy,
+    most_specific_term,
+    term_depth,
+    write_snapshot,
+)
+
+
+@pytest.fixture
+def interpro_files(tmp_path):
+    entry_list = tmp_path / "entry.list"
+    entry_list.write_text(
+        "ENTRY_AC\tENTRY_TYPE\tENTRY_NAME\n"
+        "IPR000001\tDomain\tKringle\n"
+        "IPR000002\tFamily\tCdc20/Fizzy\n"
+    )
+    hierarchy = tmp_path / "ParentChildTreeFile.txt"
+    hierarchy.write_text(
+        "IPR000002::Cdc20/Fizzy::\n--IPR000001::Kringle::\nIPR000001::Kringle::\n"
+    )
+    return entry_list, hierarchy
+
+
+def test_load_without_snapshot(interpro_files):
+    entry_list, hierarchy = interpro_files
+    assert load_entries(entry_list) == {
+        "IPR000001": ("Domain", "Kringle"),
+        "IPR000002": ("Family", "Cdc20/Fizzy"),
+    }
+    assert load_hierarchy(hierarchy) == {
+        "IPR000002": ("", 0, 0, 1),
+        "IPR000001": ("IPR000002", 1, 1, 1),
+    }
+
+
+def test_snapshot_matches_text_files(interpro_files):
+    entry_list, hierarchy = interpro_files
+    write_snapshot(entry_list, hierarchy, "94.0\n", entry_list.parent / SNAPSHOT_NAME)
+    snapshot = find_snapshot(entry_list, "94.0")
+    assert snapshot["entries"] == load_entries(entry_list, "94.0")
+    assert snapshot["entries"]["IPR000001"] == ("Domain", "Kringle")
+    assert snapshot["hierarchy"] == load_hierarchy(hierarchy, "94.0")
+    # a snapshot from another release is not used
+    assert find_snapshot(entry_list, "95.0") is None
+    entry_list.write_text("ENTRY_AC\tENTRY_TYPE\tENTRY_NAME\n")
+    assert find_snapshot(entry_list, "94.0") is None
+    assert load_entries(entry_list, "94.0") == {}
+
+
+def test_corrupted_snapshot_is_ignored(interpro_files):
+    entry_list, hierarchy = interpro_files
+    (entry_list.parent / SNAPSHOT_NAME).write_bytes(b"not a snapshot")
+    assert find_snapshot(entry_list, None) is None
+    assert len(load_entries(entry_list)) == 2
+
+
+def test_hierarchy_queries(tmp_path):
+    hierarchy_file = tmp_path / "ParentChildTreeFile.txt"
+    hierarchy_file.write_text(
+        "IPR000001::Root::\n"
+        "--IPR000002::Child::\n"
+        "----IPR000003::Grandchild::\n"
+        "--IPR000004::Second child::\n"
+        "IPR000005::Other root::\n"
+        "--IPR000006::Other child::\n"
+    )
+    hierarchy = load_hierarchy(hierarchy_file)
+    assert hierarchy["IPR000004"][0] == "IPR000001"
+    assert term_depth(hierarchy, "IPR000003") == 2
+    assert term_depth(hierarchy, "IPR999999") == 0
+    assert is_ancestor(hierarchy, "IPR000001", "IPR000003")
+    assert is_ancestor(hierarchy, "IPR000002", "IPR000003")
+    assert not is_ancestor(hierarchy, "IPR000003", "IPR000001")
+    assert not is_ancestor(hierarchy, "IPR000004", "IPR000003")
+    assert not is_ancestor(hierarchy, "IPR000001", "IPR000006")
+    assert not is_ancestor(hierarchy, "IPR000001", "IPR000001")
+    assert most_specific_term(hierarchy, ["IPR000001", "IPR000002"]) == "IPR000002"
+    assert (
+        most_specific_term(hierarchy, ["IPR000004", "IPR000006", "IPR000003"])
+        == "IPR000003"
+    )
+    assert most_specific_term(hierarchy, ["IPR000004", "IPR000006"]) == "IPR000004"
+    assert most_specific_term(hierarchy, ["IPR999999", "IPR000005"]) == "IPR999999"
+    assert most_specific_term(hierarchy, []) is None
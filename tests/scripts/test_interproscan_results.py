@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from bin.annotate_gff import get_iprs
+from bin.interproscan_results import (
+    group_rows_by_protein,
+    load_interproscan_results,
+    select_rows,
+)
+
+IPS_ROWS = [
+    "prot_1\tmd5\t400\tPfam\tPF00001\tKinase\t1\t201\t1e-30\tT\t01-01-2024\tIPR000001\tKinase domain",
+    "prot_2\tmd5\t100\tAntiFam\tANF00001\tSpurious\t1\t90\t1e-20\tT\t01-01-2024\t-\t-",
+    "prot_1\tmd5\t400\tCoils\tCoil\tCoil\t10\t40\t-\tT\t01-01-2024\t-\t-",
+    "prot_3\tmd5\t300\tPfam\tPF00002\tWeak\t1\t300\t1e-5\tT\t01-01-2024\tIPR000002\tWeak",
+    "prot_1\tmd5\t400\tNCBIfam\tNF000001\tSynthase\t100\t120\t1e-15\tT\t01-01-2024",
+]
+
+
+@pytest.fixture
+def ips_file(tmp_path):
+    path = tmp_path / "ips.tsv"
+    path.write_text("\n".join(IPS_ROWS) + "\n")
+    return path
+
+
+def test_load_interproscan_results_filters_evalue(ips_file):
+    ips_results = load_interproscan_results(ips_file)
+    assert ips_results["protein"] == ("prot_1", "prot_2", "prot_1")
+    assert ips_results["db"] == ("Pfam", "AntiFam", "NCBIfam")
+    # rows without --iprlookup columns get placeholders
+    assert ips_results["ipr_acc"] == ("IPR000001", "-", "-")
+    assert list(ips_results["start"]) == [1, 1, 100]
+    assert list(ips_results["match"]) == [0.5, 0.89, 0.05]
+
+
+def test_group_rows_by_protein(ips_file):
+    ips_results = load_interproscan_results(ips_file)
+    assert group_rows_by_protein(ips_results) == {"prot_1": [0, 2], "prot_2": [1]}
+    rows = select_rows(ips_results["db"], {"AntiFam"}, exclude=True)
+    assert group_rows_by_protein(ips_results, rows) == {"prot_1": [0, 2]}
+
+
+def test_get_iprs(ips_file):
+    iprs, antifams = get_iprs(ips_file)
+    assert iprs == {"prot_1": [{"PF00001"}, {"IPR000001"}]}
+    assert antifams == ["prot_2"]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bin.make_combined_unifire_output import INPUTS, main
+
+PREDICTIONS = {
+    "ARBA": [
+        "ARBA00001\tprot_2\tkeyword\tHydrolase",
+        "ARBA00002\tprot_1\tkeyword\tKinase",
+        "ARBA00003\tprot_2\txref.GO\tGO:1",
+    ],
+    "UniRule": ["UR000001\tprot_1\tgene.name.primary\tabcA"],
+    "UniRule-PIRSR": [
+        "PIRSR000001\tprot_1\tkeyword\tMetal-binding",
+        "PIRSR000002\tprot_3\tpositional\tBinding\t10\t12",
+    ],
+}
+
+
+def test_main(tmp_path):
+    for dbname, filename in INPUTS.items():
+        (tmp_path / filename).write_text(
+            "\n".join(
+                ["Evidence\tProteinId\tAnnotationType\tValue"] + PREDICTIONS[dbname]
+            )
+            + "\n"
+        )
+    outfile = tmp_path / "combined.out"
+    # ARBA is not sorted by protein and is split into two runs
+    main(tmp_path, outfile, chunk_size=2)
+    assert outfile.read_text().splitlines() == [
+        "Source\tEvidence\tProteinId\tAnnotationType\tValue\tStart\tEnd",
+        "ARBA\tARBA00002\tprot_1\tkeyword\tKinase",
+        "UniRule\tUR000001\tprot_1\tgene.name.primary\tabcA",
+        "UniRule-PIRSR\tPIRSR000001\tprot_1\tkeyword\tMetal-binding",
+        "ARBA\tARBA00001\tprot_2\tkeyword\tHydrolase",
+        "ARBA\tARBA00003\tprot_2\txref.GO\tGO:1",
+        "UniRule-PIRSR\tPIRSR000002\tprot_3\tpositional\tBinding\t10\t12",
+    ]
+
+
+def test_main_without_final_newline(tmp_path):
+    for dbname, filename in INPUTS.items():
+        (tmp_path / filename).write_text("Evidence\tProteinId\tAnnotationType\tValue\n")
+    # the last line has no newline and is sorted before another line of its run
+    (tmp_path / INPUTS["ARBA"]).write_text(
+        "Evidence\tProteinId\tAnnotationType\tValue\n"
+        "E4\tp4\tkeyword\tV\nE2\tp2\tkeyword\tV\nE3\tp3\tkeyword\tV\nE1\tp1\tkeyword\tV"
+    )
+    outfile = tmp_path / "combined.out"
+    main(tmp_path, outfile, chunk_size=2)
+    assert outfile.read_text().splitlines()[1:] == [
+        "ARBA\tE1\tp1\tkeyword\tV",
+        "ARBA\tE2\tp2\tkeyword\tV",
+        "ARBA\tE3\tp3\tkeyword\tV",
+        "ARBA\tE4\tp4\tkeyword\tV",
+    ]
+
+
+def test_main_with_shards(tmp_path):
+    (tmp_path / "shards.tsv").write_text(
+        "shard\tfolder\tsequences\tresidues\n1\tshard_1\t1\t10\n2\tshard_2\t1\t10\n"
+    )
+    for shard, protein in [("shard_1", "prot_1"), ("shard_2", "prot_2")]:
+        (tmp_path / shard).mkdir()
+        for dbname, filename in INPUTS.items():
+            (tmp_path / shard / filename).write_text(
+                "Evidence\tProteinId\tAnnotationType\tValue\n"
+                f"{dbname}_rule\t{protein}\tkeyword\tHydrolase\n"
+            )
+    outfile = tmp_path / "combined.out"
+    main(None, outfile, manifest=str(tmp_path / "shards.tsv"))
+    assert [line.split("\t")[:3] for line in outfile.read_text().splitlines()[1:]] == [
+        ["ARBA", "ARBA_rule", "prot_1"],
+        ["UniRule", "UniRule_rule", "prot_1"],
+        ["UniRule-PIRSR", "UniRule-PIRSR_rule", "prot_1"],
+        ["ARBA", "ARBA_rule", "prot_2"],
+        ["UniRule", "UniRule_rule", "prot_2"],
+        ["UniRule-PIRSR", "UniRule-PIRSR_rule", "prot_2"],
+    ]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from postprocessing.mob_merger_v2 import (
+    covered_length,
+    load_manifest,
+    mapper,
+    run_batch,
+)
+
+
+def momo_element(contig, start, end, number):
+    return (
+        contig,
+        "insertion_sequence",
+        str(start),
+        str(end),
+        f"is_{number}-{start}:{end}",
+    )
+
+
+def promge_element(contig, start, end):
+    return (contig, "phage", str(start), str(end), f"{contig}:{start}-{end}")
+
+
+def test_mapper():
+    momofy_dict = {
+        "contig_1": [
+            momo_element("contig_1", 100, 200, 1),
+            momo_element("contig_1", 280, 400, 2),
+            momo_element("contig_1", 5000, 5100, 3),
+            momo_element("contig_1", 395, 450, 4),
+        ],
+        "contig_2": [momo_element("contig_2", 100, 200, 5)],
+    }
+    promge_dict = {
+        "contig_1": [
+            # joins the first two MAP elements into one cluster
+            promge_element("contig_1", 150, 300),
+            # overlaps the span of the first cluster through a MAP element only
+            promge_element("contig_1", 440, 600),
+            promge_element("contig_1", 7000, 8000),
+        ],
+        "contig_2": [promge_element("contig_2", 200, 300)],
+    }
+    momo_unique, pro_unique, final_overlapped, permge_metadata = mapper(
+        momofy_dict, promge_dict
+    )
+    assert momo_unique == ["contig_1:5000-5100"]
+    assert pro_unique == ["contig_1:7000-8000"]
+    assert final_overlapped == [
+        [
+            "contig_1:100-200",
+            "contig_1:150-300",
+            "contig_1:280-400",
+            "contig_1:395-450",
+            "contig_1:440-600",
+        ],
+        ["contig_2:100-200", "contig_2:200-300"],
+    ]
+    assert len(permge_metadata) == 9
+
+
+def test_covered_length():
+    assert covered_length([]) == 0
+    assert covered_length([(10, 20), (1, 5), (15, 30), (31, 31)]) == 27
+
+
+def test_run_batch(tmp_path):
+    manifest_lines = ["genome\tmobannot\tproMGE\tmeta"]
+    for genome in ["genome_1", "genome_2"]:
+        mobannot = tmp_path / f"{genome}_map.gff"
+        mobannot.write_text(
+            "##gff-version 3\n"
+            "contig_1\tMAP\tinsertion_sequence\t100\t200\t.\t+\t.\t"
+            "ID=is_1-100:200;mobile_element_type=IS3\n"
+            "contig_1\tMAP\tinsertion_sequence\t900\t1000\t.\t+\t.\t"
+            "ID=is_2-900:1000;mobile_element_type=IS5\n"
+        )
+        promge = tmp_path / f"{genome}_promge.gff"
+        promge.write_text(
+            "contig_1\tproMGE\tmge\t150\t300\t.\t.\t.\t"
+            f"ID={genome}_contig_1:150-300;mgeR=Tn3\n"
+        )
+        meta = tmp_path / f"{genome}_meta.tsv"
+        meta.write_text(
+            "is_tn\tphage\tphage_like\tce\tintegron\tmi\tcellular\tcontig\tstart\tend\t"
+            "size\tn_genes\tmgeR\n"
+            "1\t0\t0\t0\t0\t0\t0\tcontig_1\t150\t300\t151\t2\tTn3\n"
+        )
+        manifest_lines.append(f"{genome}\t{mobannot}\t{promge}\t{meta}")
+    # a missing input fails this genome only
+    manifest_lines.append(f"genome_3\t{tmp_path / 'missing.gff'}\t{promge}\t{meta}")
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text("\n".join(manifest_lines) + "\n")
+
+    outdir = tmp_path / "merged"
+    summary = tmp_path / "summary.tsv"
+    run_batch(manifest, outdir, summary, 2)
+
+    summary_lines = summary.read_text().splitlines()
+    assert summary_lines[0].split("\t")[:3] == ["genome", "merged_gff", "promge_unique"]
+    assert [line.split("\t")[0] for line in summary_lines[1:]] == [
+        "genome_1",
+        "genome_2",
+        "genome_3",
+    ]
+    assert summary_lines[1].split("\t")[2:] == ["0", "1", "0", "0", "1", "done"]
+    assert summary_lines[3].split("\t")[2:7] == ["0", "0", "0", "0", "0"]
+    assert summary_lines[3].split("\t")[7].startswith("failed: FileNotFoundError")
+    merged = (outdir / "genome_2_merged.gff").read_text().splitlines()
+    assert merged[1].startswith("contig_1\tMAP\tinsertion_sequence\t900\t1000")
+    assert merged[2].startswith("contig_1\tpromge/MAP\tnested\t100\t300")
+    assert "ID=genome_2|contig_1:100-300" in merged[2]
+
+
+def test_load_manifest_duplicates(tmp_path):
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text(
+        "genome_1\ta.gff\tb.gff\tc.tsv\ngenome_1\td.gff\te.gff\tf.tsv\n"
+    )
+    with pytest.raises(SystemExit, match="genome_1 is listed twice"):
+        load_manifest(manifest)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bin.prepare_unifire_input import load_shard_folders, main, split_evenly
+
+
+def test_split_evenly():
+    assert split_evenly([1] * 10, 3) == [4, 7, 10]
+    assert split_evenly([100, 5, 5, 5, 100, 5], 2) == [3, 6]
+    # every shard gets at least one sequence
+    assert split_evenly([1000, 1, 1], 3) == [1, 2, 3]
+    assert split_evenly([1, 1], 5) == [1, 2]
+
+
+def test_sharded_input(tmp_path):
+    infile = tmp_path / "proteins.faa"
+    infile.write_text(
+        ">prot_1 Kinase\nMKV\nLL\n"
+        ">prot_2 'Hypothetical' protein\nMA\n"
+        ">prot_3 Permease\nMKKKKKKKKK\n"
+    )
+    outdir = tmp_path / "unifire"
+    main(str(infile), "1234", str(outdir), shards=2, balance_by="residues")
+    assert (outdir / "shards.tsv").read_text() == (
+        "shard\tfolder\tsequences\tresidues\n"
+        "1\tshard_1\t2\t7\n"
+        "2\tshard_2\t1\t10\n"
+    )
+    assert load_shard_folders(str(outdir / "shards.tsv")) == [
+        str(outdir / "shard_1"),
+        str(outdir / "shard_2"),
+    ]
+    assert (outdir / "shard_1" / "proteins.fasta").read_text() == (
+        ">tr|prot_1|Kinase OX=1234\nMKV\nLL\n"
+        ">tr|prot_2|Hypothetical protein OX=1234\nMA\n"
+    )
+    assert (outdir / "shard_2" / "proteins.fasta").read_text() == (
+        ">tr|prot_3|Permease OX=1234\nMKKKKKKKKK\n"
+    )
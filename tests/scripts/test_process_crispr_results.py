@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from bin.indexed_fasta import IndexedFasta
+from bin.process_crispr_results import process_gff_line
+
+
+@pytest.fixture
+def fasta(tmp_path):
+    path = tmp_path / "genome.fasta"
+    path.write_text(">contig_1 description\nAAAATTTTGG\nCCGGAT\n>contig_2\nACGT\n")
+    return path
+
+
+def test_indexed_fasta(fasta):
+    with IndexedFasta(str(fasta)) as fasta_index:
+        assert fasta_index.length("contig_1") == 16
+        assert fasta_index.fetch("contig_1", 8, 12) == "GGCC"
+        assert fasta_index.fetch("contig_1", 14, 100) == "AT"
+        assert fasta_index.fetch("contig_2", 0, 4) == "ACGT"
+    # the saved index is used by the next run
+    assert (
+        (fasta.parent / "genome.fasta.fai")
+        .read_text()
+        .startswith("contig_1\t16\t22\t10\t11\n")
+    )
+    with IndexedFasta(str(fasta)) as fasta_index:
+        assert fasta_index.fetch("contig_1", 6, 10) == "TTGG"
+
+
+def test_process_gff_line(fasta):
+    evidence_levels = {"contig_1_1_10": "4"}
+    with IndexedFasta(str(fasta)) as fasta_index:
+        assert process_gff_line(
+            "contig_1\tCRISPRCasFinder\tRightFLANK\t11\t100\t.\t.\t.\t"
+            "sequence=UNKNOWN;at%=0;Parent=contig_1_1_10;leader;ID=flank_1\n",
+            fasta_index,
+            evidence_levels,
+        ) == (
+            "contig_1\tCRISPRCasFinder\tRightFLANK\t11\t16\t.\t.\t.\t"
+            "sequence=CCGGAT;at%=33;ID=flank_1\n",
+            "contig_1_1_10",
+        )
+        assert process_gff_line(
+            "contig_1\tCRISPRCasFinder\tCRISPR\t1\t10\t.\t.\t.\t"
+            "Name=contig_1_1_10;ID=CRISPR1;DR=ACG;DR_length=3;\n",
+            fasta_index,
+            evidence_levels,
+        ) == (
+            "contig_1\tCRISPRCasFinder\tCRISPR\t1\t10\t.\t.\t.\t"
+            "Name=CRISPR1;ID=contig_1_1_10;dr=ACG;dr_length=3;evidence_level=4\n",
+            "contig_1_1_10",
+        )
+        # flanks entirely outside the contig are dropped
+        assert (
+            process_gff_line(
+                "contig_2\tCRISPRCasFinder\tLeftFLANK\t-100\t0\t.\t.\t.\t"
+                "sequence=UNKNOWN;at%=0\n",
+                fasta_index,
+                evidence_levels,
+            )
+            is None
+        )
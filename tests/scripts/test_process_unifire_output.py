@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bin.process_unifire_output import collapse_keywords, combine_predictions
+
+
+def test_collapse_keywords():
+    assert collapse_keywords(
+        ["Hydrolase", "Metal-binding", "hydrolase activity", "Metal", "Zinc", "Zinc"]
+    ) == ["Metal-binding", "hydrolase activity", "Zinc"]
+    # keywords that only differ in case contain each other
+    assert collapse_keywords(["Kinase", "kinase", "Transferase"]) == ["Transferase"]
+
+
+def test_combine_predictions():
+    arba = {"prot_1": {"keyword": ["Hydrolase"], "xref.GO": ["GO:1"]}}
+    unirule = {
+        "prot_1": {
+            "keyword": ["Hydrolase activity"],
+            "protein.recommendedName.fullName": ["Thing; synthase=A,B;"],
+            "xref.GO": ["GO:2", "GO:1"],
+        },
+        "prot_2": {"comment.function": ["Not reported"]},
+    }
+    pirsr = {"prot_3": {"chebi": ["ChEBI:CHEBI:18420"], "pirsr_name": ["Mg(2+)"]}}
+    assert combine_predictions([arba, unirule, pirsr]) == {
+        "prot_1": {
+            "uf_keyword": "Hydrolase activity",
+            "uf_ontology_term": "GO:1,GO:2",
+            "uf_prot_rec_fullname": "Thing\\; synthase\\=A\\,B",
+        },
+        "prot_3": {"uf_chebi": "ChEBI:CHEBI:18420", "uf_pirsr_cofactor": "Mg(2+)"},
+    }
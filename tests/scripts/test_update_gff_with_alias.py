@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from postprocessing.update_gff_with_alias import main
+
+ANNOTATIONS = (
+    "##gff-version 3\n"
+    "contig_1\tena\tgene\t1\t300\t.\t+\t.\tID=gene_1\n"
+    "contig_1\tena\tmRNA\t1\t300\t.\t+\t.\tID=transcript:tx_1;Parent=gene_1\n"
+    "contig_1\tena\texon\t1\t300\t.\t+\t.\tParent=transcript:tx_1\n"
+    "contig_1\tena\tCDS\t1\t300\t.\t+\t0\tID=cds:gene_2;Parent=transcript:tx_1\n"
+    "contig_1\tena\tgene\t400\t600\t.\t+\t.\tID=gene_2;note=a\\;b\n"
+    "##FASTA\n"
+    ">contig_1\n"
+    "ACGT\n"
+)
+
+
+def test_main(tmp_path):
+    infile = tmp_path / "annotations.gff"
+    infile.write_text(ANNOTATIONS)
+    liftoff_1 = tmp_path / "liftoff_1.gff"
+    liftoff_1.write_text(
+        "contig_1\tena\tgene\t1\t300\t.\t+\t.\t"
+        "ID=gene_1;Alias=REF_001;extra_copy_number=0\n"
+        "contig_1\tLiftoff\tgene\t400\t600\t.\t+\t.\tID=gene_2;Alias=REF_999\n"
+    )
+    liftoff_2 = tmp_path / "liftoff_2.gff"
+    liftoff_2.write_text(
+        "contig_1\tena\tgene\t1\t300\t.\t+\t.\tID=gene_1;Alias=OTHER_001\n"
+        "contig_1\tena\tgene\t400\t600\t.\t+\t.\tID=gene_2;Alias=OTHER_002\n"
+    )
+    outfile = tmp_path / "out.gff"
+    main(infile, outfile, [liftoff_1, liftoff_2], "gene", "all")
+    lines = outfile.read_text().splitlines()
+    # children take the alias of their gene through the Parent links
+    assert [line.split("\t")[8] for line in lines[1:6]] == [
+        "ID=gene_1;Alias=REF_001;extra_copy_number=0",
+        "ID=transcript:tx_1;Parent=gene_1;Alias=REF_001;extra_copy_number=0",
+        "Parent=transcript:tx_1;Alias=REF_001;extra_copy_number=0",
+        "ID=cds:gene_2;Parent=transcript:tx_1;Alias=OTHER_002",
+        "ID=gene_2;note=a\\;b;Alias=OTHER_002",
+    ]
+    assert lines[6:] == ["##FASTA", ">contig_1", "ACGT"]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from postprocessing.update_gff_with_essentiality import (
+    read_coordinates_file,
+    update_gff_with_status,
+    write_not_matched_file,
+)
+
+GFF = (
+    "##gff-version 3\n"
+    "contig_1\tProkka\tgene\t100\t399\t.\t+\t.\tID=gene_1\n"
+    "contig_1\tProkka\tCDS\t100\t399\t.\t+\t0\tID=cds_1\n"
+    "contig_1\tProkka\tCDS\t1000\t1999\t.\t-\t0\tID=cds_2\n"
+    "contig_1\tProkka\tCDS\t5000\t5999\t.\t+\t0\tID=cds_3\n"
+)
+
+CALLS = (
+    "gene\tstart\tend\tessentiality\tnote\n"
+    "geneA\t100\t399\tES\t-\n"
+    "geneB\t1001\t1999\tNE\t-\n"
+    "geneC\t5060\t5999\tGD\t-\n"
+    "geneD\t9000\t9500\tES\t-\n"
+    "geneE\t1000\t1999\t\t-\n"
+)
+
+
+def run(tmp_path, *args):
+    gff = tmp_path / "in.gff"
+    gff.write_text(GFF)
+    calls = tmp_path / "calls.tsv"
+    calls.write_text(CALLS)
+    coordinates_dict = read_coordinates_file(calls)
+    outfile = tmp_path / "out.gff"
+    matched = update_gff_with_status(gff, outfile, coordinates_dict, *args)
+    not_matched = tmp_path / "not_matched.tsv"
+    write_not_matched_file(not_matched, coordinates_dict, matched)
+    essentiality = [
+        line.split("essentiality=")[1] if "essentiality=" in line else None
+        for line in outfile.read_text().splitlines()[2:]
+    ]
+    return essentiality, not_matched.read_text().splitlines()
+
+
+def test_exact(tmp_path):
+    assert run(tmp_path) == (
+        ["ES", None, None],
+        [
+            "start\tend\tessentiality",
+            "1001\t1999\tNE",
+            "5060\t5999\tGD",
+            "9000\t9500\tES",
+            "1000\t1999\t",
+        ],
+    )
+
+
+def test_tolerance(tmp_path):
+    assert run(tmp_path, "tolerance", 3) == (
+        ["ES", "NE", None],
+        [
+            "start\tend\tessentiality",
+            "5060\t5999\tGD",
+            "9000\t9500\tES",
+            "1000\t1999\t",
+        ],
+    )
+
+
+def test_overlap(tmp_path):
+    assert run(tmp_path, "overlap", 0, 0.9) == (
+        ["ES", "NE", "GD"],
+        ["start\tend\tessentiality", "9000\t9500\tES", "1000\t1999\t"],
+    )
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# Copyright 2024 EMBL - European Bioinformatics Institute
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+
+from postprocessing import update_gff_with_mapped_uniprot_ids
+from postprocessing.update_gff_with_mapped_uniprot_ids import run_blast, split_fasta
+
+FASTA = ">up_1 first\nMKVL\nAAG\n>up_2\nMK\n>up_3\nMKVLAAGT\n>up_4\nM\n"
+
+
+def fake_run(commands):
+    def run(command, check=False):
+        commands.append(command[0])
+        if command[0] == "makeblastdb":
+            return
+        query = command[command.index("-query") + 1]
+        output = command[command.index("-out") + 1]
+        with open(query) as file_in, open(output, "w") as file_out:
+            for line in file_in:
+                if line.startswith(">"):
+                    name = line[1:].split()[0]
+                    file_out.write(f"{name}\tprot_1\t90.0\t10\n")
+
+    return run
+
+
+def test_split_fasta(tmp_path):
+    fasta = tmp_path / "uniprot.fasta"
+    fasta.write_text(FASTA)
+    shards = split_fasta(str(fasta), 2, str(tmp_path))
+    assert [open(shard).read() for shard in shards] == [
+        ">up_1 first\nMKVL\nAAG\n>up_2\nMK\n",
+        ">up_3\nMKVLAAGT\n>up_4\nM\n",
+    ]
+    # never more shards than sequences
+    assert len(split_fasta(str(fasta), 10, str(tmp_path))) == 4
+
+
+def test_run_blast(tmp_path, monkeypatch):
+    commands = list()
+    monkeypatch.setattr(subprocess, "run", fake_run(commands))
+    pipeline_fasta = tmp_path / "proteins.faa"
+    pipeline_fasta.write_text(">prot_1\nMKVLAAG\n")
+    uniprot_fasta = tmp_path / "uniprot.fasta"
+    uniprot_fasta.write_text(FASTA)
+    db_cache = tmp_path / "cache"
+
+    blast_output = tmp_path / "blastp.out"
+    run_blast(
+        str(pipeline_fasta), str(uniprot_fasta), str(blast_output), 3, 4, db_cache
+    )
+    assert [line.split("\t")[0] for line in blast_output.read_text().splitlines()] == [
+        "up_1",
+        "up_2",
+        "up_3",
+        "up_4",
+    ]
+    assert commands.count("makeblastdb") == 1
+    assert commands.count("blastp") == 4
+
+    # the database is reused while the pipeline FASTA does not change
+    run_blast(
+        str(pipeline_fasta), str(uniprot_fasta), str(blast_output), 2, None, db_cache
+    )
+    assert commands.count("makeblastdb") == 1
+    pipeline_fasta.write_text(">prot_1\nMKVLAAGT\n")
+    run_blast(
+        str(pipeline_fasta), str(uniprot_fasta), str(blast_output), 2, None, db_cache
+    )
+    assert commands.count("makeblastdb") == 2
+    assert update_gff_with_mapped_uniprot_ids.extract_best_hits(str(blast_output)) == {
+        f"up_{index}": ("prot_1", "90.0", "10") for index in range(1, 5)
+    }
@@ -23,6 +23,7 @@ ch_multiqc_config          = Channel.fromPath("$projectDir/assets/multiqc_config
 ch_multiqc_custom_config   = params.multiqc_config ? Channel.fromPath( params.multiqc_config, checkIfExists: true ) : Channel.empty()
 ch_multiqc_logo            = params.multiqc_logo   ? Channel.fromPath( params.multiqc_logo, checkIfExists: true ) : Channel.empty()
 ch_multiqc_custom_methods_description = params.multiqc_methods_description ? file(params.multiqc_methods_description, checkIfExists: true) : file("$projectDir/assets/methods_description_template.yml", checkIfExists: true)
+ch_rfam_ncrna_classes      = params.rfam_ncrna_classes ? file(params.rfam_ncrna_classes, checkIfExists: true) : file("$projectDir/assets/rfam_ncrna_classes.tsv", checkIfExists: true)
 
 /*
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -420,7 +421,8 @@ workflow METTANNOTATOR {
 
     ANNOTATE_GFF(
         annotate_gff_input,
-        interpro_entry_list
+        interpro_entry_list,
+        ch_rfam_ncrna_classes
     )
 
     ch_versions = ch_versions.mix(ANNOTATE_GFF.out.versions.first())